@@ -44,6 +44,12 @@ class BotConfig:
         self.BOT_USERNAME: str = api_tokens.get('BOT_USERNAME', '') or os.getenv('BOT_USERNAME', '')
         self.COC_API_TOKEN: str = api_tokens.get('COC_API_TOKEN', '') or os.getenv('COC_API_TOKEN', '')
 
+        # Дополнительные ключи COC API через запятую - запросы распределяются между всеми ключами
+        raw_api_tokens = api_tokens.get('COC_API_TOKENS', '') or os.getenv('COC_API_TOKENS', '')
+        self.COC_API_TOKENS: list = self._build_token_list(self.COC_API_TOKEN, raw_api_tokens)
+        if not self.COC_API_TOKEN and self.COC_API_TOKENS:
+            self.COC_API_TOKEN = self.COC_API_TOKENS[0]
+
         # YooKassa платежные реквизиты
         self.YOOKASSA_SHOP_ID: str = api_tokens.get('YOOKASSA_SHOP_ID', '') or os.getenv('YOOKASSA_SHOP_ID', '')
         self.YOOKASSA_SECRET_KEY: str = api_tokens.get('YOOKASSA_SECRET_KEY', '') or os.getenv('YOOKASSA_SECRET_KEY', '')
@@ -52,11 +58,69 @@ class BotConfig:
         raw_database_path = api_tokens.get('DATABASE_PATH', '') or os.getenv('DATABASE_PATH', '')
         self.DATABASE_PATH: str = self._resolve_database_path(raw_database_path)
 
+        # SQLite: пул соединений только для чтения (WAL) и параметры PRAGMA
+        self.DATABASE_READ_POOL_SIZE: int = int(os.getenv('DATABASE_READ_POOL_SIZE', '4'))
+        self.DATABASE_SYNCHRONOUS: str = os.getenv('DATABASE_SYNCHRONOUS', 'NORMAL').upper()
+        self.DATABASE_CACHE_SIZE_KB: int = int(os.getenv('DATABASE_CACHE_SIZE_KB', '16384'))  # на соединение
+        self.DATABASE_MMAP_SIZE: int = int(os.getenv('DATABASE_MMAP_SIZE', str(128 * 1024 * 1024)))
+        self.DATABASE_BUSY_TIMEOUT_MS: int = int(os.getenv('DATABASE_BUSY_TIMEOUT_MS', '5000'))
+
+        # Групповая фиксация записей: до N операций или окно ожидания в мс на одну транзакцию
+        self.DATABASE_WRITE_BATCH_SIZE: int = int(os.getenv('DATABASE_WRITE_BATCH_SIZE', '200'))
+        self.DATABASE_WRITE_BATCH_WINDOW_MS: float = float(os.getenv('DATABASE_WRITE_BATCH_WINDOW_MS', '2'))
+
         # Настройки клана
         self.OUR_CLAN_TAG: str = os.getenv('OUR_CLAN_TAG', '#2PQU0PLJ2')
 
-        # Настройки API
-        self.COC_API_BASE_URL: str = 'https://api.clashofclans.com/v1'
+        # Настройки API (адрес можно переопределить, например, для локального стенда src.loadtest)
+        self.COC_API_BASE_URL: str = os.getenv('COC_API_BASE_URL', 'https://api.clashofclans.com/v1').rstrip('/')
+
+        # Настройки кэша ответов API (TTL в секундах для каждого семейства эндпоинтов)
+        self.COC_CACHE_MAX_ENTRIES: int = int(os.getenv('COC_CACHE_MAX_ENTRIES', '2000'))
+        self.COC_CACHE_TTLS: dict = {
+            'players': int(os.getenv('COC_CACHE_TTL_PLAYERS', '60')),
+            'clans': int(os.getenv('COC_CACHE_TTL_CLANS', '120')),
+            'members': int(os.getenv('COC_CACHE_TTL_MEMBERS', '120')),
+            'currentwar': int(os.getenv('COC_CACHE_TTL_CURRENTWAR', '30')),
+            'warlog': int(os.getenv('COC_CACHE_TTL_WARLOG', '600')),
+            'leagues': int(os.getenv('COC_CACHE_TTL_LEAGUES', '3600')),
+        }
+
+        # Сколько секунд помнить ответ 404 (неверный тег), чтобы не повторять запрос
+        self.COC_CACHE_NEGATIVE_TTL: int = int(os.getenv('COC_CACHE_NEGATIVE_TTL', '30'))
+
+        # Ограничение частоты запросов к COC API (на каждый ключ)
+        self.COC_API_RATE_PER_KEY: float = float(os.getenv('COC_API_RATE_PER_KEY', '10'))
+        self.COC_API_BURST_PER_KEY: float = float(os.getenv('COC_API_BURST_PER_KEY', '10'))
+
+        # Постоянный кэш ответов API на диске (SQLite); пустое значение отключает его
+        raw_cache_path = api_tokens.get('COC_API_CACHE_PATH', '') or os.getenv('COC_API_CACHE_PATH', '')
+        self.COC_API_CACHE_PATH: str = self._resolve_database_path(raw_cache_path) if raw_cache_path else ''
+
+        # Повторы запросов к COC API: экспоненциальная задержка с джиттером и общий дедлайн вызова
+        self.COC_API_MAX_RETRIES: int = int(os.getenv('COC_API_MAX_RETRIES', '3'))
+        self.COC_API_BACKOFF_BASE: float = float(os.getenv('COC_API_BACKOFF_BASE', '0.5'))
+        self.COC_API_BACKOFF_MAX: float = float(os.getenv('COC_API_BACKOFF_MAX', '8'))
+        self.COC_API_ATTEMPT_TIMEOUT: float = float(os.getenv('COC_API_ATTEMPT_TIMEOUT', '10'))
+        self.COC_API_REQUEST_DEADLINE: float = float(os.getenv('COC_API_REQUEST_DEADLINE', '20'))
+
+        # Сколько запросов одновременно выполняют массовые методы get_players_bulk/get_clans_bulk
+        self.COC_API_BULK_CONCURRENCY: int = int(os.getenv('COC_API_BULK_CONCURRENCY', '10'))
+
+        # Сколько последних ошибок API хранить в памяти
+        self.COC_API_ERROR_BUFFER_SIZE: int = int(os.getenv('COC_API_ERROR_BUFFER_SIZE', '500'))
+
+        # Сколько соединений с API открывать заранее при запуске бота
+        self.COC_API_PREWARM_CONNECTIONS: int = int(os.getenv('COC_API_PREWARM_CONNECTIONS', '4'))
+
+        # Выключатель COC API: число сбоев подряд до размыкания и период охлаждения (сек)
+        self.COC_API_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv('COC_API_CIRCUIT_FAILURE_THRESHOLD', '5'))
+        self.COC_API_CIRCUIT_COOLDOWN: float = float(os.getenv('COC_API_CIRCUIT_COOLDOWN', '60'))
+
+        # Одновременные запросы к COC API: общий лимит и лимиты для интерактивных и фоновых запросов
+        self.COC_API_MAX_CONCURRENCY: int = int(os.getenv('COC_API_MAX_CONCURRENCY', '30'))
+        self.COC_API_INTERACTIVE_CONCURRENCY: int = int(os.getenv('COC_API_INTERACTIVE_CONCURRENCY', '30'))
+        self.COC_API_BACKGROUND_CONCURRENCY: int = int(os.getenv('COC_API_BACKGROUND_CONCURRENCY', '10'))
 
         # Настройки архивации
         self.ARCHIVE_CHECK_INTERVAL: int = int(os.getenv('ARCHIVE_CHECK_INTERVAL', '900'))  # 15 минут
@@ -65,6 +129,15 @@ class BotConfig:
         # Валидация обязательных параметров
         self._validate_config()
 
+    @staticmethod
+    def _build_token_list(primary_token: str, raw_tokens: str) -> list:
+        tokens = [primary_token] if primary_token else []
+        for token in raw_tokens.split(','):
+            token = token.strip()
+            if token and token not in tokens:
+                tokens.append(token)
+        return tokens
+
     @staticmethod
     def _resolve_database_path(database_path: str) -> str:
         if not database_path:
@@ -211,6 +211,9 @@ class ClashBot:
     async def run(self):
         """Запуск бота"""
         try:
+            # Запуск клиента COC API: общая сессия; соединения прогреваются в фоне
+            await self.coc_client.start()
+            
             # Initialize bot application and instance first
             await self.initialize()
             
@@ -262,9 +265,8 @@ class ClashBot:
                 await self.building_monitor.stop()
             
             
-            # Закрытие клиента COC API
-            if hasattr(self.coc_client, 'close'):
-                await self.coc_client.close()
+            # Закрытие клиента COC API (общая сессия и постоянный кэш)
+            await self.coc_client.close()
             
             # Закрытие сервиса платежей
             if hasattr(self.message_generator, 'close'):
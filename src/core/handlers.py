@@ -10,7 +10,7 @@ from telegram.constants import ParseMode
 from src.core.keyboards import Keyboards, WarSort, MemberSort, MemberView
 from src.core.user_state import UserState
 from src.core.message_generator import MessageGenerator
-from src.services.coc_api import format_clan_tag, format_player_tag
+from src.services.coc_api import CocApiError, format_clan_tag, format_player_tag
 
 logger = logging.getLogger(__name__)
 
@@ -116,10 +116,14 @@ class MessageHandler:
                 
                 if user:
                     # Получаем информацию об игроке
-                    async with self.message_generator.coc_client as client:
-                        player_data = await client.get_player_info(user.player_tag)
-                        if player_data:
-                            player_name = player_data.get('name')
+                    # Имя игрока нужно только для кнопки: при недоступности API меню показывается без него
+                    try:
+                        async with self.message_generator.coc_client as client:
+                            player_data = await client.get_player_info(user.player_tag)
+                            if player_data:
+                                player_name = player_data.get('name')
+                    except CocApiError as e:
+                        logger.warning(f"Меню клана без имени игрока: {e}")
                     
                     # Проверяем премиум статус
                     has_premium = user.has_premium if hasattr(user, 'has_premium') else False
@@ -595,16 +599,17 @@ class CallbackHandler:
                 await update.callback_query.edit_message_text("Ошибка: клан не выбран.")
             return
         
-        # Handle pagination and sorting (warlist:clan_tag:sort_order:page)
+        # Handle pagination and sorting (warlist:clan_tag:sort_order:page[:cursor])
         if len(data_parts) < 4:
             return
         
         clan_tag = data_parts[1]
         sort_order = data_parts[2]
         page = int(data_parts[3])
+        cursor = data_parts[4] if len(data_parts) > 4 else None
         
         await self.message_generator.display_war_list_page(
-            update, context, clan_tag, sort_order, page
+            update, context, clan_tag, sort_order, page, cursor
         )
     
     async def _handle_war_info(self, update: Update, context: ContextTypes.DEFAULT_TYPE, 
@@ -649,10 +654,16 @@ class CallbackHandler:
         if clan_tag:
             # Получаем информацию о клане заново и отображаем
             async with self.message_generator.coc_client as client:
-                clan_data = await client.get_clan_info(clan_tag)
+                try:
+                    clan = await client.get_clan(clan_tag)
+                except CocApiError:
+                    await update.callback_query.edit_message_text(
+                        self.message_generator.API_UNAVAILABLE_MESSAGE
+                    )
+                    return
                 
-                if clan_data:
-                    message = self.message_generator._format_clan_info(clan_data)
+                if clan:
+                    message = self.message_generator._format_clan_info(clan)
                     keyboard = Keyboards.clan_inspection_menu()
                     
                     await update.callback_query.edit_message_text(
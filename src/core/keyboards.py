@@ -6,6 +6,7 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMa
 from datetime import datetime, date
 
 from .game_emojis import COC_EMOJIS
+from src.models.coc import ClanMember
 
 
 class Keyboards:
@@ -183,7 +184,7 @@ class Keyboards:
     @staticmethod
     def members_with_profiles(clan_tag: str, current_page: int, total_pages: int, 
                              sort_type: str = "role", view_type: str = "compact", 
-                             members: List[Dict] = None) -> InlineKeyboardMarkup:
+                             members: List[ClanMember] = None) -> InlineKeyboardMarkup:
         """Пагинация для списка участников с кликабельными профилями"""
         keyboard = []
         
@@ -194,8 +195,8 @@ class Keyboards:
                 for j in range(2):
                     if i + j < len(members):
                         member = members[i + j]
-                        name = member.get('name', 'Неизвестно')
-                        tag = member.get('tag', '')
+                        name = member.name or 'Неизвестно'
+                        tag = member.tag
                         # Ограничиваем длину имени для кнопки
                         display_name = name[:15] + "..." if len(name) > 15 else name
                         row.append(InlineKeyboardButton(f"👤 {display_name}", 
@@ -271,10 +272,18 @@ class Keyboards:
         
         return InlineKeyboardMarkup(keyboard)
     
+    # Направление курсора в callback-данных списка войн (keyset-пагинация по end_time)
+    WAR_CURSOR_OLDER = "o"
+    WAR_CURSOR_NEWER = "n"
+
     @staticmethod
     def war_list_with_details(clan_tag: str, current_page: int, total_pages: int,
                              sort_order: str = "recent", wars: List[Dict] = None) -> InlineKeyboardMarkup:
-        """Пагинация для списка войн с кликабельными деталями"""
+        """Пагинация для списка войн с кликабельными деталями
+
+        Кнопки навигации передают курсор - end_time крайней войны на странице:
+        warlist:<тег>:<сортировка>:<страница>:<o|n><end_time>
+        """
         keyboard = []
         
         # Добавляем кнопки для отдельных войн
@@ -295,28 +304,30 @@ class Keyboards:
                                        callback_data=f"{Keyboards.WAR_INFO_CALLBACK}:{clan_tag}:{war_end_time}")
                 ])
         
-        # Сортировка
+        # Сортировка (смена фильтра начинает список с первой страницы)
         sort_buttons = [
             InlineKeyboardButton("📅 Недавние", 
-                               callback_data=f"{Keyboards.WAR_LIST_CALLBACK}:{clan_tag}:recent:{current_page}"),
+                               callback_data=f"{Keyboards.WAR_LIST_CALLBACK}:{clan_tag}:recent:1"),
             InlineKeyboardButton("🏆 Победы", 
-                               callback_data=f"{Keyboards.WAR_LIST_CALLBACK}:{clan_tag}:wins:{current_page}"),
+                               callback_data=f"{Keyboards.WAR_LIST_CALLBACK}:{clan_tag}:wins:1"),
             InlineKeyboardButton("❌ Поражения", 
-                               callback_data=f"{Keyboards.WAR_LIST_CALLBACK}:{clan_tag}:losses:{current_page}")
+                               callback_data=f"{Keyboards.WAR_LIST_CALLBACK}:{clan_tag}:losses:1")
         ]
         keyboard.append(sort_buttons)
         
         # Навигация
         nav_buttons = []
-        if current_page > 1:
+        if current_page > 1 and wars:
+            cursor = f"{Keyboards.WAR_CURSOR_NEWER}{wars[0].get('end_time', '')}"
             nav_buttons.append(InlineKeyboardButton("⬅️", 
-                                                   callback_data=f"{Keyboards.WAR_LIST_CALLBACK}:{clan_tag}:{sort_order}:{current_page-1}"))
+                                                   callback_data=f"{Keyboards.WAR_LIST_CALLBACK}:{clan_tag}:{sort_order}:{current_page-1}:{cursor}"))
         
         nav_buttons.append(InlineKeyboardButton(f"{current_page}/{total_pages}", callback_data="noop"))
         
-        if current_page < total_pages:
+        if current_page < total_pages and wars:
+            cursor = f"{Keyboards.WAR_CURSOR_OLDER}{wars[-1].get('end_time', '')}"
             nav_buttons.append(InlineKeyboardButton("➡️", 
-                                                   callback_data=f"{Keyboards.WAR_LIST_CALLBACK}:{clan_tag}:{sort_order}:{current_page+1}"))
+                                                   callback_data=f"{Keyboards.WAR_LIST_CALLBACK}:{clan_tag}:{sort_order}:{current_page+1}:{cursor}"))
         
         keyboard.append(nav_buttons)
         
@@ -11,9 +11,12 @@ from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
 from src.services.database import DatabaseService
-from src.services.coc_api import CocApiClient, format_clan_tag, format_player_tag
+from src.services.coc_api import (
+    CocApiClient, CocApiError, CLAN_MEMBERS_PAGE_PROJECTION, format_clan_tag, format_player_tag
+)
 from src.core.keyboards import Keyboards, WarSort, MemberSort, MemberView
 from src.core.game_emojis import COC_EMOJIS, get_league_icon
+from src.models.coc import Clan, ClanMember, Player
 from src.models.user import User
 from src.models.user_profile import UserProfile
 from src.core.user_state import UserState
@@ -58,6 +61,11 @@ class MessageGenerator:
         'Capital League I', 'Capital League II', 'Capital League III',
         'Capital League IV', 'Capital League V'
     }
+
+    API_UNAVAILABLE_MESSAGE = (
+        "⏳ API Clash of Clans временно недоступен.\n"
+        "Попробуйте повторить запрос через несколько минут."
+    )
     
     def __init__(self, db_service: DatabaseService, coc_client: CocApiClient):
         self.db_service = db_service
@@ -116,27 +124,21 @@ class MessageGenerator:
                 elif profile_count == 1:
                     # Показываем единственный профиль
                     primary_profile = profiles[0]
-                    async with self.coc_client as client:
-                        player_data = await client.get_player_info(primary_profile.player_tag)
-                        player_name = player_data.get('name') if player_data else None
-                        
-                        await update.message.reply_text(
-                            "Меню профиля:",
-                            reply_markup=Keyboards.profile_menu(player_name, has_premium=True, profile_count=1)
-                        )
+                    player_name = await self._get_player_name_or_none(primary_profile.player_tag)
+                    await update.message.reply_text(
+                        "Меню профиля:",
+                        reply_markup=Keyboards.profile_menu(player_name, has_premium=True, profile_count=1)
+                    )
                     return
             
             # Для обычных пользователей или премиум без профилей
             user = await self.db_service.find_user(chat_id)
             if user:
-                async with self.coc_client as client:
-                    player_data = await client.get_player_info(user.player_tag)
-                    player_name = player_data.get('name') if player_data else None
-                    
-                    await update.message.reply_text(
-                        "Меню профиля:",
-                        reply_markup=Keyboards.profile_menu(player_name, has_premium=has_premium, profile_count=0)
-                    )
+                player_name = await self._get_player_name_or_none(user.player_tag)
+                await update.message.reply_text(
+                    "Меню профиля:",
+                    reply_markup=Keyboards.profile_menu(player_name, has_premium=has_premium, profile_count=0)
+                )
             else:
                 await update.message.reply_text(
                     "Меню профиля:",
@@ -149,6 +151,16 @@ class MessageGenerator:
                 reply_markup=Keyboards.profile_menu(None, has_premium=False, profile_count=0)
             )
     
+    async def _get_player_name_or_none(self, player_tag: str) -> Optional[str]:
+        """Имя игрока для подписи кнопок; None, если игрок не найден или API недоступен"""
+        try:
+            async with self.coc_client as client:
+                player = await client.get_player(player_tag)
+        except CocApiError as e:
+            logger.warning(f"Имя игрока {player_tag} недоступно: {e}")
+            return None
+        return player.name if player else None
+    
     async def handle_my_profile_request(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка запроса просмотра собственного профиля"""
         chat_id = update.effective_chat.id
@@ -169,7 +181,14 @@ class MessageGenerator:
         chat_id = update.effective_chat.id
         
         async with self.coc_client as client:
-            player_data = await client.get_player_info(player_tag)
+            try:
+                player_data = await client.get_player_info(player_tag)
+            except CocApiError:
+                await update.message.reply_text(
+                    self.API_UNAVAILABLE_MESSAGE,
+                    reply_markup=Keyboards.profile_menu(None)
+                )
+                return
             
             if not player_data:
                 await update.message.reply_text(
@@ -208,7 +227,14 @@ class MessageGenerator:
             return
         
         async with self.coc_client as client:
-            player_data = await client.get_player_info(user.player_tag)
+            try:
+                player_data = await client.get_player_info(user.player_tag)
+            except CocApiError:
+                await update.message.reply_text(
+                    self.API_UNAVAILABLE_MESSAGE,
+                    reply_markup=Keyboards.profile_menu(None)
+                )
+                return
             
             if not player_data or 'clan' not in player_data:
                 await update.message.reply_text(
@@ -231,9 +257,13 @@ class MessageGenerator:
             await update.callback_query.edit_message_text("🔍 Поиск игрока...")
             
             async with self.coc_client as client:
-                player_data = await client.get_player_info(player_tag)
+                try:
+                    player = await client.get_player(player_tag)
+                except CocApiError:
+                    await update.callback_query.edit_message_text(self.API_UNAVAILABLE_MESSAGE)
+                    return
                 
-                if not player_data:
+                if not player:
                     await update.callback_query.edit_message_text(
                         "❌ Игрок с таким тегом не найден.\n"
                         "Проверьте правильность введенного тега."
@@ -241,7 +271,7 @@ class MessageGenerator:
                     return
                 
                 # Форматируем информацию об игроке
-                message = self._format_player_info(player_data)
+                message = self._format_player_info(player)
                 
                 # Create achievements button for profile displays
                 profile_keyboard = []
@@ -273,9 +303,17 @@ class MessageGenerator:
         )
 
         async with self.coc_client as client:
-            player_data = await client.get_player_info(player_tag)
+            try:
+                player = await client.get_player(player_tag)
+            except CocApiError:
+                await search_message.edit_text(self.API_UNAVAILABLE_MESSAGE)
+                await update.message.reply_text(
+                    "Выберите действие:",
+                    reply_markup=Keyboards.main_menu()
+                )
+                return
             
-            if not player_data:
+            if not player:
                 # Редактируем сообщение о поиске на ошибку
                 await search_message.edit_text(
                     "❌ Игрок с таким тегом не найден.\n"
@@ -289,7 +327,7 @@ class MessageGenerator:
                 return
             
             # Форматируем информацию об игроке
-            message = self._format_player_info(player_data)
+            message = self._format_player_info(player)
             
             # Create achievements button for profile displays
             profile_keyboard = []
@@ -325,10 +363,14 @@ class MessageGenerator:
             loading_message = await update.message.reply_text("🔍 Получение информации о клане...")
         
         async with self.coc_client as client:
-            clan_data = await client.get_clan_info(clan_tag)
+            try:
+                clan = await client.get_clan(clan_tag)
+                error_message = "❌ Клан с таким тегом не найден."
+            except CocApiError:
+                clan = None
+                error_message = self.API_UNAVAILABLE_MESSAGE
             
-            if not clan_data:
-                error_message = "❌ Клан с таким тегом не найден или ведутся тех работы на стороне хостинга/апи."
+            if not clan:
                 if is_callback:
                     await update.callback_query.edit_message_text(error_message)
                 else:
@@ -340,7 +382,7 @@ class MessageGenerator:
             context.user_data['inspecting_clan'] = clan_tag
             
             # Форматируем информацию о клане
-            message = self._format_clan_info(clan_data)
+            message = self._format_clan_info(clan)
             keyboard = Keyboards.clan_inspection_menu()
             
             if is_callback:
@@ -360,16 +402,16 @@ class MessageGenerator:
         
         try:
             async with self.coc_client as client:
-                members_data = await client.get_clan_members(clan_tag)
+                members = await client.get_clan_member_list(clan_tag, projection=CLAN_MEMBERS_PAGE_PROJECTION)
                 
-                if not members_data:
+                if not members:
                     await update.callback_query.edit_message_text(
                         "❌ Не удалось получить список участников клана."
                     )
                     return
                 
                 # Сортируем участников
-                sorted_members = self._sort_members(members_data, sort_type)
+                sorted_members = self._sort_members(members, sort_type)
                 
                 # Пагинация
                 total_members = len(sorted_members)
@@ -386,6 +428,9 @@ class MessageGenerator:
                     message, parse_mode=ParseMode.MARKDOWN, reply_markup=keyboard
                 )
                 
+        except CocApiError as e:
+            logger.error(f"API недоступен при получении участников клана {clan_tag}: {e}")
+            await update.callback_query.edit_message_text(self.API_UNAVAILABLE_MESSAGE)
         except asyncio.TimeoutError:
             logger.error(f"Таймаут при получении участников клана {clan_tag}")
             await update.callback_query.edit_message_text(
@@ -399,28 +444,42 @@ class MessageGenerator:
             )
     
     async def display_war_list_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
-                                   clan_tag: str, sort_order: str, page: int):
-        """Отображение страницы списка войн"""
-        # Получаем войны из базы данных
-        offset = (page - 1) * self.WARS_PER_PAGE
-        wars = await self.db_service.get_war_list(self.WARS_PER_PAGE, offset)
-        
-        if not wars:
+                                   clan_tag: str, sort_order: str, page: int,
+                                   cursor: Optional[str] = None):
+        """Отображение страницы списка войн
+
+        cursor - курсор из кнопок навигации (o/n + end_time крайней войны соседней
+        страницы); без курсора показывается первая страница.
+        """
+        # Фильтрация, подсчет и пагинация выполняются в базе данных
+        war_filter = self._war_filter_for_sort(sort_order)
+        total_wars = await self.db_service.count_wars(**war_filter)
+        
+        if not total_wars:
             await update.callback_query.edit_message_text(
                 "❌ Войны не найдены в базе данных."
             )
             return
         
-        # Фильтруем по типу сортировки
-        filtered_wars = self._filter_wars_by_sort(wars, sort_order)
-        
-        total_wars = len(filtered_wars)
         total_pages = (total_wars + self.WARS_PER_PAGE - 1) // self.WARS_PER_PAGE
+        page = min(max(page, 1), total_pages)
+        
+        if cursor and cursor[0] == Keyboards.WAR_CURSOR_OLDER:
+            page_wars = await self.db_service.get_war_page(
+                self.WARS_PER_PAGE, older_than=cursor[1:], **war_filter
+            )
+        elif cursor and cursor[0] == Keyboards.WAR_CURSOR_NEWER:
+            page_wars = await self.db_service.get_war_page(
+                self.WARS_PER_PAGE, newer_than=cursor[1:], **war_filter
+            )
+        else:
+            page = 1
+            page_wars = await self.db_service.get_war_page(self.WARS_PER_PAGE, **war_filter)
         
-        # Пагинация для текущей страницы
-        start_idx = (page - 1) * self.WARS_PER_PAGE
-        end_idx = start_idx + self.WARS_PER_PAGE
-        page_wars = filtered_wars[start_idx:end_idx]
+        if not page_wars:
+            # Курсор устарел (например, войны удалены) - начинаем сначала
+            page = 1
+            page_wars = await self.db_service.get_war_page(self.WARS_PER_PAGE, **war_filter)
         
         # Форматируем сообщение
         message = self._format_war_list(page_wars, page, total_pages)
@@ -577,65 +636,41 @@ class MessageGenerator:
             logger.error(f"Ошибка при переключении уведомлений: {e}")
             await update.callback_query.edit_message_text("❌ Произошла ошибка при изменении настроек.")
     
-    def _format_player_info(self, player_data: Dict[Any, Any]) -> str:
+    def _format_player_info(self, player: Player) -> str:
         """Форматирование информации об игроке"""
-        name = player_data.get('name', 'Неизвестно')
-        tag = player_data.get('tag', 'Неизвестно')
-        th_level = player_data.get('townHallLevel', 0)
-        trophies = player_data.get('trophies', 0)
-        best_trophies = player_data.get('bestTrophies', 0)
-        exp_level = player_data.get('expLevel', 0)
-        
-        message = f"👤 *{name}*\n"
-        message += f"🏷 `{tag}`\n"
-        message += f"🏰 Ратуша: {th_level} уровень\n"
-        message += f"🏆 Трофеи: {trophies:,}\n"
-        message += f"🥇 Лучший результат: {best_trophies:,}\n"
-        message += f"⭐ Уровень опыта: {exp_level}\n"
+        message = f"👤 *{player.name or 'Неизвестно'}*\n"
+        message += f"🏷 `{player.tag or 'Неизвестно'}`\n"
+        message += f"🏰 Ратуша: {player.town_hall_level} уровень\n"
+        message += f"🏆 Трофеи: {player.trophies:,}\n"
+        message += f"🥇 Лучший результат: {player.best_trophies:,}\n"
+        message += f"⭐ Уровень опыта: {player.exp_level}\n"
         
         # Add war stars information
-        war_stars = player_data.get('warStars', 0)
-        attack_wins = player_data.get('attackWins', 0)
-        defense_wins = player_data.get('defenseWins', 0)
-        
-        message += f"🌟 Звезды войн: {war_stars:,}\n"
-        message += f"⚔️ Побед в атаке: {attack_wins:,}\n"
-        message += f"🛡️ Побед в защите: {defense_wins:,}\n"
+        message += f"🌟 Звезды войн: {player.war_stars:,}\n"
+        message += f"⚔️ Побед в атаке: {player.attack_wins:,}\n"
+        message += f"🛡️ Побед в защите: {player.defense_wins:,}\n"
         
         # Add donations information
-        donations = player_data.get('donations', 0)
-        received = player_data.get('donationsReceived', 0)
-        message += f"📤 Отдано войск: {donations:,}\n"
-        message += f"📥 Получено войск: {received:,}\n"
+        message += f"📤 Отдано войск: {player.donations:,}\n"
+        message += f"📥 Получено войск: {player.donations_received:,}\n"
         
         # Add super troops information
-        super_troops = self._format_super_troops_info(player_data)
+        super_troops = self._format_super_troops_info(player.raw)
         if super_troops:
             message += f"\n{super_troops}"
         
         # Add league information
-        league = player_data.get('league')
-        if league:
-            league_name = league.get('name', 'Неизвестно')
-            message += f"🏅 Лига: {league_name}\n"
-        
-        # Add builder base information (supports both legacy versus data and new builder base leagues)
-        builder_hall_level = player_data.get('builderHallLevel', 0)
-        builder_base_trophies = player_data.get('builderBaseTrophies')
-        best_builder_base_trophies = player_data.get('builderBaseBestTrophies')
-        builder_base_battle_wins = player_data.get('builderBaseBattleWins')
-        builder_base_attack_wins = player_data.get('builderBaseAttackWins')
-        builder_base_defense_wins = player_data.get('builderBaseDefenseWins')
-        builder_base_win_streak = player_data.get('builderBaseWinStreak')
-        builder_base_league = player_data.get('builderBaseLeague', {})
-
-        # Fallbacks for legacy versus fields (until all accounts migrate)
-        if builder_base_trophies is None:
-            builder_base_trophies = player_data.get('versusTrophies', 0)
-        if best_builder_base_trophies is None:
-            best_builder_base_trophies = player_data.get('bestVersusTrophies', 0)
-        if builder_base_battle_wins is None:
-            builder_base_battle_wins = player_data.get('versusBattleWins')
+        if player.league_name:
+            message += f"🏅 Лига: {player.league_name}\n"
+        
+        # Add builder base information (модель уже учитывает устаревшие versus-поля)
+        builder_hall_level = player.builder_hall_level
+        builder_base_trophies = player.builder_base_trophies
+        best_builder_base_trophies = player.builder_base_best_trophies
+        builder_base_battle_wins = player.builder_base_battle_wins
+        builder_base_attack_wins = player.builder_base_attack_wins
+        builder_base_defense_wins = player.builder_base_defense_wins
+        builder_base_win_streak = player.builder_base_win_streak
 
         show_builder_base = (
             builder_hall_level > 0
@@ -650,9 +685,8 @@ class MessageGenerator:
             message += f"\n🏗️ *База строителя:*\n"
             message += f"🏘️ Дом строителя: {builder_hall_level} уровень\n"
 
-            if builder_base_league and builder_base_league.get('name'):
-                league_name = builder_base_league.get('name')
-                message += f"🏅 Лига Базы строителя: {league_name}\n"
+            if player.builder_base_league_name:
+                message += f"🏅 Лига Базы строителя: {player.builder_base_league_name}\n"
 
             if builder_base_trophies is not None:
                 message += f"🏆 Кубки: {builder_base_trophies:,}\n"
@@ -669,28 +703,23 @@ class MessageGenerator:
                 message += f"⚔️ Побед: {builder_base_battle_wins:,}\n"
         
         # Информация о клане
-        clan_info = player_data.get('clan')
-        if clan_info:
-            clan_name = clan_info.get('name', 'Неизвестно')
-            clan_tag = clan_info.get('tag', 'Неизвестно')
-            clan_role = clan_info.get('role', 'member')
-            role_data = self.ROLE_TRANSLATIONS.get(clan_role, {"icon": "👤", "title": "Участник"})
+        clan = player.clan
+        if clan:
+            role_data = self.ROLE_TRANSLATIONS.get(clan.role, {"icon": "👤", "title": "Участник"})
             role_icon = role_data.get('icon', '👤')
             role_title = role_data.get('title', 'Участник')
 
-            message += f"\n🛡 *Клан:* {clan_name}\n"
-            message += f"🏷 `{clan_tag}`\n"
+            message += f"\n🛡 *Клан:* {clan.name or 'Неизвестно'}\n"
+            message += f"🏷 `{clan.tag or 'Неизвестно'}`\n"
             message += f"👑 Роль: {role_icon} {role_title}"
             
             # Add clan position if available
-            clan_rank = player_data.get('clanRank')
-            if clan_rank:
-                message += f"\n📍 Позиция в клане: {clan_rank}"
+            if player.clan_rank:
+                message += f"\n📍 Позиция в клане: {player.clan_rank}"
             
             # Add clan level if available
-            clan_level = clan_info.get('clanLevel', 0)
-            if clan_level > 0:
-                message += f"\n🎖️ Уровень клана: {clan_level}"
+            if clan.clan_level > 0:
+                message += f"\n🎖️ Уровень клана: {clan.clan_level}"
         else:
             message += f"\n🚫 Не состоит в клане"
         
@@ -823,19 +852,18 @@ class MessageGenerator:
         except Exception:
             return None
     
-    def _format_clan_info(self, clan_data: Dict[Any, Any]) -> str:
+    def _format_clan_info(self, clan: Clan) -> str:
         """Форматирование информации о клане"""
-        name = clan_data.get('name', 'Неизвестно')
-        tag = clan_data.get('tag', 'Неизвестно')
-        description = clan_data.get('description', 'Описание отсутствует')
-        members_count = clan_data.get('members', 0)
-        war_wins = clan_data.get('warWins', 0)
-        war_losses = clan_data.get('warLosses', 0)
-        war_ties = clan_data.get('warTies', 0)
+        name = clan.name or 'Неизвестно'
+        tag = clan.tag or 'Неизвестно'
+        description = clan.description if clan.description is not None else 'Описание отсутствует'
+        members_count = clan.members_count
+        war_wins = clan.war_wins
+        war_losses = clan.war_losses
+        war_ties = clan.war_ties
         
         # Локация
-        location = clan_data.get('location', {})
-        location_name = location.get('name', 'Неизвестно') if location else 'Неизвестно'
+        location_name = clan.location_name or 'Неизвестно'
         
         message = f"🛡 *{name}*\n"
         message += f"🏷 `{tag}`\n"
@@ -854,7 +882,7 @@ class MessageGenerator:
         
         return message
     
-    def _format_members_page(self, members: List[Dict], page: int, total_pages: int, 
+    def _format_members_page(self, members: List[ClanMember], page: int, total_pages: int, 
                            total_members: int, view_type: str) -> str:
         """Форматирование страницы участников"""
         message = f"👥 *Участники клана* (стр. {page}/{total_pages})\n"
@@ -862,18 +890,17 @@ class MessageGenerator:
         
         for i, member in enumerate(members, 1):
             # Escape special characters in names to prevent parsing errors
-            name = member.get('name', 'Неизвестно').replace('*', '\\*').replace('_', '\\_').replace('[', '\\[').replace(']', '\\]').replace('`', '\\`')
-            tag = member.get('tag', 'Неизвестно')
-            role = member.get('role', 'member')
-            role_info = self.ROLE_TRANSLATIONS.get(role, {"icon": "👤", "title": "Участник"})
+            name = (member.name or 'Неизвестно').replace('*', '\\*').replace('_', '\\_').replace('[', '\\[').replace(']', '\\]').replace('`', '\\`')
+            tag = member.tag or 'Неизвестно'
+            role_info = self.ROLE_TRANSLATIONS.get(member.role, {"icon": "👤", "title": "Участник"})
             role_icon = role_info.get('icon', '👤')
             role_title = role_info.get('title', 'Участник')
             role_text = f"{role_icon} {role_title}"
-            trophies = member.get('trophies', 0)
+            trophies = member.trophies
             
             if view_type == MemberView.DETAILED:
-                donations = member.get('donations', 0)
-                received = member.get('donationsReceived', 0)
+                donations = member.donations
+                received = member.donations_received
                 
                 message += f"*{i + (page-1) * self.MEMBERS_PER_PAGE}.* {name}\n"
                 message += f"   🏷 `{tag}`\n"
@@ -1022,30 +1049,31 @@ class MessageGenerator:
         
         return message
     
-    def _sort_members(self, members: List[Dict], sort_type: str) -> List[Dict]:
+    def _sort_members(self, members: List[ClanMember], sort_type: str) -> List[ClanMember]:
         """Сортировка участников клана"""
         if sort_type == MemberSort.ROLE:
             role_order = {"leader": 0, "coLeader": 1, "admin": 2, "member": 3}
-            return sorted(members, key=lambda m: (role_order.get(m.get('role', 'member'), 3), -m.get('trophies', 0)))
+            return sorted(members, key=lambda m: (role_order.get(m.role, 3), -m.trophies))
         elif sort_type == MemberSort.TROPHIES:
-            return sorted(members, key=lambda m: -m.get('trophies', 0))
+            return sorted(members, key=lambda m: -m.trophies)
         elif sort_type == MemberSort.DONATIONS:
-            return sorted(members, key=lambda m: -m.get('donations', 0))
+            return sorted(members, key=lambda m: -m.donations)
         elif sort_type == MemberSort.NAME:
-            return sorted(members, key=lambda m: m.get('name', '').lower())
+            return sorted(members, key=lambda m: m.name.lower())
         else:
             return members
     
-    def _filter_wars_by_sort(self, wars: List[Dict], sort_order: str) -> List[Dict]:
-        """Фильтрация войн по типу сортировки"""
+    @staticmethod
+    def _war_filter_for_sort(sort_order: str) -> Dict[str, Any]:
+        """Фильтр DatabaseService.get_war_page и count_wars для типа сортировки"""
         if sort_order == WarSort.WINS:
-            return [war for war in wars if war['result'] == 'win']
+            return {'result': 'win'}
         elif sort_order == WarSort.LOSSES:
-            return [war for war in wars if war['result'] == 'lose']
+            return {'result': 'lose'}
         elif sort_order == WarSort.CWL_ONLY:
-            return [war for war in wars if war['is_cwl_war']]
+            return {'cwl_only': True}
         else:
-            return wars  # RECENT - уже отсортированы по дате
+            return {}  # RECENT - все войны, новые первыми
     
     async def handle_subscription_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка меню подписки"""
@@ -1668,7 +1696,11 @@ class MessageGenerator:
             
             # Get clan info to determine league
             async with self.coc_client as client:
-                clan_data = await client.get_clan_info(clan_tag)
+                try:
+                    clan_data = await client.get_clan_info(clan_tag)
+                except CocApiError:
+                    await update.callback_query.edit_message_text(self.API_UNAVAILABLE_MESSAGE)
+                    return
                 
                 if not clan_data:
                     await update.callback_query.edit_message_text("❌ Не удалось получить информацию о клане.")
@@ -1683,21 +1715,11 @@ class MessageGenerator:
                 # Determine number of bonus spots based on league
                 bonus_spots = self._get_bonus_spots_by_league(league_name)
                 
-                # Get current CWL season dates (approximate - from start of current month to now)
-                now = datetime.now()
-                # CWL typically starts around the 1st of the month
-                season_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                season_end = now
-                
-                # Get donation stats for the season
-                donation_stats = await self.db_service.get_cwl_season_donation_stats(
-                    season_start.isoformat(), season_end.isoformat()
-                )
+                # Current CWL season (approximate - the current calendar month)
+                season = datetime.now().strftime('%Y-%m')
                 
-                # Get attack stats for the season
-                attack_stats = await self.db_service.get_cwl_season_attack_stats(
-                    season_start.isoformat(), season_end.isoformat()
-                )
+                # Donation and attack stats for the season from the pre-aggregated tables
+                donation_stats, attack_stats = await self.db_service.get_cwl_season_bonus_stats(season)
                 
                 # Get current clan members to map tags to names
                 members = clan_data.get('memberList', [])
@@ -2114,7 +2136,14 @@ class MessageGenerator:
             
             for profile in profiles:
                 async with self.coc_client as client:
-                    player_data = await client.get_player_info(profile.player_tag)
+                    try:
+                        player_data = await client.get_player_info(profile.player_tag)
+                    except CocApiError:
+                        if hasattr(update, 'callback_query') and update.callback_query:
+                            await update.callback_query.edit_message_text(self.API_UNAVAILABLE_MESSAGE)
+                        else:
+                            await update.message.reply_text(self.API_UNAVAILABLE_MESSAGE)
+                        return
                     profile_info = {
                         'player_tag': profile.player_tag,
                         'profile_name': profile.profile_name or f"Профиль {len(profile_data) + 1}",
@@ -2179,7 +2208,11 @@ class MessageGenerator:
             profile_data = []
             for profile in profiles:
                 async with self.coc_client as client:
-                    player_data = await client.get_player_info(profile.player_tag)
+                    try:
+                        player_data = await client.get_player_info(profile.player_tag)
+                    except CocApiError:
+                        await update.callback_query.edit_message_text(self.API_UNAVAILABLE_MESSAGE)
+                        return
                     profile_info = {
                         'player_tag': profile.player_tag,
                         'profile_name': profile.profile_name or f"Профиль {len(profile_data) + 1}",
@@ -2207,9 +2240,7 @@ class MessageGenerator:
         
         try:
             # Получаем информацию об игроке перед удалением
-            async with self.coc_client as client:
-                player_data = await client.get_player_info(player_tag)
-                player_name = player_data.get('name', 'Неизвестно') if player_data else 'Неизвестно'
+            player_name = await self._get_player_name_or_none(player_tag) or 'Неизвестно'
             
             # Удаляем профиль
             success = await self.db_service.delete_user_profile(chat_id, player_tag)
@@ -2289,7 +2320,11 @@ class MessageGenerator:
             
             # Получаем информацию об игроке
             async with self.coc_client as client:
-                player_data = await client.get_player_info(player_tag)
+                try:
+                    player_data = await client.get_player_info(player_tag)
+                except CocApiError:
+                    await update.message.reply_text(self.API_UNAVAILABLE_MESSAGE)
+                    return
                 
                 if not player_data:
                     await update.message.reply_text(
@@ -2409,7 +2444,11 @@ class MessageGenerator:
         try:
             # Получаем информацию о клане через API
             async with self.coc_client as client:
-                clan_data = await client.get_clan_info(clan_tag)
+                try:
+                    clan_data = await client.get_clan_info(clan_tag)
+                except CocApiError:
+                    await update.message.reply_text(self.API_UNAVAILABLE_MESSAGE)
+                    return
                 
                 if not clan_data:
                     await update.message.reply_text(
@@ -2933,6 +2972,9 @@ class MessageGenerator:
                     parse_mode='HTML'
                 )
                 
+        except CocApiError as e:
+            logger.error(f"API недоступен при загрузке достижений игрока {player_tag}: {e}")
+            await update.callback_query.edit_message_text(self.API_UNAVAILABLE_MESSAGE)
         except Exception as e:
             logger.error(f"Ошибка при обработке достижений игрока {player_tag}: {e}")
             from src.utils.translations import translation_manager
@@ -0,0 +1,11 @@
+"""
+Локальный стенд COC API и нагрузочные тесты
+
+- fixtures: детерминированные синтетические ответы API;
+- stub_server: aiohttp-сервер, имитирующий API (задержки, ошибки, 429);
+- harness: нагрузочный прогон CocApiClient, BuildingMonitor и WarArchiver против стенда;
+- query_plans: аудит планов запросов DatabaseService (EXPLAIN QUERY PLAN).
+
+Стенд запускается командой `python -m src.loadtest.stub_server`, нагрузочный
+прогон - `python -m src.loadtest.harness`, аудит запросов - `python -m src.loadtest.query_plans`.
+"""
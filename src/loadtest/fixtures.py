@@ -0,0 +1,372 @@
+"""
+Детерминированные синтетические ответы API Clash of Clans
+
+Каждый ответ однозначно определяется тегом и номером эпохи: одинаковые
+аргументы всегда дают одинаковые данные, поэтому прогоны воспроизводимы.
+Эпоха - счетчик "игрового времени": с ее ростом у игроков растут уровни
+героев и войск, а у кланов сменяются войны.
+"""
+import hashlib
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+# Символы, из которых состоят теги в игре
+TAG_ALPHABET = '0289PYLQGRJCUV'
+PLAYER_TAG_LENGTH = 8
+CLAN_TAG_LENGTH = 9
+MEMBERS_PER_CLAN = 50
+WAR_TEAM_SIZE = 15
+WAR_LOG_SIZE = 20
+
+# Точка отсчета игрового времени (эпоха 0)
+BASE_TIME = datetime(2024, 1, 1, 12, 0, 0)
+
+HEROES = ['Barbarian King', 'Archer Queen', 'Grand Warden', 'Royal Champion', 'Minion Prince']
+HERO_EQUIPMENT = ['Barbarian Puppet', 'Rage Vial', 'Archer Puppet', 'Invisibility Vial',
+                  'Eternal Tome', 'Life Gem', 'Seeking Shield', 'Giant Gauntlet']
+TROOPS = ['Barbarian', 'Archer', 'Giant', 'Goblin', 'Wall Breaker', 'Balloon', 'Wizard', 'Healer',
+          'Dragon', 'P.E.K.K.A', 'Baby Dragon', 'Miner', 'Electro Dragon', 'Yeti', 'Dragon Rider',
+          'Minion', 'Hog Rider', 'Valkyrie', 'Golem', 'Witch', 'Lava Hound', 'Bowler', 'Ice Golem']
+SPELLS = ['Lightning Spell', 'Healing Spell', 'Rage Spell', 'Jump Spell', 'Freeze Spell',
+          'Clone Spell', 'Poison Spell', 'Earthquake Spell', 'Haste Spell', 'Skeleton Spell', 'Bat Spell']
+ACHIEVEMENTS = ['Bigger Coffers', 'Get those Goblins!', 'Bigger & Better', 'Nice and Tidy',
+                'Wall Buster', 'Humiliator', 'Union Buster', 'Conqueror', 'Unbreakable', 'Friend in Need',
+                'War Hero', 'War League Legend', 'Games Champion', 'Aggressive Capitalism']
+LEAGUES = ['Unranked', 'Bronze League III', 'Silver League II', 'Gold League I', 'Crystal League II',
+           'Master League I', 'Champion League III', 'Titan League II', 'Legend League']
+BUILDER_LEAGUES = ['Unranked', 'Wood League V', 'Clay League III', 'Stone League I', 'Copper League II',
+                   'Brass League I', 'Iron League III', 'Steel League II', 'Titanium League I']
+ROLES = ['member'] * 30 + ['admin'] * 12 + ['coLeader'] * 7 + ['leader']
+
+
+def _rng(*parts: Any) -> random.Random:
+    """Генератор случайных чисел, однозначно определяемый аргументами"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big'))
+
+
+def _encode(index: int, length: int) -> str:
+    base = len(TAG_ALPHABET)
+    chars = []
+    for _ in range(length):
+        index, digit = divmod(index, base)
+        chars.append(TAG_ALPHABET[digit])
+    return '#' + ''.join(reversed(chars))
+
+
+def _decode(tag: str) -> int:
+    """Номер сущности по тегу; для "чужих" тегов - устойчивый хэш"""
+    clean = tag.lstrip('#').upper()
+    base = len(TAG_ALPHABET)
+    index = 0
+    for char in clean:
+        digit = TAG_ALPHABET.find(char)
+        if digit < 0:
+            return _rng('foreign', clean).randrange(10 ** 6)
+        index = index * base + digit
+    return index
+
+
+def player_tag(index: int) -> str:
+    """Тег игрока с указанным номером"""
+    return _encode(index, PLAYER_TAG_LENGTH)
+
+
+def clan_tag(index: int) -> str:
+    """Тег клана с указанным номером"""
+    return _encode(index, CLAN_TAG_LENGTH)
+
+
+def player_tags(count: int, start: int = 0) -> List[str]:
+    """Теги игроков подряд, начиная с номера start"""
+    return [player_tag(index) for index in range(start, start + count)]
+
+
+def clan_tags(count: int, start: int = 0) -> List[str]:
+    """Теги кланов подряд, начиная с номера start"""
+    return [clan_tag(index) for index in range(start, start + count)]
+
+
+def _coc_time(moment: datetime) -> str:
+    """Время в формате API: 20240101T120000.000Z"""
+    return moment.strftime('%Y%m%dT%H%M%S.000Z')
+
+
+def _leveled(rng: random.Random, names: List[str], epoch: int, max_level: int,
+             village: str = 'home') -> List[Dict[str, Any]]:
+    """Юниты, уровни которых растут с эпохой (у каждого свой темп)"""
+    units = []
+    for name in names:
+        base_level = rng.randint(1, max(1, max_level - 5))
+        upgrade_every = rng.randint(2, 6)
+        units.append({
+            'name': name,
+            'level': min(max_level, base_level + epoch // upgrade_every),
+            'maxLevel': max_level,
+            'village': village,
+        })
+    return units
+
+
+def _member_name(rng: random.Random) -> str:
+    syllables = ['ka', 'ro', 'mi', 'zu', 'ta', 'ne', 'vo', 'li', 'sha', 'dor', 'gin', 'el']
+    return ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def player(tag: str, epoch: int = 0) -> Dict[str, Any]:
+    """Ответ /players/{tag}"""
+    index = _decode(tag)
+    rng = _rng('player', index)
+    name = _member_name(rng)
+    town_hall = rng.randint(8, 17)
+    trophies = rng.randint(800, 5500)
+    clan_index = index // MEMBERS_PER_CLAN
+    league_number = town_hall % len(LEAGUES)
+    builder_league_number = rng.randrange(len(BUILDER_LEAGUES))
+
+    data: Dict[str, Any] = {
+        'tag': player_tag(index),
+        'name': name,
+        'townHallLevel': town_hall,
+        'expLevel': rng.randint(60, 280) + epoch,
+        'trophies': trophies,
+        'bestTrophies': trophies + rng.randint(0, 800),
+        'warStars': rng.randint(100, 3000) + epoch * 3,
+        'attackWins': rng.randint(0, 300),
+        'defenseWins': rng.randint(0, 50),
+        'builderHallLevel': rng.randint(5, 10),
+        'builderBaseTrophies': rng.randint(1000, 5000),
+        'builderBaseBestTrophies': rng.randint(5000, 6000),
+        'donations': rng.randint(0, 5000),
+        'donationsReceived': rng.randint(0, 3000),
+        'clanRank': index % MEMBERS_PER_CLAN + 1,
+        'role': ROLES[index % len(ROLES)],
+        'league': {'id': 29000000 + league_number, 'name': LEAGUES[league_number]},
+        'builderBaseLeague': {'id': 44000000 + builder_league_number, 'name': BUILDER_LEAGUES[builder_league_number]},
+        'clan': {
+            'tag': clan_tag(clan_index),
+            'name': f"Clan {clan_index}",
+            'clanLevel': _rng('clan', clan_index).randint(1, 30),
+            'role': ROLES[index % len(ROLES)],
+        },
+        'heroes': _leveled(rng, HEROES[:max(1, town_hall - 8)], epoch, 95),
+        'heroEquipment': _leveled(rng, HERO_EQUIPMENT, epoch, 27),
+        'troops': _leveled(rng, TROOPS, epoch, 12),
+        'spells': _leveled(rng, SPELLS, epoch, 11),
+        'achievements': [
+            {
+                'name': achievement,
+                'stars': rng.randint(0, 3),
+                'value': rng.randint(0, 100000) + epoch * 10,
+                'target': 100000,
+                'village': 'home',
+            }
+            for achievement in ACHIEVEMENTS
+        ],
+    }
+    return data
+
+
+def _clan_members(index: int, epoch: int) -> List[Dict[str, Any]]:
+    members = []
+    for position in range(MEMBERS_PER_CLAN):
+        member_index = index * MEMBERS_PER_CLAN + position
+        rng = _rng('player', member_index)
+        name = _member_name(rng)
+        trophies = rng.randint(800, 5500)
+        member_rng = _rng('member', member_index, epoch)
+        members.append({
+            'tag': player_tag(member_index),
+            'name': name,
+            'role': ROLES[member_index % len(ROLES)],
+            'expLevel': rng.randint(60, 280),
+            'trophies': trophies,
+            'clanRank': position + 1,
+            'previousClanRank': position + 1,
+            'donations': member_rng.randint(0, 3000),
+            'donationsReceived': member_rng.randint(0, 2000),
+        })
+    members.sort(key=lambda member: -member['trophies'])
+    for rank, member in enumerate(members, 1):
+        member['clanRank'] = rank
+    return members
+
+
+def clan(tag: str, epoch: int = 0) -> Dict[str, Any]:
+    """Ответ /clans/{tag}"""
+    index = _decode(tag)
+    rng = _rng('clan', index)
+    members = _clan_members(index, epoch)
+    return {
+        'tag': clan_tag(index),
+        'name': f"Clan {index}",
+        'type': 'inviteOnly',
+        'description': f"Синтетический клан номер {index}",
+        'location': {'id': 32000193, 'name': 'Russia', 'isCountry': True},
+        'clanLevel': rng.randint(1, 30),
+        'clanPoints': rng.randint(10000, 50000),
+        'warFrequency': 'always',
+        'warWinStreak': rng.randint(0, 20),
+        'warWins': rng.randint(50, 900) + epoch,
+        'warTies': rng.randint(0, 30),
+        'warLosses': rng.randint(10, 300),
+        'isWarLogPublic': True,
+        'members': len(members),
+        'memberList': members,
+    }
+
+
+def clan_members(tag: str, epoch: int = 0) -> Dict[str, Any]:
+    """Ответ /clans/{tag}/members"""
+    return {'items': _clan_members(_decode(tag), epoch), 'paging': {'cursors': {}}}
+
+
+def _war_side(rng: random.Random, side_tag: str, name: str, member_offset: int,
+              with_members: bool) -> Dict[str, Any]:
+    members = []
+    total_stars = 0
+    total_destruction = 0.0
+    total_attacks = 0
+    for position in range(WAR_TEAM_SIZE):
+        member_tag = player_tag(member_offset + position)
+        attacks = []
+        for order in range(rng.choice((0, 1, 2, 2, 2))):
+            stars = rng.choice((1, 2, 2, 3, 3, 3))
+            destruction = float(rng.randint(40 + stars * 15, 100))
+            attacks.append({
+                'attackerTag': member_tag,
+                'defenderTag': player_tag(10 ** 6 + member_offset + rng.randrange(WAR_TEAM_SIZE)),
+                'stars': stars,
+                'destructionPercentage': destruction,
+                'order': position * 2 + order + 1,
+                'duration': rng.randint(60, 180),
+            })
+            total_stars += stars
+            total_destruction += destruction
+        total_attacks += len(attacks)
+        members.append({
+            'tag': member_tag,
+            'name': _member_name(_rng('player', member_offset + position)),
+            'townhallLevel': rng.randint(10, 17),
+            'mapPosition': position + 1,
+            'attacks': attacks,
+        })
+    side = {
+        'tag': side_tag,
+        'name': name,
+        'clanLevel': rng.randint(1, 30),
+        'attacks': total_attacks,
+        'stars': min(total_stars, WAR_TEAM_SIZE * 3),
+        'destructionPercentage': round(min(100.0, total_destruction / WAR_TEAM_SIZE / 2), 2),
+    }
+    if with_members:
+        side['members'] = members
+    return side
+
+
+def _war(clan_index: int, war_number: int, state: str, with_members: bool = True) -> Dict[str, Any]:
+    rng = _rng('war', clan_index, war_number)
+    # Сдвиг по кланам, чтобы время окончания войн разных кланов не совпадало
+    end_time = BASE_TIME + timedelta(days=war_number * 2, minutes=clan_index % 1440)
+    start_time = end_time - timedelta(days=1)
+    opponent_index = 10 ** 5 + rng.randrange(10 ** 5)
+    return {
+        'state': state,
+        'teamSize': WAR_TEAM_SIZE,
+        'attacksPerMember': 2,
+        'preparationStartTime': _coc_time(start_time - timedelta(days=1)),
+        'startTime': _coc_time(start_time),
+        'endTime': _coc_time(end_time),
+        'clan': _war_side(rng, clan_tag(clan_index), f"Clan {clan_index}",
+                          clan_index * MEMBERS_PER_CLAN, with_members),
+        'opponent': _war_side(rng, clan_tag(opponent_index), f"Opponent {opponent_index}",
+                              opponent_index * MEMBERS_PER_CLAN, with_members),
+    }
+
+
+def current_war(tag: str, epoch: int = 0) -> Dict[str, Any]:
+    """Ответ /clans/{tag}/currentwar: подготовка, бой и завершение сменяются по эпохам"""
+    state = ('preparation', 'inWar', 'warEnded')[epoch % 3]
+    return _war(_decode(tag), WAR_LOG_SIZE + epoch // 3, state)
+
+
+def war_log(tag: str, epoch: int = 0) -> Dict[str, Any]:
+    """Ответ /clans/{tag}/warlog (последние войны, без списка участников)"""
+    clan_index = _decode(tag)
+    last_war = WAR_LOG_SIZE + epoch // 3
+    items = []
+    for war_number in range(last_war - 1, last_war - 1 - WAR_LOG_SIZE, -1):
+        war = _war(clan_index, war_number, 'warEnded', with_members=False)
+        clan_stars = war['clan']['stars']
+        opponent_stars = war['opponent']['stars']
+        if clan_stars > opponent_stars:
+            result = 'win'
+        elif clan_stars < opponent_stars:
+            result = 'lose'
+        else:
+            result = 'tie'
+        war.pop('state')
+        war['result'] = result
+        items.append(war)
+    return {'items': items, 'paging': {'cursors': {}}}
+
+
+def league_group(tag: str, epoch: int = 0) -> Dict[str, Any]:
+    """Ответ /clans/{tag}/currentwar/leaguegroup"""
+    clan_index = _decode(tag)
+    rng = _rng('leaguegroup', clan_index, epoch // 21)
+    clan_indexes = [clan_index] + [10 ** 5 + rng.randrange(10 ** 5) for _ in range(7)]
+    rounds = [
+        {'warTags': [_encode(10 ** 7 + clan_index * 100 + round_number * 4 + pair, CLAN_TAG_LENGTH)
+                     for pair in range(4)]}
+        for round_number in range(7)
+    ]
+    return {
+        'state': ('preparation', 'inWar', 'ended')[epoch % 3],
+        'season': BASE_TIME.strftime('%Y-%m'),
+        'clans': [
+            {'tag': clan_tag(index), 'name': f"Clan {index}", 'clanLevel': _rng('clan', index).randint(1, 30)}
+            for index in clan_indexes
+        ],
+        'rounds': rounds,
+    }
+
+
+def cwl_war(war_tag: str, epoch: int = 0) -> Dict[str, Any]:
+    """Ответ /clanwarleagues/wars/{warTag}"""
+    war_index = _decode(war_tag)
+    clan_index = max(0, war_index - 10 ** 7) // 100
+    war = _war(clan_index, 10 ** 4 + war_index % 100, ('inWar', 'warEnded')[epoch % 2])
+    war['warTag'] = _encode(war_index, CLAN_TAG_LENGTH)
+    war['attacksPerMember'] = 1
+    return war
+
+
+def leagues(kind: str, limit: int = 100) -> Dict[str, Any]:
+    """Ответы /leagues, /builderbaseleagues, /capitalleagues и /warleagues"""
+    names = BUILDER_LEAGUES if kind == 'builderbaseleagues' else LEAGUES
+    id_base = {
+        'leagues': 29000000,
+        'builderbaseleagues': 44000000,
+        'capitalleagues': 85000000,
+        'warleagues': 48000000,
+    }.get(kind, 29000000)
+    items = [{'id': id_base + number, 'name': name} for number, name in enumerate(names)]
+    return {'items': items[:max(0, limit)], 'paging': {'cursors': {}}}
+
+
+__all__ = [
+    "player_tag",
+    "clan_tag",
+    "player_tags",
+    "clan_tags",
+    "player",
+    "clan",
+    "clan_members",
+    "current_war",
+    "war_log",
+    "league_group",
+    "cwl_war",
+    "leagues",
+]
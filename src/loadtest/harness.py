@@ -0,0 +1,359 @@
+"""
+Нагрузочный прогон CocApiClient, BuildingMonitor и WarArchiver
+
+По умолчанию поднимает стенд src.loadtest.stub_server в том же процессе,
+направляет на него клиента через COC_API_BASE_URL и использует временную
+базу данных. Для каждого сценария печатает пропускную способность и
+задержки p50/p99:
+
+    python -m src.loadtest.harness --players 2000 --concurrency 100 --latency 0.05
+    python -m src.loadtest.harness --base-url http://127.0.0.1:8089/v1 --scenarios client,bulk
+
+Сценарий query_plans (входит в набор по умолчанию) запускает аудит планов
+запросов src.loadtest.query_plans; при найденных проблемах прогон завершается
+с кодом 1.
+
+Настройки окружения выставляются до импорта config, поэтому прогон не требует
+настоящих токенов и не трогает рабочую базу.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from src.loadtest import fixtures
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ('client', 'bulk', 'monitor', 'archiver', 'query_plans')
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+class ScenarioResult:
+    """Результат сценария: длительности операций, ошибки и общее время"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.items = 0
+        self.elapsed = 0.0
+
+    def record(self, duration: float, items: int = 1):
+        self.latencies.append(duration)
+        self.items += items
+
+    def as_row(self) -> Dict[str, Any]:
+        return {
+            'scenario': self.name,
+            'ops': len(self.latencies),
+            'items': self.items,
+            'errors': self.errors,
+            'elapsed_s': self.elapsed,
+            'items_per_s': self.items / self.elapsed if self.elapsed else 0.0,
+            'p50_ms': percentile(self.latencies, 0.50) * 1000,
+            'p99_ms': percentile(self.latencies, 0.99) * 1000,
+        }
+
+
+def print_report(results: List[ScenarioResult], extra: Dict[str, Any]):
+    """Печать итоговой таблицы"""
+    header = f"{'сценарий':<16}{'операций':>10}{'объектов':>10}{'ошибок':>8}{'время, с':>10}{'объект/с':>11}{'p50, мс':>10}{'p99, мс':>10}"
+    print()
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        row = result.as_row()
+        print(f"{row['scenario']:<16}{row['ops']:>10}{row['items']:>10}{row['errors']:>8}"
+              f"{row['elapsed_s']:>10.2f}{row['items_per_s']:>11.1f}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+    for title, value in extra.items():
+        print(f"\n{title}: {value}")
+
+
+def _configure_environment(args: argparse.Namespace, base_url: str, database_path: str):
+    """Переменные окружения для config (до его первого импорта)"""
+    os.environ['COC_API_BASE_URL'] = base_url
+    os.environ.setdefault('BOT_TOKEN', 'loadtest')
+    os.environ.setdefault('COC_API_TOKEN', 'loadtest')
+    os.environ['COC_API_TOKENS'] = ','.join(f"loadtest-{number}" for number in range(args.keys))
+    os.environ['DATABASE_PATH'] = database_path
+    os.environ['COC_API_CACHE_PATH'] = ''
+    os.environ['COC_API_RATE_PER_KEY'] = str(args.rate_per_key)
+    os.environ['COC_API_BURST_PER_KEY'] = str(args.rate_per_key)
+    os.environ['COC_API_PREWARM_CONNECTIONS'] = '0'
+    os.environ['COC_API_MAX_CONCURRENCY'] = str(args.concurrency)
+    os.environ['COC_API_INTERACTIVE_CONCURRENCY'] = str(args.concurrency)
+    os.environ['COC_API_BACKGROUND_CONCURRENCY'] = str(args.concurrency)
+    os.environ['COC_API_BULK_CONCURRENCY'] = str(args.concurrency)
+
+
+async def run_client_scenario(client, tags: List[str], concurrency: int, name: str) -> ScenarioResult:
+    """Одиночные get_player_info с ограничением параллельности"""
+    from src.services.coc_api import CocApiError
+
+    result = ScenarioResult(name)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(tag: str):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                data = await client.get_player_info(tag)
+            except CocApiError:
+                result.errors += 1
+                return
+            result.record(time.perf_counter() - started)
+            if data is None:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(tag) for tag in tags))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def run_bulk_scenario(client, tags: List[str], batch_size: int) -> ScenarioResult:
+    """get_players_bulk пачками; операция - одна пачка"""
+    from src.services.coc_api import CocApiError
+
+    result = ScenarioResult('bulk')
+    started = time.perf_counter()
+    for offset in range(0, len(tags), batch_size):
+        batch = tags[offset:offset + batch_size]
+        batch_started = time.perf_counter()
+        players = await client.get_players_bulk(batch)
+        result.record(time.perf_counter() - batch_started, items=len(batch))
+        result.errors += sum(1 for value in players.values() if value is None or isinstance(value, CocApiError))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def run_monitor_scenario(client, db_service, tags: List[str], rounds: int,
+                               advance_epoch) -> ScenarioResult:
+    """Полные проходы BuildingMonitor по всем отслеживаемым игрокам"""
+    from src.models.building import BuildingTracker
+    from src.models.subscription import Subscription
+    from src.services.building_monitor import BuildingMonitor
+
+    class LoadTestBuildingMonitor(BuildingMonitor):
+        # Каждый проход проверяет всех игроков, не дожидаясь интервала подписки
+        def _get_check_interval_for_subscription(self, subscription_type: str) -> int:
+            return 0
+
+    now = datetime.now()
+    for telegram_id, tag in enumerate(tags, 1):
+        await db_service.save_subscription(Subscription(
+            telegram_id=telegram_id,
+            subscription_type='1month',
+            start_date=now,
+            end_date=now + timedelta(days=30),
+            is_active=True,
+        ))
+        await db_service.save_building_tracker(BuildingTracker(
+            telegram_id=telegram_id,
+            player_tag=tag,
+            is_active=True,
+            created_at=now.isoformat(),
+        ))
+
+    monitor = LoadTestBuildingMonitor(db_service, client)
+    result = ScenarioResult('monitor')
+    started = time.perf_counter()
+    for _ in range(rounds):
+        # Новая эпоха - у части игроков выросли уровни; кэш сбрасывается, чтобы проход шел в API
+        advance_epoch()
+        client.invalidate_cache()
+        round_started = time.perf_counter()
+        await monitor._check_all_trackers()
+        result.record(time.perf_counter() - round_started, items=len(tags))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def run_archiver_scenario(client, db_service, clan_tags: List[str], concurrency: int) -> ScenarioResult:
+    """Цикл WarArchiver (журнал войн, текущая война, снимок донатов) для каждого клана"""
+    from src.services.war_archiver import WarArchiver
+
+    result = ScenarioResult('archiver')
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def archive(clan_tag: str):
+        async with semaphore:
+            archiver = WarArchiver(clan_tag, db_service, client)
+            cycle_started = time.perf_counter()
+            try:
+                await archiver._check_war_log_for_past_wars()
+                await archiver._check_current_war()
+                await archiver._check_donation_snapshots()
+            except Exception as e:
+                logger.warning(f"Ошибка цикла архиватора для {clan_tag}: {e}")
+                result.errors += 1
+                return
+            result.record(time.perf_counter() - cycle_started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(archive(tag) for tag in clan_tags))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def run_query_plans_scenario() -> ScenarioResult:
+    """Аудит планов запросов DatabaseService на своей временной базе (ошибки - найденные проблемы)"""
+    from src.loadtest.query_plans import audit
+
+    result = ScenarioResult('query_plans')
+    started = time.perf_counter()
+    result.errors = await audit()
+    result.elapsed = time.perf_counter() - started
+    result.record(result.elapsed)
+    return result
+
+
+async def run(args: argparse.Namespace) -> List[ScenarioResult]:
+    from src.loadtest.stub_server import StubSettings, start_stub_server
+
+    settings = StubSettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        max_age=args.max_age,
+        seed=args.seed,
+    )
+    runner = None
+    base_url = args.base_url
+    if not base_url:
+        runner, base_url = await start_stub_server(settings)
+        logger.info(f"Стенд запущен: {base_url}")
+
+    workdir = tempfile.mkdtemp(prefix='coc_loadtest_')
+    database_path = os.path.join(workdir, 'loadtest.db')
+    _configure_environment(args, base_url, database_path)
+
+    # Импорт после настройки окружения: config читает его при импорте
+    from src.services.coc_api import CocApiClient
+    from src.services.database import DatabaseService
+
+    def advance_epoch():
+        settings.epoch += 1
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    player_tags = fixtures.player_tags(args.players)
+    clan_tags = fixtures.clan_tags(args.clans)
+    results: List[ScenarioResult] = []
+    extra: Dict[str, Any] = {}
+
+    if 'query_plans' in scenarios:
+        results.append(await run_query_plans_scenario())
+
+    db_service: Optional[DatabaseService] = None
+    client = CocApiClient()
+    try:
+        await client.start()
+        if 'monitor' in scenarios or 'archiver' in scenarios:
+            # Путь передается явно: api_tokens.txt может указывать на рабочую базу
+            db_service = DatabaseService(database_path)
+            await db_service.init_db()
+
+        if 'client' in scenarios:
+            client.invalidate_cache()
+            results.append(await run_client_scenario(client, player_tags, args.concurrency, 'client.cold'))
+            results.append(await run_client_scenario(client, player_tags, args.concurrency, 'client.warm'))
+        if 'bulk' in scenarios:
+            client.invalidate_cache()
+            results.append(await run_bulk_scenario(client, player_tags, args.bulk_size))
+        if 'monitor' in scenarios:
+            results.append(await run_monitor_scenario(
+                client, db_service, player_tags[:args.trackers], args.rounds, advance_epoch
+            ))
+        if 'archiver' in scenarios:
+            client.invalidate_cache()
+            results.append(await run_archiver_scenario(client, db_service, clan_tags, args.concurrency))
+
+        metrics = client.get_metrics()
+        extra['Задержки HTTP попыток по семействам, мс'] = {
+            family: {key: round(histogram[key], 1) for key in ('count', 'p50_ms', 'p99_ms', 'max_ms')}
+            for family, histogram in metrics['requests']['attempt_latency'].items()
+        }
+        extra['Пул соединений'] = metrics['connection_pool']
+        extra['Ожидание соединения, мс'] = {
+            key: round(value, 1) for key, value in metrics['requests']['connections']['queue_wait'].items()
+            if key != 'buckets'
+        }
+        extra['Кэш клиента'] = metrics['cache']
+        extra['Ограничитель частоты'] = metrics['rate_limit']
+        extra['Ошибки API'] = metrics['errors']
+        if runner is not None:
+            extra['Стенд'] = runner.app['stats'].as_dict()
+    finally:
+        await client.close()
+        if db_service is not None:
+            await db_service.close()
+        if runner is not None:
+            await runner.cleanup()
+
+    print_report(results, extra)
+    return results
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон клиента COC API и фоновых сервисов")
+    parser.add_argument('--base-url', default='', help="адрес уже запущенного стенда (по умолчанию - свой)")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"сценарии через запятую: {', '.join(SCENARIOS)}")
+    parser.add_argument('--players', type=int, default=1000, help="число игроков для client/bulk")
+    parser.add_argument('--trackers', type=int, default=300, help="число отслеживаемых игроков для monitor")
+    parser.add_argument('--rounds', type=int, default=3, help="проходов монитора зданий")
+    parser.add_argument('--clans', type=int, default=20, help="число кланов для archiver")
+    parser.add_argument('--concurrency', type=int, default=50, help="одновременных запросов")
+    parser.add_argument('--bulk-size', type=int, default=100, help="размер пачки для bulk")
+    parser.add_argument('--keys', type=int, default=4, help="число синтетических ключей API")
+    parser.add_argument('--rate-per-key', type=float, default=1000.0, help="лимит запросов в секунду на ключ")
+    parser.add_argument('--latency', type=float, default=0.02, help="задержка стенда, сек")
+    parser.add_argument('--jitter', type=float, default=0.02, help="случайная добавка к задержке, сек")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument('--retry-after', type=float, default=0.2, help="Retry-After для 429, сек")
+    parser.add_argument('--max-age', type=int, default=0, help="Cache-Control: max-age стенда, сек")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="подробный лог сервисов")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr,
+    )
+    results = asyncio.run(run(args))
+    # Регрессия плана запроса - ошибка прогона
+    if any(result.name == 'query_plans' and result.errors for result in results):
+        sys.exit(1)
+
+
+__all__ = ["ScenarioResult", "percentile", "run"]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+"""
+Аудит планов запросов DatabaseService (EXPLAIN QUERY PLAN)
+
+Вызывает все публичные методы DatabaseService на временной базе, записывает
+каждый выполненный SELECT/INSERT/UPDATE/DELETE и проверяет его план. Полный
+просмотр таблицы (SCAN <таблица> без индекса) считается регрессией, если запрос
+не подпадает под исключение ALLOWED_FULL_SCANS (метод + шаблон инструкции). Для
+методов HOT_PATH_METHODS ошибкой считается и просмотр по индексу, в том числе
+покрывающему, если он не ограничен LIMIT. Метод, который сценарий не вызывает,
+и исключение, которое ни с чем не совпало, тоже считаются ошибками:
+
+    python -m src.loadtest.query_plans
+    python -m src.loadtest.query_plans --verbose   # планы всех запросов
+
+Код возврата 1, если найдены проблемы. Аудит также выполняется сценарием
+query_plans нагрузочного прогона (src.loadtest.harness).
+"""
+import argparse
+import asyncio
+import contextvars
+import inspect
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Запросы, которым полный просмотр таблицы разрешен: (метод, регулярное выражение
+# для текста запроса с нормализованными пробелами) -> причина. Исключение действует
+# только на совпавшую инструкцию, остальные запросы метода проверяются как обычно.
+ALLOWED_FULL_SCANS: Dict[Tuple[str, str], str] = {
+    ('init_db', r'INSERT INTO (\w+)__rebuild \(.*\) SELECT .* FROM \1$'):
+        "миграция: перестройка таблицы копированием всех строк (rebuild_table)",
+    ('init_db', r'INSERT INTO cwl_season_player_(?:attacks|donations) \(.*\) SELECT '):
+        "миграция: пересборка агрегатов ЛВК из исходных таблиц",
+    ('get_all_users', r'SELECT .* FROM users ORDER BY'): "выгрузка всех пользователей",
+    ('get_subscribed_users', r'SELECT telegram_id FROM notifications$'): "рассылка всем подписчикам уведомлений",
+    ('get_notification_users', r'SELECT telegram_id FROM notifications$'): "рассылка всем подписчикам уведомлений",
+    ('rebuild_cwl_aggregates', r'INSERT INTO cwl_season_player_(?:attacks|donations) \(.*\) SELECT '):
+        "полная пересборка агрегатов из исходных таблиц",
+}
+
+# Горячие пути (каждый показ списка войн и бонусов ЛВК): здесь ошибкой считается и
+# просмотр по индексу, в том числе покрывающему. Допускается только обход индекса
+# в нужном порядке с LIMIT, без сортировки во временном B-дереве.
+HOT_PATH_METHODS = {'get_war_page', 'count_wars', 'get_cwl_season_bonus_stats'}
+
+# Методы без SQL-запросов или служебные
+NOT_AUDITED = {'close', 'flush_writes'}
+
+_DML_PREFIXES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+_REBUILD_TABLE_RE = re.compile(r'\b(\w+)__rebuild\b')
+_TABLE_REF_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_SQL_KEYWORDS = {
+    'WHERE', 'LEFT', 'INNER', 'JOIN', 'ON', 'SET', 'ORDER', 'GROUP', 'LIMIT', 'WINDOW',
+    'UNION', 'VALUES', 'SELECT', 'USING', 'AS', 'HAVING', 'DEFAULT',
+}
+
+_current_method: contextvars.ContextVar[str] = contextvars.ContextVar('query_plan_method', default='')
+_inside_batch: contextvars.ContextVar[bool] = contextvars.ContextVar('query_plan_batch', default=False)
+
+
+class RecordedQuery:
+    """Запрос, выполненный методом DatabaseService"""
+
+    __slots__ = ('method', 'sql', 'params')
+
+    def __init__(self, method: str, sql: str, params: Sequence[Any]):
+        self.method = method
+        self.sql = sql
+        self.params = tuple(params)
+
+
+class _RecordingConnection:
+    """Обертка над соединением aiosqlite, записывающая выполняемые запросы"""
+
+    def __init__(self, conn: Any, sink: List[RecordedQuery]):
+        self._conn = conn
+        self._sink = sink
+
+    def _record(self, sql: str, params: Sequence[Any]):
+        if not _inside_batch.get():
+            self._sink.append(RecordedQuery(_current_method.get(), sql, params))
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()):
+        self._record(sql, params)
+        return await self._conn.execute(sql, params)
+
+    async def executemany(self, sql: str, params_seq: Sequence[Sequence[Any]]):
+        params_seq = list(params_seq)
+        self._record(sql, params_seq[0] if params_seq else ())
+        return await self._conn.executemany(sql, params_seq)
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+
+def _make_recording_service(database_path: str, sink: List[RecordedQuery]):
+    from src.services.database import DatabaseService
+
+    class RecordingDatabaseService(DatabaseService):
+        """DatabaseService, записывающий все запросы с именем вызвавшего метода"""
+
+        async def _ensure_connection(self):
+            conn = await super()._ensure_connection()
+            if not isinstance(conn, _RecordingConnection):
+                conn = self._conn = _RecordingConnection(conn, sink)
+            return conn
+
+        async def _open_reader(self):
+            return _RecordingConnection(await super()._open_reader(), sink)
+
+        async def _enqueue_writes(self, statements):
+            # Записи из очереди выполняет фоновая задача - фиксируем их здесь, от имени вызывающего метода
+            for sql, params, many in statements:
+                params = list(params)
+                sink.append(RecordedQuery(_current_method.get(), sql, (params[0] if params else ()) if many else params))
+            await super()._enqueue_writes(statements)
+
+        async def _commit_pending_batch(self):
+            _inside_batch.set(True)
+            await super()._commit_pending_batch()
+
+    return RecordingDatabaseService(database_path, read_pool_size=2)
+
+
+async def _exercise(db, call: Callable[[str, Callable[[], Awaitable[Any]]], Awaitable[Any]]):
+    """Сценарий: каждый публичный метод DatabaseService вызывается хотя бы один раз"""
+    from src.models.building import BuildingSnapshot, BuildingTracker
+    from src.models.linked_clan import LinkedClan
+    from src.models.subscription import Subscription
+    from src.models.user import User
+    from src.models.user_profile import UserProfile
+    from src.models.war import WarToSave
+
+    now = datetime.now()
+    season = now.strftime('%Y-%m')
+    war_end = now.strftime('%Y%m%dT%H%M%S.000Z')
+
+    await call('init_db', db.init_db)
+    await call('ping', db.ping)
+    await call('get_schema_version', db.get_schema_version)
+
+    # Пользователи и профили
+    await call('save_user', lambda: db.save_user(User(1, '#P0Q2V8')))
+    await call('find_user', lambda: db.find_user(1))
+    await call('get_all_users', db.get_all_users)
+    await call('save_user_profile', lambda: db.save_user_profile(UserProfile(1, '#P0Q2V8', 'main', True)))
+    await call('get_user_profiles', lambda: db.get_user_profiles(1))
+    await call('get_user_profile_count', lambda: db.get_user_profile_count(1))
+    await call('set_primary_profile', lambda: db.set_primary_profile(1, '#P0Q2V8'))
+    await call('get_primary_profile', lambda: db.get_primary_profile(1))
+    await call('delete_user_profile', lambda: db.delete_user_profile(1, '#UNKNOWN'))
+
+    # Войны и статистика ЛВК
+    war = WarToSave(war_end, 'opponent', 5, 12, 9, 80.0, 60.0, 9, 'win', False, 0,
+                    {'#P0Q2V8': [{'stars': 3, 'destruction': 100.0, 'order': 1}]})
+    await call('save_war', lambda: db.save_war(war))
+    await call('war_exists', lambda: db.war_exists(war_end))
+    await call('get_war_page', lambda: db.get_war_page(10))
+    await call('get_war_page', lambda: db.get_war_page(10, older_than=war_end, result='lose'))
+    await call('get_war_page', lambda: db.get_war_page(10, newer_than=war_end, cwl_only=True))
+    await call('count_wars', lambda: db.count_wars(result='win'))
+    await call('count_wars', lambda: db.count_wars(cwl_only=True))
+    await call('count_wars', db.count_wars)
+    await call('get_war_details', lambda: db.get_war_details(war_end))
+    await call('save_donation_snapshot', lambda: db.save_donation_snapshot(
+        [{'tag': '#P0Q2V8', 'donations': 10}], now.isoformat()))
+    await call('get_cwl_season_bonus_stats', lambda: db.get_cwl_season_bonus_stats(season))
+    await call('rebuild_cwl_aggregates', db.rebuild_cwl_aggregates)
+    await call('get_cwl_bonus_data', lambda: db.get_cwl_bonus_data(season))
+
+    # Подписки и уведомления
+    subscription = Subscription(1, 'premium', now, now + timedelta(days=30), True, 'payment', 100.0)
+    await call('save_subscription', lambda: db.save_subscription(subscription))
+    await call('get_subscription', lambda: db.get_subscription(1))
+    await call('extend_subscription', lambda: db.extend_subscription(1, 30))
+    await call('get_expired_subscriptions', db.get_expired_subscriptions)
+    await call('get_max_linked_clans_for_user', lambda: db.get_max_linked_clans_for_user(1))
+    await call('deactivate_subscription', lambda: db.deactivate_subscription(1))
+    await call('enable_notifications', lambda: db.enable_notifications(1))
+    await call('is_notifications_enabled', lambda: db.is_notifications_enabled(1))
+    await call('toggle_notifications', lambda: db.toggle_notifications(1))
+    await call('disable_notifications', lambda: db.disable_notifications(1))
+    await call('get_notification_users', db.get_notification_users)
+    await call('get_subscribed_users', db.get_subscribed_users)
+
+    # Отслеживание зданий
+    tracker = BuildingTracker(1, '#P0Q2V8', True, now.isoformat())
+    await call('save_building_tracker', lambda: db.save_building_tracker(tracker))
+    await call('get_building_tracker', lambda: db.get_building_tracker(1))
+    await call('get_user_building_trackers', lambda: db.get_user_building_trackers(1))
+    await call('get_building_tracker_for_profile', lambda: db.get_building_tracker_for_profile(1, '#P0Q2V8'))
+    await call('toggle_building_tracker_for_profile', lambda: db.toggle_building_tracker_for_profile(1, '#P0Q2V8'))
+    await call('get_active_building_trackers', db.get_active_building_trackers)
+    await call('save_building_snapshot', lambda: db.save_building_snapshot(
+        BuildingSnapshot('#P0Q2V8', now.isoformat(), '{}')))
+    await call('get_latest_building_snapshot', lambda: db.get_latest_building_snapshot('#P0Q2V8'))
+    await call('update_tracker_last_check', lambda: db.update_tracker_last_check(1, now.isoformat(), '#P0Q2V8'))
+    await call('update_tracker_last_check', lambda: db.update_tracker_last_check(1, now.isoformat()))
+
+    # Привязанные кланы
+    linked_clan = LinkedClan(1, '#2PQU0PLJ2', 'clan', 1, now.isoformat())
+    await call('save_linked_clan', lambda: db.save_linked_clan(linked_clan))
+    await call('get_linked_clans', lambda: db.get_linked_clans(1))
+    await call('delete_linked_clan', lambda: db.delete_linked_clan(1, 1))
+
+    await call('delete_user', lambda: db.delete_user(1))
+
+
+def _table_aliases(sql: str, tables: Set[str]) -> Dict[str, str]:
+    """Имя в плане (таблица или ее псевдоним) -> таблица"""
+    aliases: Dict[str, str] = {}
+    for table, alias in _TABLE_REF_RE.findall(sql):
+        if table not in tables:
+            continue
+        aliases[table] = table
+        if alias and alias.upper() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def explain(conn: sqlite3.Connection, query: RecordedQuery) -> List[str]:
+    """Строки плана запроса"""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {query.sql}", query.params).fetchall()
+    return [row[3] for row in rows]
+
+
+def allowed_scan(method: str, sql: str) -> Optional[Tuple[str, str]]:
+    """Исключение ALLOWED_FULL_SCANS, под которое подпадает запрос"""
+    for key in ALLOWED_FULL_SCANS:
+        allowed_method, pattern = key
+        if allowed_method == method and re.match(pattern, sql):
+            return key
+    return None
+
+
+def full_table_scans(plan: Sequence[str], sql: str, tables: Set[str], strict: bool = False) -> List[str]:
+    """Таблицы, которые план просматривает целиком без индекса
+
+    strict - режим горячих путей: просмотр по индексу (и покрывающему) тоже
+    считается, если запрос не ограничен LIMIT или требует сортировки.
+    """
+    aliases = _table_aliases(sql, tables)
+    bounded = ' LIMIT ' in sql.upper() and not any('TEMP B-TREE' in line for line in plan)
+    scanned = []
+    for line in plan:
+        match = _SCAN_RE.match(line)
+        if not match:
+            continue
+        if 'INDEX' in match.group(2) and (not strict or bounded):
+            continue
+        table = aliases.get(match.group(1))
+        if table:
+            scanned.append(table)
+    return scanned
+
+
+async def audit(verbose: bool = False) -> int:
+    """Прогон аудита; возвращает число найденных проблем"""
+    from src.services.database import DatabaseService
+
+    database_path = os.path.join(tempfile.mkdtemp(prefix='clashbot-query-plans-'), 'audit.db')
+    queries: List[RecordedQuery] = []
+    db = _make_recording_service(database_path, queries)
+    called: Set[str] = set()
+
+    async def call(method: str, factory: Callable[[], Awaitable[Any]]):
+        called.add(method)
+        token = _current_method.set(method)
+        try:
+            return await factory()
+        finally:
+            _current_method.reset(token)
+
+    try:
+        await _exercise(db, call)
+        await db.flush_writes()
+    finally:
+        await db.close()
+
+    problems = 0
+    public_methods = {
+        name for name, member in inspect.getmembers(DatabaseService, inspect.iscoroutinefunction)
+        if not name.startswith('_')
+    }
+    for method in sorted(public_methods - called - NOT_AUDITED):
+        problems += 1
+        print(f"НЕ ПОКРЫТ: DatabaseService.{method} не вызывается в сценарии аудита")
+
+    conn = sqlite3.connect(database_path)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        seen: Set[Tuple[str, str]] = set()
+        used_allowances: Set[Tuple[str, str]] = set()
+        for query in queries:
+            sql = ' '.join(query.sql.split())
+            if not sql.upper().startswith(_DML_PREFIXES) or (query.method, sql) in seen:
+                continue
+            seen.add((query.method, sql))
+            explained = query
+            if query.method == 'init_db' and _REBUILD_TABLE_RE.search(query.sql):
+                # Промежуточной таблицы rebuild_table в итоговой схеме уже нет:
+                # план строится по таблице, которая ее заменила
+                explained = RecordedQuery(query.method, _REBUILD_TABLE_RE.sub(r'\1', query.sql), query.params)
+            plan = explain(conn, explained)
+            strict = query.method in HOT_PATH_METHODS
+            scans = full_table_scans(plan, sql, tables, strict=strict)
+            allowed = allowed_scan(query.method, sql) if scans else None
+            if allowed:
+                used_allowances.add(allowed)
+            if scans and not allowed:
+                problems += 1
+                kind = "ПРОСМОТР НА ГОРЯЧЕМ ПУТИ" if strict else "ПОЛНЫЙ ПРОСМОТР"
+                print(f"{kind} {', '.join(scans)} в {query.method}: {sql}")
+                for line in plan:
+                    print(f"    {line}")
+            elif verbose:
+                note = f" (разрешено: {ALLOWED_FULL_SCANS[allowed]})" if allowed else ""
+                print(f"{query.method}{note}: {sql}")
+                for line in plan:
+                    print(f"    {line}")
+    finally:
+        conn.close()
+
+    for method, pattern in sorted(set(ALLOWED_FULL_SCANS) - used_allowances):
+        problems += 1
+        print(f"ЛИШНЕЕ ИСКЛЮЧЕНИЕ: ALLOWED_FULL_SCANS[{method!r}, {pattern!r}] не совпало ни с одним просмотром")
+
+    print(f"\nПроверено запросов: {len(seen)}, методов: {len(called)}, проблем: {problems}")
+    return problems
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Аудит планов запросов DatabaseService")
+    parser.add_argument('--verbose', action='store_true', help="печатать планы всех запросов")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        stream=sys.stderr)
+    # config требует токены; аудит работает только с временной базой
+    os.environ.setdefault('BOT_TOKEN', 'query-plan-audit')
+    os.environ.setdefault('COC_API_TOKEN', 'query-plan-audit')
+    return 1 if asyncio.run(audit(args.verbose)) else 0
+
+
+__all__ = [
+    "ALLOWED_FULL_SCANS", "HOT_PATH_METHODS", "RecordedQuery", "allowed_scan", "audit", "explain",
+    "full_table_scans",
+]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Локальный стенд API Clash of Clans на aiohttp
+
+Отдает синтетические ответы из src.loadtest.fixtures по тем же путям, что и
+настоящий API, и умеет имитировать задержку сети, ошибки 5xx и ответы 429.
+Бот и нагрузочный прогон направляются на стенд через COC_API_BASE_URL:
+
+    python -m src.loadtest.stub_server --port 8089 --latency 0.05 --error-rate 0.01
+    COC_API_BASE_URL=http://127.0.0.1:8089/v1 python main.py
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from aiohttp import web
+
+from src.loadtest import fixtures
+from src.utils.json_codec import json_dumps
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/v1'
+
+
+@dataclass
+class StubSettings:
+    """Параметры стенда (можно менять на лету из нагрузочного прогона)"""
+    latency: float = 0.0  # базовая задержка ответа, сек
+    jitter: float = 0.0  # случайная добавка к задержке, сек
+    error_rate: float = 0.0  # доля ответов 503
+    rate_limit_rate: float = 0.0  # доля ответов 429
+    retry_after: float = 1.0  # значение Retry-After для 429
+    max_age: int = 0  # Cache-Control: max-age (0 - заголовок не отправляется)
+    epoch: int = 0  # номер эпохи синтетических данных
+    epoch_seconds: float = 0.0  # автоматическая смена эпохи каждые N сек (0 - выключено)
+    seed: int = 0  # зерно для внедрения задержек и ошибок
+    started_at: float = field(default_factory=time.monotonic)
+
+    def current_epoch(self) -> int:
+        if self.epoch_seconds <= 0:
+            return self.epoch
+        return self.epoch + int((time.monotonic() - self.started_at) // self.epoch_seconds)
+
+
+class StubStats:
+    """Счетчики запросов стенда"""
+
+    def __init__(self):
+        self.requests: Dict[str, int] = {}
+        self.injected_errors = 0
+        self.injected_rate_limits = 0
+        self.not_modified = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': dict(self.requests),
+            'total_requests': sum(self.requests.values()),
+            'injected_errors': self.injected_errors,
+            'injected_rate_limits': self.injected_rate_limits,
+            'not_modified': self.not_modified,
+        }
+
+
+def _json_response(payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> web.Response:
+    return web.Response(
+        body=json_dumps(payload).encode('utf-8'),
+        status=status,
+        content_type='application/json',
+        headers=headers,
+    )
+
+
+def _error(status: int, reason: str, message: str, headers: Optional[Dict[str, str]] = None) -> web.Response:
+    return _json_response({'reason': reason, 'message': message}, status=status, headers=headers)
+
+
+def _limit(request: web.Request) -> int:
+    try:
+        return int(request.query.get('limit', '100'))
+    except ValueError:
+        return 100
+
+
+# Маршрут: (имя для статистики, функция ответа)
+RouteHandler = Tuple[str, Callable[[web.Request, int], Any]]
+
+ROUTES: Dict[str, RouteHandler] = {
+    '/players/{tag}': ('players', lambda request, epoch: fixtures.player(request.match_info['tag'], epoch)),
+    '/clans/{tag}': ('clans', lambda request, epoch: fixtures.clan(request.match_info['tag'], epoch)),
+    '/clans/{tag}/members': ('members', lambda request, epoch: fixtures.clan_members(request.match_info['tag'], epoch)),
+    '/clans/{tag}/currentwar': ('currentwar', lambda request, epoch: fixtures.current_war(request.match_info['tag'], epoch)),
+    '/clans/{tag}/warlog': ('warlog', lambda request, epoch: fixtures.war_log(request.match_info['tag'], epoch)),
+    '/clans/{tag}/currentwar/leaguegroup': (
+        'leaguegroup', lambda request, epoch: fixtures.league_group(request.match_info['tag'], epoch)
+    ),
+    '/clanwarleagues/wars/{tag}': ('cwlwar', lambda request, epoch: fixtures.cwl_war(request.match_info['tag'], epoch)),
+    '/leagues': ('leagues', lambda request, epoch: fixtures.leagues('leagues', _limit(request))),
+    '/builderbaseleagues': (
+        'leagues', lambda request, epoch: fixtures.leagues('builderbaseleagues', _limit(request))
+    ),
+    '/capitalleagues': ('leagues', lambda request, epoch: fixtures.leagues('capitalleagues', _limit(request))),
+    '/warleagues': ('leagues', lambda request, epoch: fixtures.leagues('warleagues', _limit(request))),
+}
+
+
+def create_app(settings: Optional[StubSettings] = None) -> web.Application:
+    """Создание приложения стенда"""
+    settings = settings or StubSettings()
+    stats = StubStats()
+    fault_rng = random.Random(settings.seed)
+
+    def make_handler(family: str, build: Callable[[web.Request, int], Any]):
+        async def handler(request: web.Request) -> web.Response:
+            stats.requests[family] = stats.requests.get(family, 0) + 1
+
+            if not request.headers.get('Authorization', '').startswith('Bearer '):
+                return _error(403, 'accessDenied', 'Invalid authorization')
+
+            delay = settings.latency + (fault_rng.uniform(0, settings.jitter) if settings.jitter > 0 else 0.0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            roll = fault_rng.random()
+            if roll < settings.rate_limit_rate:
+                stats.injected_rate_limits += 1
+                return _error(429, 'requestThrottled', 'Request was throttled',
+                              headers={'Retry-After': f"{settings.retry_after:g}"})
+            if roll < settings.rate_limit_rate + settings.error_rate:
+                stats.injected_errors += 1
+                return _error(503, 'inMaintenance', 'Service is temporarily unavailable')
+
+            body = json_dumps(build(request, settings.current_epoch())).encode('utf-8')
+            headers = {'ETag': '"' + hashlib.md5(body).hexdigest() + '"'}
+            if settings.max_age > 0:
+                headers['Cache-Control'] = f"public, max-age={settings.max_age}"
+            if request.headers.get('If-None-Match') == headers['ETag']:
+                stats.not_modified += 1
+                return web.Response(status=304, headers=headers)
+            return web.Response(body=body, content_type='application/json', headers=headers)
+
+        return handler
+
+    async def stats_handler(request: web.Request) -> web.Response:
+        return _json_response(stats.as_dict())
+
+    app = web.Application()
+    app['settings'] = settings
+    app['stats'] = stats
+    for path, (family, build) in ROUTES.items():
+        app.router.add_get(API_PREFIX + path, make_handler(family, build))
+    app.router.add_get('/__stub/stats', stats_handler)
+    return app
+
+
+async def start_stub_server(settings: Optional[StubSettings] = None, host: str = '127.0.0.1',
+                            port: int = 0) -> Tuple[web.AppRunner, str]:
+    """Запуск стенда в текущем цикле событий: (runner, базовый URL API)
+
+    port=0 выбирает свободный порт. Остановка - await runner.cleanup().
+    """
+    app = create_app(settings)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}{API_PREFIX}"
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Локальный стенд API Clash of Clans")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help="базовая задержка ответа, сек")
+    parser.add_argument('--jitter', type=float, default=0.0, help="случайная добавка к задержке, сек")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After для ответов 429, сек")
+    parser.add_argument('--max-age', type=int, default=0, help="Cache-Control: max-age, сек")
+    parser.add_argument('--epoch-seconds', type=float, default=0.0,
+                        help="смена эпохи синтетических данных каждые N сек")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    settings = StubSettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        max_age=args.max_age,
+        epoch_seconds=args.epoch_seconds,
+        seed=args.seed,
+    )
+    logger.info(f"Стенд COC API: http://{args.host}:{args.port}{API_PREFIX}")
+    web.run_app(create_app(settings), host=args.host, port=args.port, access_log=None, print=None)
+
+
+__all__ = ["StubSettings", "create_app", "start_stub_server"]
+
+
+if __name__ == '__main__':
+    main()
@@ -5,5 +5,7 @@ from .user import User
 from .war import WarToSave, AttackData
 from .subscription import Subscription
 from .building import BuildingSnapshot, BuildingUpgrade, BuildingTracker
+from .coc import Player, ClanMember, Clan, War, WarClan, WarMember, Attack
 
-__all__ = ['User', 'WarToSave', 'AttackData', 'Subscription', 'BuildingSnapshot', 'BuildingUpgrade', 'BuildingTracker']
\ No newline at end of file
+__all__ = ['User', 'WarToSave', 'AttackData', 'Subscription', 'BuildingSnapshot', 'BuildingUpgrade', 'BuildingTracker',
+           'Player', 'ClanMember', 'Clan', 'War', 'WarClan', 'WarMember', 'Attack']
\ No newline at end of file
@@ -0,0 +1,389 @@
+"""
+Типизированные модели ответов API Clash of Clans
+
+Модели компактные (__slots__). Их строит CocApiClient (get_player, get_clan,
+get_clan_member_list, get_current_war, get_war_log) и хранит рядом с
+закэшированным ответом, поэтому на один ответ API приходится одна модель,
+сколько бы раз он ни отображался. Скалярные поля читаются сразу, а вложенные
+коллекции (герои, войска, достижения, участники, атаки) разбираются лениво при
+первом обращении и запоминаются.
+
+Поле raw - ссылка на тот же разобранный словарь, который держит кэш ответов
+(он нужен постоянному кэшу и условным запросам по ETag), а не его копия: это
+один указатель на модель. Из него лениво разбираются коллекции и читаются
+редкие поля, не вынесенные в модель.
+"""
+from typing import Any, Dict, List, Optional
+
+
+class Unit:
+    """Герой, войско, заклинание или снаряжение героя"""
+
+    __slots__ = ('name', 'level', 'max_level', 'village')
+
+    def __init__(self, name: Optional[str], level: Optional[int],
+                 max_level: Optional[int] = None, village: Optional[str] = None):
+        self.name = name
+        self.level = level
+        self.max_level = max_level
+        self.village = village
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Unit':
+        return cls(data.get('name'), data.get('level'), data.get('maxLevel'), data.get('village'))
+
+    def __repr__(self) -> str:
+        return f"Unit({self.name!r}, level={self.level!r})"
+
+
+class Achievement:
+    """Достижение игрока"""
+
+    __slots__ = ('name', 'value', 'stars', 'target')
+
+    def __init__(self, name: Optional[str], value: Optional[int],
+                 stars: Optional[int] = None, target: Optional[int] = None):
+        self.name = name
+        self.value = value
+        self.stars = stars
+        self.target = target
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Achievement':
+        return cls(data.get('name'), data.get('value'), data.get('stars'), data.get('target'))
+
+    def __repr__(self) -> str:
+        return f"Achievement({self.name!r}, value={self.value!r})"
+
+
+def _units(items: Optional[List[Dict[str, Any]]]) -> List[Unit]:
+    return [Unit.from_dict(item) for item in items or ()]
+
+
+class PlayerClan:
+    """Краткая информация о клане игрока"""
+
+    __slots__ = ('tag', 'name', 'role', 'clan_level')
+
+    def __init__(self, tag: str, name: str, role: str, clan_level: int):
+        self.tag = tag
+        self.name = name
+        self.role = role
+        self.clan_level = clan_level
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PlayerClan':
+        return cls(
+            data.get('tag', ''),
+            data.get('name', ''),
+            data.get('role', 'member'),
+            data.get('clanLevel', 0),
+        )
+
+
+class Player:
+    """Игрок (ответ /players/{tag})"""
+
+    __slots__ = (
+        'raw', 'tag', 'name', 'town_hall_level', 'exp_level', 'trophies', 'best_trophies',
+        'war_stars', 'attack_wins', 'defense_wins', 'donations', 'donations_received',
+        'clan_rank', 'league_name', 'clan',
+        'builder_hall_level', 'builder_base_trophies', 'builder_base_best_trophies',
+        'builder_base_battle_wins', 'builder_base_attack_wins', 'builder_base_defense_wins',
+        'builder_base_win_streak', 'builder_base_league_name',
+        '_heroes', '_hero_equipment', '_troops', '_spells', '_achievements',
+    )
+
+    def __init__(self, raw: Dict[str, Any]):
+        get = raw.get
+        self.raw = raw
+        self.tag: str = get('tag', '')
+        self.name: str = get('name', '')
+        self.town_hall_level: int = get('townHallLevel', 0)
+        self.exp_level: int = get('expLevel', 0)
+        self.trophies: int = get('trophies', 0)
+        self.best_trophies: int = get('bestTrophies', 0)
+        self.war_stars: int = get('warStars', 0)
+        self.attack_wins: int = get('attackWins', 0)
+        self.defense_wins: int = get('defenseWins', 0)
+        self.donations: int = get('donations', 0)
+        self.donations_received: int = get('donationsReceived', 0)
+        self.clan_rank: Optional[int] = get('clanRank')
+
+        league = get('league')
+        self.league_name: Optional[str] = league.get('name') if league else None
+        clan = get('clan')
+        self.clan: Optional[PlayerClan] = PlayerClan.from_dict(clan) if clan else None
+
+        # База строителя: новые поля с откатом на устаревшие versus-поля
+        self.builder_hall_level: int = get('builderHallLevel', 0)
+        trophies = get('builderBaseTrophies')
+        self.builder_base_trophies: Optional[int] = trophies if trophies is not None else get('versusTrophies', 0)
+        best = get('builderBaseBestTrophies')
+        self.builder_base_best_trophies: Optional[int] = best if best is not None else get('bestVersusTrophies', 0)
+        battle_wins = get('builderBaseBattleWins')
+        self.builder_base_battle_wins: Optional[int] = (
+            battle_wins if battle_wins is not None else get('versusBattleWins')
+        )
+        self.builder_base_attack_wins: Optional[int] = get('builderBaseAttackWins')
+        self.builder_base_defense_wins: Optional[int] = get('builderBaseDefenseWins')
+        self.builder_base_win_streak: Optional[int] = get('builderBaseWinStreak')
+        builder_league = get('builderBaseLeague')
+        self.builder_base_league_name: Optional[str] = (
+            builder_league.get('name') if builder_league else None
+        )
+
+        self._heroes: Optional[List[Unit]] = None
+        self._hero_equipment: Optional[List[Unit]] = None
+        self._troops: Optional[List[Unit]] = None
+        self._spells: Optional[List[Unit]] = None
+        self._achievements: Optional[List[Achievement]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Player':
+        return cls(data)
+
+    @property
+    def heroes(self) -> List[Unit]:
+        if self._heroes is None:
+            self._heroes = _units(self.raw.get('heroes'))
+        return self._heroes
+
+    @property
+    def hero_equipment(self) -> List[Unit]:
+        if self._hero_equipment is None:
+            self._hero_equipment = _units(self.raw.get('heroEquipment'))
+        return self._hero_equipment
+
+    @property
+    def troops(self) -> List[Unit]:
+        if self._troops is None:
+            self._troops = _units(self.raw.get('troops'))
+        return self._troops
+
+    @property
+    def spells(self) -> List[Unit]:
+        if self._spells is None:
+            self._spells = _units(self.raw.get('spells'))
+        return self._spells
+
+    @property
+    def achievements(self) -> List[Achievement]:
+        if self._achievements is None:
+            self._achievements = [Achievement.from_dict(item) for item in self.raw.get('achievements') or ()]
+        return self._achievements
+
+    def find_achievement(self, name: str) -> Optional[Achievement]:
+        """Поиск достижения по названию"""
+        for achievement in self.achievements:
+            if achievement.name == name:
+                return achievement
+        return None
+
+    def __repr__(self) -> str:
+        return f"Player({self.tag!r}, {self.name!r})"
+
+
+class ClanMember:
+    """Участник клана (элемент memberList или /clans/{tag}/members)"""
+
+    __slots__ = ('tag', 'name', 'role', 'exp_level', 'trophies', 'clan_rank',
+                 'donations', 'donations_received')
+
+    def __init__(self, tag: str, name: str, role: str, exp_level: int, trophies: int,
+                 clan_rank: int, donations: int, donations_received: int):
+        self.tag = tag
+        self.name = name
+        self.role = role
+        self.exp_level = exp_level
+        self.trophies = trophies
+        self.clan_rank = clan_rank
+        self.donations = donations
+        self.donations_received = donations_received
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ClanMember':
+        get = data.get
+        return cls(
+            get('tag', ''),
+            get('name', ''),
+            get('role', 'member'),
+            get('expLevel', 0),
+            get('trophies', 0),
+            get('clanRank', 0),
+            get('donations', 0),
+            get('donationsReceived', 0),
+        )
+
+    @classmethod
+    def list_from(cls, items: Optional[List[Dict[str, Any]]]) -> List['ClanMember']:
+        return [cls.from_dict(item) for item in items or ()]
+
+    def __repr__(self) -> str:
+        return f"ClanMember({self.tag!r}, {self.name!r})"
+
+
+class Clan:
+    """Клан (ответ /clans/{tag})"""
+
+    __slots__ = ('raw', 'tag', 'name', 'description', 'clan_level', 'members_count',
+                 'location_name', 'war_wins', 'war_losses', 'war_ties', '_members')
+
+    def __init__(self, raw: Dict[str, Any]):
+        get = raw.get
+        self.raw = raw
+        self.tag: str = get('tag', '')
+        self.name: str = get('name', '')
+        self.description: Optional[str] = get('description')
+        self.clan_level: int = get('clanLevel', 0)
+        self.members_count: int = get('members', 0)
+        location = get('location')
+        self.location_name: Optional[str] = location.get('name') if location else None
+        self.war_wins: int = get('warWins', 0)
+        self.war_losses: int = get('warLosses', 0)
+        self.war_ties: int = get('warTies', 0)
+        self._members: Optional[List[ClanMember]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Clan':
+        return cls(data)
+
+    @property
+    def members(self) -> List[ClanMember]:
+        if self._members is None:
+            self._members = ClanMember.list_from(self.raw.get('memberList'))
+        return self._members
+
+    def __repr__(self) -> str:
+        return f"Clan({self.tag!r}, {self.name!r})"
+
+
+class Attack:
+    """Атака в клановой войне"""
+
+    __slots__ = ('attacker_tag', 'defender_tag', 'stars', 'destruction', 'order', 'duration')
+
+    def __init__(self, attacker_tag: str, defender_tag: str, stars: int,
+                 destruction: float, order: int, duration: Optional[int] = None):
+        self.attacker_tag = attacker_tag
+        self.defender_tag = defender_tag
+        self.stars = stars
+        self.destruction = destruction
+        self.order = order
+        self.duration = duration
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Attack':
+        get = data.get
+        return cls(
+            get('attackerTag', ''),
+            get('defenderTag', ''),
+            get('stars', 0),
+            get('destructionPercentage', 0.0),
+            get('order', 0),
+            get('duration'),
+        )
+
+
+class WarMember:
+    """Участник клановой войны"""
+
+    __slots__ = ('raw', 'tag', 'name', 'town_hall_level', 'map_position', '_attacks')
+
+    def __init__(self, raw: Dict[str, Any]):
+        get = raw.get
+        self.raw = raw
+        self.tag: str = get('tag', '')
+        self.name: str = get('name', '')
+        self.town_hall_level: int = get('townhallLevel', 0)
+        self.map_position: int = get('mapPosition', 0)
+        self._attacks: Optional[List[Attack]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'WarMember':
+        return cls(data)
+
+    @property
+    def attacks(self) -> List[Attack]:
+        if self._attacks is None:
+            self._attacks = [Attack.from_dict(item) for item in self.raw.get('attacks') or ()]
+        return self._attacks
+
+    def __repr__(self) -> str:
+        return f"WarMember({self.tag!r}, {self.name!r})"
+
+
+class WarClan:
+    """Сторона клановой войны (наш клан или противник)"""
+
+    __slots__ = ('raw', 'tag', 'name', 'stars', 'destruction', 'attacks', '_members')
+
+    def __init__(self, raw: Dict[str, Any]):
+        get = raw.get
+        self.raw = raw
+        self.tag: str = get('tag', '')
+        self.name: str = get('name', '')
+        self.stars: int = get('stars', 0)
+        self.destruction: float = get('destructionPercentage', 0.0)
+        self.attacks: int = get('attacks', 0)
+        self._members: Optional[List[WarMember]] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'WarClan':
+        return cls(data or {})
+
+    @property
+    def members(self) -> List[WarMember]:
+        if self._members is None:
+            self._members = [WarMember.from_dict(item) for item in self.raw.get('members') or ()]
+        return self._members
+
+    @property
+    def member_count(self) -> int:
+        """Количество участников без разбора их атак"""
+        return len(self.raw.get('members') or ())
+
+    def __bool__(self) -> bool:
+        return bool(self.raw)
+
+    def __repr__(self) -> str:
+        return f"WarClan({self.tag!r}, {self.name!r})"
+
+
+class War:
+    """Клановая война (текущая война, война ЛВК или запись журнала войн)"""
+
+    __slots__ = ('raw', 'state', 'result', 'team_size', 'start_time', 'end_time',
+                 'clan', 'opponent')
+
+    def __init__(self, raw: Dict[str, Any]):
+        get = raw.get
+        self.raw = raw
+        self.state: str = get('state', '')
+        self.result: Optional[str] = get('result')
+        self.team_size: Optional[int] = get('teamSize')
+        self.start_time: Optional[str] = get('startTime')
+        self.end_time: Optional[str] = get('endTime')
+        self.clan = WarClan.from_dict(get('clan'))
+        self.opponent = WarClan.from_dict(get('opponent'))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'War':
+        return cls(data)
+
+    def __repr__(self) -> str:
+        return f"War({self.clan.name!r} vs {self.opponent.name!r}, state={self.state!r})"
+
+
+__all__ = [
+    "Unit",
+    "Achievement",
+    "PlayerClan",
+    "Player",
+    "ClanMember",
+    "Clan",
+    "Attack",
+    "WarMember",
+    "WarClan",
+    "War",
+]
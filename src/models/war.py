@@ -2,7 +2,7 @@
 Модели данных для войн - аналог Java WarToSave и AttackData
 """
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import List, Dict
 
 
 @dataclass
@@ -50,26 +50,3 @@ class WarToSave:
         self.is_cwl_war = is_cwl_war
         self.total_violations = total_violations
         self.attacks_by_member = attacks_by_member or {}
-
-
-@dataclass
-class Player:
-    """Модель игрока из COC API"""
-    tag: str
-    name: str
-    town_hall_level: int
-    trophies: int
-    clan: Optional[Dict] = None
-    
-    
-@dataclass
-class Clan:
-    """Модель клана из COC API"""
-    tag: str
-    name: str
-    description: str
-    location: Optional[Dict] = None
-    members: List[Dict] = None
-    war_wins: int = 0
-    war_losses: int = 0
-    war_ties: int = 0
\ No newline at end of file
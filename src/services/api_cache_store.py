@@ -0,0 +1,124 @@
+"""Persistent SQLite store for CoC API responses (second-level cache under CocApiClient)."""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, List, Optional, Tuple
+
+try:
+    import aiosqlite
+except ImportError as exc:  # pragma: no cover - environment specific
+    raise RuntimeError(
+        "Пакет 'aiosqlite' обязателен для работы с локальной базой данных. Установите его командой 'pip install aiosqlite'."
+    ) from exc
+
+from src.utils.json_codec import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentResponseStore:
+    """Хранилище ответов API на диске: переживает перезапуски бота.
+
+    Для каждого эндпоинта хранится тело ответа, время получения и TTL.
+    Время хранится по системным часам, поэтому после перезапуска
+    оставшийся срок жизни записи вычисляется корректно.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[aiosqlite.Connection] = None
+
+    async def open(self):
+        if self._conn is not None:
+            return
+        self._conn = await aiosqlite.connect(self.path)
+        await self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+
+            CREATE TABLE IF NOT EXISTS api_cache (
+                endpoint TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                ttl REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_api_cache_expires ON api_cache(expires_at);
+            """
+        )
+        await self._conn.commit()
+        logger.info("Постоянный кэш API открыт: %s", self.path)
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def load(self, limit: int) -> List[Tuple[str, Any, float]]:
+        """Загрузка свежих записей для прогрева: (endpoint, данные, оставшийся TTL)"""
+        if self._conn is None:
+            return []
+        now = time.time()
+        await self._conn.execute("DELETE FROM api_cache WHERE expires_at <= ?", (now,))
+        await self._conn.commit()
+        cursor = await self._conn.execute(
+            """
+            SELECT endpoint, payload, expires_at
+            FROM api_cache
+            ORDER BY fetched_at DESC
+            LIMIT ?
+            """,
+            (limit,),
+        )
+        rows = await cursor.fetchall()
+        await cursor.close()
+        entries: List[Tuple[str, Any, float]] = []
+        # Старые записи первыми, чтобы самые свежие оказались в конце LRU
+        for endpoint, payload, expires_at in reversed(rows):
+            try:
+                entries.append((endpoint, json_loads(payload), expires_at - now))
+            except ValueError:
+                logger.warning("Поврежденная запись постоянного кэша: %s", endpoint)
+        return entries
+
+    async def get(self, endpoint: str) -> Optional[Tuple[Any, float]]:
+        """Получение свежей записи: (данные, оставшийся TTL) или None"""
+        if self._conn is None:
+            return None
+        now = time.time()
+        cursor = await self._conn.execute(
+            "SELECT payload, expires_at FROM api_cache WHERE endpoint = ? AND expires_at > ?",
+            (endpoint, now),
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
+        if not row:
+            return None
+        try:
+            return json_loads(row[0]), row[1] - now
+        except ValueError:
+            return None
+
+    async def put(self, endpoint: str, payload: Any, ttl: float):
+        """Сохранение ответа с указанным TTL"""
+        if self._conn is None or ttl <= 0:
+            return
+        now = time.time()
+        await self._conn.execute(
+            """
+            INSERT INTO api_cache (endpoint, payload, fetched_at, ttl, expires_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(endpoint) DO UPDATE SET
+                payload=excluded.payload,
+                fetched_at=excluded.fetched_at,
+                ttl=excluded.ttl,
+                expires_at=excluded.expires_at
+            """,
+            (endpoint, json_dumps(payload), now, ttl, now + ttl),
+        )
+        await self._conn.commit()
+
+
+__all__ = ["PersistentResponseStore"]
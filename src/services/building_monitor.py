@@ -8,8 +8,10 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 
 from src.services.database import DatabaseService
-from src.services.coc_api import CocApiClient
+from src.services.coc_api import CocApiClient, CocApiError, PLAYER_LEVELS_PROJECTION
+from src.utils.request_scheduler import RequestPriority, set_request_priority
 from src.models.building import BuildingSnapshot, BuildingUpgrade, BuildingTracker
+from src.models.coc import Player
 from config.config import config
 
 logger = logging.getLogger(__name__)
@@ -26,6 +28,9 @@ class BuildingMonitor:
         self.is_running = False
         self.task = None
         
+        # Сколько игроков проверяется одновременно во время обхода
+        self._check_semaphore = asyncio.Semaphore(config.COC_API_BULK_CONCURRENCY)
+        
         # Интервал проверки - базовый интервал (90 секунд - для соответствия политике SuperCell)
         self.min_check_interval = 90  # 90 секунд (1.5 минуты) - интервал для всех пользователей
         
@@ -94,8 +99,18 @@ class BuildingMonitor:
     
     async def _monitoring_loop(self):
         """Основной цикл мониторинга"""
+        # Запросы монитора уступают очередь интерактивным запросам пользователей
+        set_request_priority(RequestPriority.BACKGROUND)
+
         while self.is_running:
             try:
+                # Пока API недоступен, не опрашиваем его впустую
+                if not self.coc_client.is_api_available():
+                    delay = max(self.coc_client.get_api_retry_delay(), 5)
+                    logger.warning(f"[Монитор зданий] API недоступен, пауза {delay:.0f} сек")
+                    await asyncio.sleep(delay)
+                    continue
+
                 await self._check_all_trackers()
                 
                 # Ждем до следующей проверки (минимальный интервал)
@@ -114,6 +129,7 @@ class BuildingMonitor:
             logger.info(f"[Монитор зданий] Проверка {len(trackers)} активных отслеживателей")
             
             current_time = datetime.now()
+            due_trackers: List[BuildingTracker] = []
             
             for tracker in trackers:
                 # Проверяем, что у пользователя есть активная подписка
@@ -138,19 +154,64 @@ class BuildingMonitor:
                         # Если формат времени неверный, продолжаем проверку
                         pass
                 
-                await self._check_player_buildings(tracker)
+                due_trackers.append(tracker)
+
+            if not due_trackers:
+                return
+
+            # Прерываем обход, если API недоступен
+            if not self.coc_client.is_api_available():
+                logger.warning("[Монитор зданий] API недоступен, проверка отложена")
+                return
+
+            # Запрашиваем всех игроков параллельно и обрабатываем по мере готовности
+            trackers_by_tag: Dict[str, List[BuildingTracker]] = {}
+            for tracker in due_trackers:
+                trackers_by_tag.setdefault(tracker.player_tag, []).append(tracker)
+
+            # Игроки обрабатываются параллельно (не больше COC_API_BULK_CONCURRENCY одновременно),
+            # чтобы их записи в БД фиксировались общими пакетами
+            checks: List[asyncio.Task] = []
+            async with self.coc_client as client:
+                async for player_tag, player in client.iter_players_bulk(
+                    trackers_by_tag, projection=PLAYER_LEVELS_PROJECTION, as_models=True
+                ):
+                    if isinstance(player, CocApiError):
+                        logger.warning(f"[Монитор зданий] API недоступен для игрока {player_tag}: {player}")
+                        continue
+                    if not player:
+                        logger.warning(f"Не удалось получить данные игрока {player_tag}")
+                        continue
+                    checks.append(asyncio.create_task(
+                        self._check_player_trackers(trackers_by_tag[player_tag], player)
+                    ))
+            if checks:
+                results = await asyncio.gather(*checks, return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(f"[Монитор зданий] Ошибка при проверке игрока: {result}")
                 
         except Exception as e:
             logger.error(f"[Монитор зданий] Ошибка при проверке отслеживателей: {e}")
     
-    async def _check_player_buildings(self, tracker: BuildingTracker):
-        """Проверка зданий конкретного игрока"""
+    async def _check_player_trackers(self, trackers: List[BuildingTracker], player: Player):
+        """Проверка отслеживателей одного игрока по очереди: они делят один снимок зданий"""
+        async with self._check_semaphore:
+            for tracker in trackers:
+                try:
+                    await self._check_player_buildings(tracker, player)
+                except Exception as e:
+                    logger.error(f"[Монитор зданий] Ошибка при проверке игрока {tracker.player_tag}: {e}")
+
+    async def _check_player_buildings(self, tracker: BuildingTracker, player: Optional[Player] = None):
+        """Проверка зданий конкретного игрока (модель игрока можно передать заранее)"""
         try:
             # Получаем текущую информацию о игроке
-            async with self.coc_client as client:
-                player_data = await client.get_player_info(tracker.player_tag)
+            if player is None:
+                async with self.coc_client as client:
+                    player = await client.get_player(tracker.player_tag, projection=PLAYER_LEVELS_PROJECTION)
                 
-                if not player_data:
+                if not player:
                     logger.warning(f"Не удалось получить данные игрока {tracker.player_tag}")
                     return
             
@@ -159,19 +220,19 @@ class BuildingMonitor:
             
             if not last_snapshot:
                 # Создаем первый снимок
-                await self._create_initial_snapshot(tracker.player_tag, player_data)
-                logger.info(f"Создан первый снимок зданий для игрока {tracker.player_tag}")
+                await self._create_initial_snapshot(tracker.player_tag, player)
+                logger.debug("Создан первый снимок зданий для игрока %s", tracker.player_tag)
                 return
             
             # Сравниваем здания
-            upgrades = await self._compare_buildings(last_snapshot, player_data)
+            upgrades = await self._compare_buildings(last_snapshot, player)
             
             if upgrades:
                 # Отправляем уведомления об улучшениях с информацией об игроке
                 await self._send_upgrade_notifications(tracker.telegram_id, upgrades, tracker.player_tag)
                 
                 # Сохраняем новый снимок
-                await self._create_snapshot(tracker.player_tag, player_data)
+                await self._create_snapshot(tracker.player_tag, player)
             
             # Обновляем время последней проверки
             now = datetime.now().isoformat()
@@ -180,60 +241,59 @@ class BuildingMonitor:
         except Exception as e:
             logger.error(f"[Монитор зданий] Ошибка при проверке игрока {tracker.player_tag}: {e}")
     
-    async def _create_initial_snapshot(self, player_tag: str, player_data: Dict[Any, Any]):
+    async def _create_initial_snapshot(self, player_tag: str, player: Player):
         """Создание первого снимка зданий"""
-        await self._create_snapshot(player_tag, player_data)
+        await self._create_snapshot(player_tag, player)
     
-    async def _create_snapshot(self, player_tag: str, player_data: Dict[Any, Any]):
+    @staticmethod
+    def _extract_buildings(player: Player) -> Dict[str, Any]:
+        """Уровни зданий, героев, войск и заклинаний игрока для снимка"""
+        buildings: Dict[str, Any] = {}
+        
+        # Ратуша
+        if player.town_hall_level:
+            buildings['Town Hall'] = player.town_hall_level
+        
+        # Герои
+        for hero in player.heroes:
+            if hero.name is not None and hero.level is not None:
+                buildings[hero.name] = hero.level
+        
+        # Снаряжение героев
+        for equipment in player.hero_equipment:
+            if equipment.name is not None and equipment.level is not None:
+                buildings[f"{equipment.name} (снаряжение)"] = equipment.level
+        
+        # Войска (улучшаются в лаборатории)
+        for troop in player.troops:
+            if troop.name is not None and troop.level is not None:
+                buildings[f"{troop.name} (войска)"] = troop.level
+        
+        # Заклинания
+        for spell in player.spells:
+            if spell.name is not None and spell.level is not None:
+                buildings[f"{spell.name} (заклинание)"] = spell.level
+        
+        # Стены (по значению достижения Wall Buster)
+        wall_buster = player.find_achievement('Wall Buster')
+        if wall_buster is not None and wall_buster.value is not None:
+            buildings['Walls (стены)'] = wall_buster.value
+        
+        # Деревня строителя
+        if player.builder_hall_level:
+            buildings['[БД] Builder Hall'] = player.builder_hall_level
+        
+        # Уровень лиги деревни строителя как индикатор прогресса
+        league_name = player.builder_base_league_name
+        if league_name and league_name != 'Unranked':
+            buildings['[БД] League'] = league_name
+        
+        return buildings
+    
+    async def _create_snapshot(self, player_tag: str, player: Player):
         """Создание снимка состояния зданий"""
         try:
-            buildings_data = {}
-            
-            # Извлекаем данные о зданиях (включая ратушу)
-            if 'townHallLevel' in player_data:
-                buildings_data['Town Hall'] = player_data['townHallLevel']
-            
-            # Извлекаем данные о героях
-            if 'heroes' in player_data:
-                for hero in player_data['heroes']:
-                    if 'name' in hero and 'level' in hero:
-                        buildings_data[hero['name']] = hero['level']
-            
-            # Извлекаем данные о питомцах
-            if 'heroEquipment' in player_data:
-                for equipment in player_data['heroEquipment']:
-                    if 'name' in equipment and 'level' in equipment:
-                        buildings_data[f"{equipment['name']} (снаряжение)"] = equipment['level']
-            
-            # Извлекаем данные о войсках (войска могут улучшаться в лаборатории)
-            if 'troops' in player_data:
-                for troop in player_data['troops']:
-                    if 'name' in troop and 'level' in troop:
-                        buildings_data[f"{troop['name']} (войска)"] = troop['level']
-            
-            # Извлекаем данные о заклинаниях
-            if 'spells' in player_data:
-                for spell in player_data['spells']:
-                    if 'name' in spell and 'level' in spell:
-                        buildings_data[f"{spell['name']} (заклинание)"] = spell['level']
-            
-            # Извлекаем данные о стенах (по общему уровню)
-            if 'achievements' in player_data:
-                for achievement in player_data['achievements']:
-                    if achievement.get('name') == 'Wall Buster' and 'value' in achievement:
-                        buildings_data['Walls (стены)'] = achievement['value']
-                        break
-                        
-            # Извлекаем данные о деревне строителя
-            if 'builderHallLevel' in player_data:
-                buildings_data['[БД] Builder Hall'] = player_data['builderHallLevel']
-                
-            # Другие здания деревни строителя (если есть данные)
-            if 'builderBaseLeague' in player_data:
-                # Уровень лиги деревни строителя как индикатор прогресса
-                league_name = player_data['builderBaseLeague'].get('name', 'Unranked')
-                if league_name != 'Unranked':
-                    buildings_data['[БД] League'] = league_name
+            buildings_data = self._extract_buildings(player)
             
             snapshot = BuildingSnapshot(
                 player_tag=player_tag,
@@ -246,7 +306,7 @@ class BuildingMonitor:
         except Exception as e:
             logger.error(f"Ошибка при создании снимка зданий: {e}")
     
-    async def _compare_buildings(self, last_snapshot: BuildingSnapshot, current_data: Dict[Any, Any]) -> List[BuildingUpgrade]:
+    async def _compare_buildings(self, last_snapshot: BuildingSnapshot, player: Player) -> List[BuildingUpgrade]:
         """Сравнение зданий и поиск улучшений"""
         upgrades = []
         
@@ -254,52 +314,8 @@ class BuildingMonitor:
             # Загружаем данные из последнего снимка
             old_buildings = json.loads(last_snapshot.buildings_data)
             
-            # Создаем текущий снимок для сравнения
-            current_buildings = {}
-            
-            # Ратуша
-            if 'townHallLevel' in current_data:
-                current_buildings['Town Hall'] = current_data['townHallLevel']
-            
-            # Герои
-            if 'heroes' in current_data:
-                for hero in current_data['heroes']:
-                    if 'name' in hero and 'level' in hero:
-                        current_buildings[hero['name']] = hero['level']
-            
-            # Снаряжение героев/питомцы
-            if 'heroEquipment' in current_data:
-                for equipment in current_data['heroEquipment']:
-                    if 'name' in equipment and 'level' in equipment:
-                        current_buildings[f"{equipment['name']} (снаряжение)"] = equipment['level']
-            
-            # Войска
-            if 'troops' in current_data:
-                for troop in current_data['troops']:
-                    if 'name' in troop and 'level' in troop:
-                        current_buildings[f"{troop['name']} (войска)"] = troop['level']
-            
-            # Заклинания
-            if 'spells' in current_data:
-                for spell in current_data['spells']:
-                    if 'name' in spell and 'level' in spell:
-                        current_buildings[f"{spell['name']} (заклинание)"] = spell['level']
-            
-            # Стены
-            if 'achievements' in current_data:
-                for achievement in current_data['achievements']:
-                    if achievement.get('name') == 'Wall Buster' and 'value' in achievement:
-                        current_buildings['Walls (стены)'] = achievement['value']
-                        break
-                        
-            # Деревня строителя
-            if 'builderHallLevel' in current_data:
-                current_buildings['[БД] Builder Hall'] = current_data['builderHallLevel']
-                
-            if 'builderBaseLeague' in current_data:
-                league_name = current_data['builderBaseLeague'].get('name', 'Unranked')
-                if league_name != 'Unranked':
-                    current_buildings['[БД] League'] = league_name
+            # Текущее состояние для сравнения
+            current_buildings = self._extract_buildings(player)
             
             # Сравниваем уровни
             for building_name, current_level in current_buildings.items():
@@ -395,7 +411,7 @@ class BuildingMonitor:
                 logger.warning(f"Пользователь {telegram_id} не имеет привязанных профилей")
                 return False
             
-            success_count = 0
+            activated_tags: List[str] = []
             for profile in user_profiles:
                 profile_tag = getattr(profile, 'player_tag', profile.player_tag if hasattr(profile, 'player_tag') else None)
                 if not profile_tag:
@@ -410,16 +426,22 @@ class BuildingMonitor:
                 
                 success = await self.db_service.save_building_tracker(tracker)
                 if success:
-                    success_count += 1
+                    activated_tags.append(profile_tag)
                     logger.info(f"Активировано отслеживание зданий для пользователя {telegram_id}, игрок {profile_tag}")
-                    
-                    # Создаем первоначальный снимок
-                    async with self.coc_client as client:
-                        player_data = await client.get_player_info(profile_tag)
-                        if player_data:
-                            await self._create_initial_snapshot(profile_tag, player_data)
             
-            return success_count > 0
+            # Создаем первоначальные снимки, запрашивая все профили параллельно
+            if activated_tags:
+                async with self.coc_client as client:
+                    async for profile_tag, player in client.iter_players_bulk(
+                        activated_tags, projection=PLAYER_LEVELS_PROJECTION, as_models=True
+                    ):
+                        if isinstance(player, CocApiError):
+                            # Снимок будет создан монитором при первой успешной проверке
+                            logger.warning(f"Не удалось создать первый снимок для игрока {profile_tag}: {player}")
+                        elif player:
+                            await self._create_initial_snapshot(profile_tag, player)
+            
+            return len(activated_tags) > 0
             
         except Exception as e:
             logger.error(f"Ошибка при активации отслеживания: {e}")
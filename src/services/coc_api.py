@@ -6,236 +6,941 @@
 
 Основные функции:
 - CocApiClient: Асинхронный клиент для API запросов
+- CocApiError: временная недоступность API (отличается от 404, для которого возвращается None)
+- get_player(), get_clan(), get_clan_member_list(), get_current_war(), get_war_log():
+  ответы в виде моделей src.models.coc, построенных один раз на закэшированный ответ
+- ResponseCache: LRU-кэш ответов с отдельным TTL для каждого семейства эндпоинтов
 - Валидация тегов: validate_player_tag(), validate_clan_tag()
 - Определение типа тега: is_player_tag(), is_clan_tag()
 - Форматирование тегов: format_player_tag(), format_clan_tag()
+  (разбор тегов и их URL-форма кэшируются в src.utils.tags)
 
 Важно: Теги кланов обычно состоят из 9 символов, теги игроков - из 8-10 символов.
 Система автоматически определяет тип тега и предотвращает неправильное использование.
 """
 import aiohttp
 import asyncio
+import functools
 import logging
-from typing import Optional, Dict, Any, List
-from urllib.parse import quote
+import random
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, AsyncIterator, Awaitable, Callable, Iterable, Tuple
 import json
 
 from config.config import config
+from src.models.coc import Clan, ClanMember, Player, War
+from src.services.api_cache_store import PersistentResponseStore
+from src.utils.circuit_breaker import CircuitBreaker
+from src.utils.error_stats import ErrorStats
+from src.utils.json_codec import Projection, json_loads
+from src.utils.metrics import RequestMetrics, connector_utilisation
+from src.utils.rate_limiter import ApiKeyPool
+from src.utils.request_scheduler import PriorityScheduler, RequestPriority, get_request_priority
+from src.utils.tags import CLAN, PLAYER, format_tag, parse_tag, quote_tag, tag_cache_info, validate_tag
 
 logger = logging.getLogger(__name__)
 
 
+def get_endpoint_family(endpoint: str) -> str:
+    """Определение семейства эндпоинта (players, clans, members, currentwar, warlog, leagues)"""
+    path = endpoint.split('#', 1)[0].split('?', 1)[0]
+    if path.startswith('/players/'):
+        return 'players'
+    if path.startswith('/clanwarleagues/'):
+        return 'currentwar'
+    if path.startswith('/clans/'):
+        if path.endswith('/members'):
+            return 'members'
+        if path.endswith('/warlog'):
+            return 'warlog'
+        if '/currentwar' in path:
+            return 'currentwar'
+        return 'clans'
+    if path.endswith('leagues'):
+        return 'leagues'
+    return 'other'
+
+
+# Проекции для частых запросов: оставляем только поля, которые реально используются
+PLAYER_LEVELS_PROJECTION = Projection('levels', {
+    'tag': None,
+    'name': None,
+    'townHallLevel': None,
+    'builderHallLevel': None,
+    'builderBaseLeague': ['name'],
+    'heroes': ['name', 'level'],
+    'heroEquipment': ['name', 'level'],
+    'troops': ['name', 'level'],
+    'spells': ['name', 'level'],
+    'achievements': ['name', 'value'],
+})
+
+CLAN_MEMBERS_PAGE_PROJECTION = Projection('members_page', {
+    'items': ['tag', 'name', 'role', 'trophies', 'donations', 'donationsReceived'],
+})
+
+
+class ResponseCache:
+    """LRU-кэш ответов API с отдельным TTL для каждого семейства эндпоинтов
+
+    TTL семейства используется, только если сервер не указал Cache-Control: max-age.
+    Устаревшие записи с ETag не удаляются сразу: по ним клиент выполняет условный
+    запрос (If-None-Match), и ответ 304 продлевает запись без передачи тела.
+    Кэшированные объекты возвращаются как есть (без копирования),
+    поэтому вызывающий код не должен их изменять.
+
+    Рядом с ответом хранится построенная из него модель (get_model): она
+    создается один раз на запись и живет, пока запись не заменена или не вытеснена.
+    """
+
+    def __init__(self, ttls: Dict[str, int], max_entries: int = 2000, negative_ttl: float = 0):
+        self.ttls = dict(ttls)
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        # endpoint -> (момент истечения по time.monotonic(), данные, ETag)
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        # endpoint -> момент истечения; ресурсы, на которые API ответил 404
+        self._missing: 'OrderedDict[str, float]' = OrderedDict()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.negative_hits = 0
+        self.evictions = 0
+        # Ответы 304: запись продлена без загрузки тела
+        self.revalidations = 0
+        # endpoint -> (ответ, модель): модель, построенная из закэшированного ответа
+        self._models: Dict[str, tuple] = {}
+        self.model_hits = 0
+        self.model_builds = 0
+
+    def get(self, endpoint: str) -> Optional[Any]:
+        """Получение ответа из кэша (None, если записи нет или она устарела)"""
+        family = get_endpoint_family(endpoint)
+        entry = self._entries.get(endpoint)
+        if entry is not None:
+            expires_at, payload, etag = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(endpoint)
+                self.hits[family] = self.hits.get(family, 0) + 1
+                return payload
+            # Запись с ETag остается для условного запроса
+            if etag is None:
+                del self._entries[endpoint]
+                self._models.pop(endpoint, None)
+        self.misses[family] = self.misses.get(family, 0) + 1
+        return None
+
+    def get_model(self, endpoint: str, payload: Any, factory: Callable[[Any], Any]) -> Any:
+        """Модель ответа: строится один раз для закэшированного payload
+
+        Если payload не лежит в кэше (кэш выключен или запись уже вытеснена),
+        модель строится без сохранения.
+        """
+        entry = self._models.get(endpoint)
+        if entry is not None and entry[0] is payload:
+            self.model_hits += 1
+            return entry[1]
+        model = factory(payload)
+        self.model_builds += 1
+        cached = self._entries.get(endpoint)
+        if cached is not None and cached[1] is payload:
+            self._models[endpoint] = (payload, model)
+        return model
+
+    def _drop_model(self, endpoint: str, payload: Any = None):
+        """Удаление модели, если она построена не из payload"""
+        entry = self._models.get(endpoint)
+        if entry is not None and (payload is None or entry[0] is not payload):
+            del self._models[endpoint]
+
+    def get_for_revalidation(self, endpoint: str) -> Optional[Tuple[Any, str]]:
+        """Устаревшая запись с ETag для условного запроса: (данные, ETag) или None"""
+        entry = self._entries.get(endpoint)
+        if entry is None or entry[2] is None:
+            return None
+        return entry[1], entry[2]
+
+    def ttl_for(self, endpoint: str) -> int:
+        """TTL для эндпоинта по его семейству"""
+        return self.ttls.get(get_endpoint_family(endpoint), 0)
+
+    def set(self, endpoint: str, payload: Any, ttl: Optional[float] = None,
+            etag: Optional[str] = None):
+        """Сохранение ответа в кэш (по умолчанию с TTL его семейства)
+
+        Запись с нулевым TTL сохраняется, только если у нее есть ETag:
+        она сразу считается устаревшей и используется для условного запроса.
+        """
+        if ttl is None:
+            ttl = self.ttl_for(endpoint)
+        if self.max_entries <= 0:
+            return
+        if ttl <= 0 and etag is None:
+            self._entries.pop(endpoint, None)
+            self._drop_model(endpoint)
+            return
+        self._entries[endpoint] = (time.monotonic() + max(ttl, 0), payload, etag)
+        self._entries.move_to_end(endpoint)
+        # Ответ 304 продлевает тот же payload - его модель остается действительной
+        self._drop_model(endpoint, payload)
+        # Успешный ответ отменяет запомненный 404
+        self._missing.pop(endpoint, None)
+        # Вытесняем самые давно использованные записи
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._models.pop(evicted, None)
+            self.evictions += 1
+
+    def is_missing(self, endpoint: str) -> bool:
+        """Проверка, ответил ли API недавно 404 на этот эндпоинт"""
+        expires_at = self._missing.get(endpoint)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._missing[endpoint]
+            return False
+        self.negative_hits += 1
+        return True
+
+    def set_missing(self, endpoint: str):
+        """Запоминание ответа 404 на короткое время"""
+        if self.negative_ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries.pop(endpoint, None)
+        self._models.pop(endpoint, None)
+        self._missing[endpoint] = time.monotonic() + self.negative_ttl
+        self._missing.move_to_end(endpoint)
+        while len(self._missing) > self.max_entries:
+            self._missing.popitem(last=False)
+
+    def invalidate(self, endpoint: Optional[str] = None):
+        """Удаление записи для эндпоинта или очистка всего кэша"""
+        if endpoint is None:
+            self._entries.clear()
+            self._missing.clear()
+            self._models.clear()
+        else:
+            self._entries.pop(endpoint, None)
+            self._missing.pop(endpoint, None)
+            self._models.pop(endpoint, None)
+
+    def _family_stats(self, family: str) -> Dict[str, Any]:
+        hits = self.hits.get(family, 0)
+        misses = self.misses.get(family, 0)
+        return {'hits': hits, 'misses': misses, 'hit_ratio': hits / (hits + misses) if hits + misses else 0.0}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика попаданий и промахов кэша"""
+        total_hits = sum(self.hits.values())
+        total_misses = sum(self.misses.values())
+        total = total_hits + total_misses
+        return {
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': total_hits,
+            'misses': total_misses,
+            'hit_ratio': total_hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'negative_size': len(self._missing),
+            'negative_hits': self.negative_hits,
+            'revalidations': self.revalidations,
+            'models': {'size': len(self._models), 'hits': self.model_hits, 'builds': self.model_builds},
+            'by_family': {
+                family: self._family_stats(family)
+                for family in sorted(set(self.hits) | set(self.misses))
+            },
+        }
+
+
+def _cache_key(endpoint: str, projection: Optional[Projection] = None) -> str:
+    """Ключ кэша: ответы с проекцией хранятся отдельно от полных"""
+    return endpoint if projection is None else f"{endpoint}#{projection.name}"
+
+
+def _members_model(payload: Dict[str, Any]) -> Optional[List[ClanMember]]:
+    items = payload.get('items')
+    return ClanMember.list_from(items) if items is not None else None
+
+
+def _war_log_model(payload: Dict[str, Any]) -> Optional[List[War]]:
+    items = payload.get('items')
+    return [War(entry) for entry in items] if items is not None else None
+
+
+# Маркер ответа 404 внутри клиента (наружу возвращается None)
+_NOT_FOUND = object()
+# Маркер ответа 304: закэшированные данные не изменились
+_NOT_MODIFIED = object()
+
+
+class CocApiError(Exception):
+    """Сбой запроса к API, отличный от "ресурс не найден".
+
+    Клиент возвращает None только для 404; временная недоступность API
+    (таймаут, 429, 5xx, сетевая ошибка, нехватка бюджета ключей), 403, прочие
+    ошибки клиента 4xx, неразбираемый ответ и непредвиденные ошибки сообщаются
+    этим исключением, чтобы вызывающий код не принимал сбой за отсутствие данных.
+    """
+
+    TIMEOUT = 'timeout'
+    NETWORK = 'network'
+    RATE_LIMITED = 'rate_limited'
+    SERVER_ERROR = 'server_error'
+    FORBIDDEN = 'forbidden'
+    CIRCUIT_OPEN = 'circuit_open'
+    # Ни у одного ключа не освободился бюджет до дедлайна: запрос не отправлялся
+    THROTTLED = 'throttled'
+    # Ответ 4xx, кроме 403, 404 и 429 (например, 400 на неверный запрос)
+    CLIENT_ERROR = 'client_error'
+    # Ответ 200, тело которого не является JSON-объектом (например, страница ошибки прокси)
+    DECODE = 'decode'
+    UNEXPECTED = 'unexpected'
+
+    RETRYABLE = {TIMEOUT, NETWORK, RATE_LIMITED, SERVER_ERROR}
+    # Причины, которые ничего не говорят о доступности API и не учитываются выключателем
+    BREAKER_NEUTRAL = {THROTTLED, CLIENT_ERROR, UNEXPECTED}
+
+    def __init__(self, reason: str, endpoint: str = '', status: int = 0, retry_after: float = 0.0):
+        super().__init__(f"{reason} ({status}) при запросе к {endpoint}")
+        self.reason = reason
+        self.endpoint = endpoint
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.reason in self.RETRYABLE
+
+
 class CocApiClient:
     """Клиент для работы с API Clash of Clans"""
     
     def __init__(self):
         self.base_url = config.COC_API_BASE_URL
         self.api_token = config.COC_API_TOKEN
+        # Пул ключей с общим для всех вызывающих ограничением частоты
+        self.key_pool = ApiKeyPool(
+            config.COC_API_TOKENS or [self.api_token],
+            rate_per_key=config.COC_API_RATE_PER_KEY,
+            burst_per_key=config.COC_API_BURST_PER_KEY
+        )
         self.session = None
-        # Трекер ошибок API
-        self.api_errors = []
+        # Фоновый прогрев соединений (start не ждет его завершения)
+        self._prewarm_task: Optional[asyncio.Task] = None
+        # Трекер ошибок API: кольцевой буфер и агрегированные счетчики
+        self.error_stats = ErrorStats(config.COC_API_ERROR_BUFFER_SIZE)
+        # Кэш ответов API
+        self.cache = ResponseCache(
+            config.COC_CACHE_TTLS,
+            config.COC_CACHE_MAX_ENTRIES,
+            negative_ttl=config.COC_CACHE_NEGATIVE_TTL
+        )
+        # Постоянный кэш на диске (необязательный) - прогревает кэш после перезапуска
+        self.persistent_store = (
+            PersistentResponseStore(config.COC_API_CACHE_PATH) if config.COC_API_CACHE_PATH else None
+        )
+        self._persistent_store_ready = False
+        self._persistent_store_lock = asyncio.Lock()
+        # Выполняющиеся запросы (endpoint -> задача) для объединения одинаковых вызовов
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced_requests = 0
+        # Политика повторов
+        self.max_retries = config.COC_API_MAX_RETRIES
+        self.backoff_base = config.COC_API_BACKOFF_BASE
+        self.backoff_max = config.COC_API_BACKOFF_MAX
+        self.attempt_timeout = config.COC_API_ATTEMPT_TIMEOUT
+        self.request_deadline = config.COC_API_REQUEST_DEADLINE
+        # Параллельность массовых запросов get_players_bulk/get_clans_bulk
+        self.bulk_concurrency = config.COC_API_BULK_CONCURRENCY
+        # Выключатель: при серии сбоев запросы отклоняются сразу
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=config.COC_API_CIRCUIT_FAILURE_THRESHOLD,
+            cooldown=config.COC_API_CIRCUIT_COOLDOWN,
+            name='COC API'
+        )
+        # Планировщик: интерактивные запросы обслуживаются раньше фоновых
+        self.scheduler = PriorityScheduler(
+            total_limit=config.COC_API_MAX_CONCURRENCY,
+            class_limits={
+                RequestPriority.INTERACTIVE: config.COC_API_INTERACTIVE_CONCURRENCY,
+                RequestPriority.BACKGROUND: config.COC_API_BACKGROUND_CONCURRENCY,
+            }
+        )
+        # Гистограммы задержек, выполняющиеся запросы и трассировка соединений
+        self.metrics = RequestMetrics()
     
-    async def __aenter__(self):
-        """Асинхронный контекстный менеджер - вход"""
-        if not self.session:
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Общая сессия клиента, создается лениво один раз на процесс"""
+        if self.session is None or self.session.closed:
             # Создаем коннектор с пулом соединений для оптимизации
             connector = aiohttp.TCPConnector(
                 limit=100,  # Максимум 100 соединений в пуле
                 limit_per_host=30,  # Максимум 30 соединений на хост
+                ttl_dns_cache=300,  # Кэшируем DNS, чтобы не резолвить хост на каждое соединение
                 enable_cleanup_closed=True,
                 keepalive_timeout=300  # Держим соединения живыми 5 минут
             )
             
             self.session = aiohttp.ClientSession(
                 headers={
-                    'Authorization': f'Bearer {self.api_token}',
                     'Content-Type': 'application/json'
                 },
-                timeout=aiohttp.ClientTimeout(total=10),  # Уменьшили таймаут до 10 секунд
-                connector=connector
+                timeout=aiohttp.ClientTimeout(total=self.attempt_timeout),
+                connector=connector,
+                trace_configs=[self.metrics.trace_config()]
             )
+        return self.session
+
+    async def start(self):
+        """Запуск клиента: создание сессии, прогрев кэша и соединений с API
+
+        Соединения прогреваются в фоне: запуск бота не ждет сети, даже если API
+        недоступен.
+        """
+        self._get_session()
+        await self._ensure_persistent_store()
+        if config.COC_API_PREWARM_CONNECTIONS > 0 and self._prewarm_task is None:
+            self._prewarm_task = asyncio.create_task(
+                self._prewarm_connections(config.COC_API_PREWARM_CONNECTIONS)
+            )
+        logger.info("Клиент COC API запущен")
+
+    async def _prewarm_connections(self, count: int):
+        """Предварительное открытие keep-alive соединений с хостом API (TLS + DNS заранее)
+
+        Запросы HEAD без ключа: ответ сервера не важен, нужно только соединение
+        в пуле сессии. Бюджет ключей, планировщик и выключатель не затрагиваются.
+        """
+        session = self._get_session()
+        url = f"{self.base_url}/"
+
+        async def open_connection():
+            async with session.head(url) as response:
+                return response.status
+
+        results = await asyncio.gather(*(open_connection() for _ in range(count)), return_exceptions=True)
+        opened = sum(1 for result in results if not isinstance(result, BaseException))
+        if opened:
+            logger.info(f"Открыто {opened} соединений с API заранее")
+        else:
+            logger.warning(f"Не удалось заранее открыть соединения с API: {results[0]}")
+
+    async def __aenter__(self):
+        """Асинхронный контекстный менеджер - вход"""
+        self._get_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Асинхронный контекстный менеджер - выход"""
-        # НЕ закрываем сессию здесь, так как она может использоваться повторно
+        # НЕ закрываем сессию здесь, так как она используется повторно до вызова close()
         pass
 
-    async def _make_request(self, endpoint: str, track_errors: bool = True) -> Optional[Dict[Any, Any]]:
-        """Базовый метод для выполнения HTTP запросов"""
-        # Используем сессию из контекстного менеджера или создаем новую
-        session_to_use = self.session
-        if not session_to_use:
-            # Создаем временную сессию для одного запроса
-            connector = aiohttp.TCPConnector(
-                limit=100,
-                limit_per_host=30,
-                enable_cleanup_closed=True,
-                keepalive_timeout=300
-            )
-            
-            session_to_use = aiohttp.ClientSession(
-                headers={
-                    'Authorization': f'Bearer {self.api_token}',
-                    'Content-Type': 'application/json'
-                },
-                timeout=aiohttp.ClientTimeout(total=15),
-                connector=connector
-            )
+    async def _ensure_persistent_store(self):
+        """Открытие постоянного кэша и прогрев кэша в памяти (один раз)"""
+        if self._persistent_store_ready or not self.persistent_store:
+            return
+        async with self._persistent_store_lock:
+            if self._persistent_store_ready:
+                return
+            try:
+                await self.persistent_store.open()
+                entries = await self.persistent_store.load(self.cache.max_entries)
+                for endpoint, payload, remaining_ttl in entries:
+                    self.cache.set(endpoint, payload, ttl=remaining_ttl)
+                logger.info(f"Кэш API прогрет с диска: {len(entries)} записей")
+            except Exception as e:
+                logger.error(f"Не удалось открыть постоянный кэш API: {e}")
+                self.persistent_store = None
+            self._persistent_store_ready = True
+
+    async def _make_request(self, endpoint: str, track_errors: bool = True,
+                            use_cache: bool = True,
+                            projection: Optional[Projection] = None) -> Optional[Dict[Any, Any]]:
+        """Базовый метод для выполнения HTTP запросов
+
+        projection оставляет в ответе только нужные вызывающему коду поля;
+        такие ответы кэшируются отдельно от полных.
+        """
+        if not self._persistent_store_ready:
+            await self._ensure_persistent_store()
+        cache_key = _cache_key(endpoint, projection)
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+            # Недавно полученный 404 (например, опечатка в теге) - не идем в сеть
+            if self.cache.is_missing(cache_key):
+                return None
+
+        # API недоступен - отказываем сразу, не дожидаясь таймаута
+        if self.circuit_breaker.is_open:
+            raise CocApiError(CocApiError.CIRCUIT_OPEN, endpoint)
+
+        # Объединяем одновременные одинаковые запросы: все вызывающие ждут одну задачу.
+        # shield не дает отмене одного вызывающего прервать запрос для остальных.
+        task = self._inflight.get(cache_key)
+        if task is not None:
+            self.coalesced_requests += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(
+            self._perform_request(endpoint, cache_key, track_errors, use_cache, projection)
+        )
+        self._inflight[cache_key] = task
+        started = time.perf_counter()
+        task.add_done_callback(lambda done: self._on_inflight_done(cache_key, done, started))
+        return await asyncio.shield(task)
+
+    def _on_inflight_done(self, cache_key: str, task: asyncio.Future, started: float):
+        """Удаление завершенного запроса из списка выполняющихся и учет его длительности"""
+        self._inflight.pop(cache_key, None)
+        self.metrics.observe_request(get_endpoint_family(cache_key), time.perf_counter() - started)
+        # Забираем исключение, чтобы не было предупреждения, если все вызывающие отменены
+        if not task.cancelled():
+            task.exception()
+
+    async def _perform_request(self, endpoint: str, cache_key: str, track_errors: bool,
+                               use_cache: bool, projection: Optional[Projection]) -> Optional[Dict[Any, Any]]:
+        """Выполнение запроса к API с повторами, экспоненциальной задержкой и общим дедлайном"""
+        if use_cache and self.persistent_store:
+            stored = await self._read_persistent(cache_key)
+            if stored is not None:
+                return stored
+
+        # Устаревшая запись с ETag: просим сервер вернуть тело, только если оно изменилось
+        stale = self.cache.get_for_revalidation(cache_key) if use_cache else None
+        etag = stale[1] if stale else None
+
+        deadline = time.monotonic() + self.request_deadline
+        priority = get_request_priority()
+        attempt = 0
+        while True:
+            if not self.circuit_breaker.allow_request():
+                raise CocApiError(CocApiError.CIRCUIT_OPEN, endpoint)
+            try:
+                # Интерактивные запросы получают слот раньше фоновых
+                async with self.scheduler.slot(priority):
+                    data, ttl, new_etag = await self._request_once(
+                        endpoint, track_errors, deadline, projection, etag
+                    )
+            except asyncio.CancelledError:
+                self.circuit_breaker.release_probe()
+                raise
+            except CocApiError as error:
+                # 429 означает, что API отвечает - это не повод размыкать выключатель
+                if error.reason == CocApiError.RATE_LIMITED:
+                    self.circuit_breaker.record_success()
+                elif error.reason in CocApiError.BREAKER_NEUTRAL:
+                    self.circuit_breaker.release_probe()
+                else:
+                    self.circuit_breaker.record_failure()
+                remaining = deadline - time.monotonic()
+                if not error.retryable or attempt >= self.max_retries or remaining <= 0:
+                    raise
+                delay = max(error.retry_after, self._backoff_delay(attempt))
+                if delay >= remaining:
+                    raise
+                attempt += 1
+                logger.warning(f"Повтор запроса {endpoint} ({error.reason}) через {delay:.2f} сек, "
+                               f"попытка {attempt}/{self.max_retries}")
+                await asyncio.sleep(delay)
+                continue
+
+            self.circuit_breaker.record_success()
+            if data is _NOT_FOUND:
+                if use_cache:
+                    self.cache.set_missing(cache_key)
+                return None
+            if data is _NOT_MODIFIED:
+                data = stale[0]
+                new_etag = new_etag or etag
+                self.cache.revalidations += 1
+            if data is not None and use_cache:
+                if ttl is None:
+                    ttl = self.cache.ttl_for(cache_key)
+                self.cache.set(cache_key, data, ttl=ttl, etag=new_etag)
+                if self.persistent_store:
+                    await self._write_persistent(cache_key, data, ttl)
+            return data
+
+    async def _read_persistent(self, endpoint: str) -> Optional[Dict[Any, Any]]:
+        """Чтение ответа из постоянного кэша с переносом в кэш в памяти"""
+        try:
+            stored = await self.persistent_store.get(endpoint)
+        except Exception as e:
+            logger.error(f"Ошибка чтения постоянного кэша API: {e}")
+            return None
+        if stored is None:
+            return None
+        payload, remaining_ttl = stored
+        self.cache.set(endpoint, payload, ttl=remaining_ttl)
+        return payload
+
+    async def _write_persistent(self, endpoint: str, data: Dict[Any, Any], ttl: float):
+        """Сохранение ответа в постоянный кэш"""
+        try:
+            await self.persistent_store.put(endpoint, data, ttl)
+        except Exception as e:
+            logger.error(f"Ошибка записи постоянного кэша API: {e}")
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Экспоненциальная задержка с полным джиттером"""
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    async def _request_once(self, endpoint: str, track_errors: bool, deadline: float,
+                            projection: Optional[Projection] = None,
+                            etag: Optional[str] = None) -> Tuple[Any, Optional[float], Optional[str]]:
+        """Одна попытка HTTP запроса.
+
+        Возвращает (данные, TTL из Cache-Control, ETag). Данные - разобранный ответ,
+        _NOT_MODIFIED для 304 или _NOT_FOUND для 404; TTL равен None, если сервер
+        его не указал. Все остальные исходы выбрасывают CocApiError.
+        """
+        session = self._get_session()
         
         url = f"{self.base_url}{endpoint}"
+        family = get_endpoint_family(endpoint)
+        # Ждем свободный бюджет у одного из ключей. Нехватка бюджета - локальное
+        # ограничение (например, все ключи приостановлены после 429), а не сбой API
         try:
-            async with session_to_use.get(url) as response:
-                if response.status == 403:
+            api_token = await asyncio.wait_for(self.key_pool.acquire(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            logger.warning(f"Нет свободного бюджета ключей API до дедлайна запроса к {url}")
+            if track_errors:
+                self._track_error(endpoint, 0, "Key pool throttled")
+            raise CocApiError(CocApiError.THROTTLED, endpoint)
+
+        attempt_started = None
+        outcome = 'error'
+        try:
+            headers = {'Authorization': f'Bearer {api_token}'}
+            if etag:
+                headers['If-None-Match'] = etag
+            # Попытка не может длиться дольше оставшегося времени до дедлайна
+            attempt_timeout = aiohttp.ClientTimeout(
+                total=max(0.1, min(self.attempt_timeout, deadline - time.monotonic()))
+            )
+            attempt_started = time.perf_counter()
+            self.metrics.attempt_started(family)
+            async with session.get(url, headers=headers, timeout=attempt_timeout) as response:
+                outcome = str(response.status)
+                if response.status == 304:
+                    return (_NOT_MODIFIED, *_parse_cache_headers(response.headers))
+                elif response.status == 403:
                     logger.error("ОШИБКА 403: API ключ недействителен или ваш IP изменился. "
                                "Проверьте настройки на developer.clashofclans.com")
                     if track_errors:
                         self._track_error(endpoint, 403, "API key invalid or IP changed")
-                    return None
+                    raise CocApiError(CocApiError.FORBIDDEN, endpoint, 403)
                 elif response.status == 404:
-                    logger.warning(f"Ресурс не найден: {url}")
+                    logger.debug("Ресурс не найден: %s", url)
                     if track_errors:
                         self._track_error(endpoint, 404, "Resource not found")
-                    return None
+                    return _NOT_FOUND, None, None
+                elif response.status == 429:
+                    retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+                    logger.warning(f"HTTP 429 при запросе к {url}, ключ приостановлен на {retry_after:.1f} сек")
+                    self.key_pool.penalize(api_token, retry_after)
+                    if track_errors:
+                        self._track_error(endpoint, 429, "Rate limit exceeded")
+                    raise CocApiError(CocApiError.RATE_LIMITED, endpoint, 429, retry_after)
+                elif response.status >= 500:
+                    logger.error(f"HTTP {response.status} при запросе к {url}")
+                    if track_errors:
+                        self._track_error(endpoint, response.status, f"HTTP error {response.status}")
+                    retry_after = _parse_retry_after(response.headers.get('Retry-After'), default=0.0)
+                    raise CocApiError(CocApiError.SERVER_ERROR, endpoint, response.status, retry_after)
                 elif response.status != 200:
                     logger.error(f"HTTP {response.status} при запросе к {url}")
                     if track_errors:
                         self._track_error(endpoint, response.status, f"HTTP error {response.status}")
-                    return None
+                    raise CocApiError(CocApiError.CLIENT_ERROR, endpoint, response.status)
                 
-                return await response.json()
+                try:
+                    data = json_loads(await response.read())
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    outcome = 'decode'
+                    logger.error(f"Ответ на запрос к {url} не является JSON-объектом")
+                    if track_errors:
+                        self._track_error(endpoint, response.status, "Invalid JSON body")
+                    raise CocApiError(CocApiError.DECODE, endpoint, response.status)
+                if projection:
+                    data = projection.apply(data)
+                return (data, *_parse_cache_headers(response.headers))
         
+        except CocApiError:
+            raise
         except asyncio.TimeoutError:
+            outcome = 'timeout'
             logger.error(f"Таймаут при запросе к {url}")
             if track_errors:
                 self._track_error(endpoint, 0, "Timeout error")
-            return None
+            raise CocApiError(CocApiError.TIMEOUT, endpoint)
+        except aiohttp.ClientError as e:
+            outcome = 'network'
+            logger.error(f"Сетевая ошибка при запросе к {url}: {e}")
+            if track_errors:
+                self._track_error(endpoint, 0, str(e))
+            raise CocApiError(CocApiError.NETWORK, endpoint) from e
         except Exception as e:
-            logger.error(f"Ошибка при запросе к {url}: {e}")
+            logger.exception(f"Ошибка при запросе к {url}: {e}")
             if track_errors:
                 self._track_error(endpoint, 0, str(e))
-            return None
+            raise CocApiError(CocApiError.UNEXPECTED, endpoint) from e
         finally:
-            # Закрываем сессию только если она была создана временно
-            if not self.session and session_to_use:
-                await session_to_use.close()
+            if attempt_started is not None:
+                self.metrics.attempt_finished(family, time.perf_counter() - attempt_started, outcome)
     
     def _track_error(self, endpoint: str, status_code: int, error_message: str):
         """Отслеживание ошибок API"""
-        from datetime import datetime
-        error_entry = {
-            'timestamp': datetime.now().isoformat(),
-            'endpoint': endpoint,
-            'status_code': status_code,
-            'error_message': error_message
-        }
-        self.api_errors.append(error_entry)
+        self.error_stats.record(endpoint, get_endpoint_family(endpoint), status_code, error_message)
+    
+    @property
+    def api_errors(self) -> List[Dict[str, Any]]:
+        """Последние ошибки API (для обратной совместимости)"""
+        return self.error_stats.get_recent()
     
     def get_errors(self) -> List[Dict[str, Any]]:
-        """Получение списка всех ошибок"""
-        return self.api_errors
+        """Получение последних ошибок (не больше размера буфера)"""
+        return self.error_stats.get_recent()
+    
+    def get_error_summary(self) -> Dict[str, Any]:
+        """Сводка ошибок по семействам эндпоинтов, кодам статуса и частоте"""
+        return self.error_stats.get_summary()
     
     def clear_errors(self):
         """Очистка списка ошибок"""
-        self.api_errors = []
+        self.error_stats.clear()
 
-    async def get_player_info(self, player_tag: str) -> Optional[Dict[Any, Any]]:
-        """Получение информации об игроке"""
-        # Валидация тега игрока
-        is_valid, validation_message = validate_player_tag(player_tag)
-        if not is_valid:
-            logger.error(f"Невалидный тег игрока '{player_tag}': {validation_message}")
+    def get_rate_limit_stats(self) -> Dict[str, Any]:
+        """Получение статистики ограничителя частоты запросов"""
+        return self.key_pool.get_stats()
+
+    def is_api_available(self) -> bool:
+        """Доступен ли API (выключатель не разомкнут)"""
+        return not self.circuit_breaker.is_open
+
+    def get_api_retry_delay(self) -> float:
+        """Через сколько секунд выключатель пропустит пробный запрос"""
+        return self.circuit_breaker.retry_in()
+
+    def get_circuit_stats(self) -> Dict[str, Any]:
+        """Получение состояния выключателя"""
+        return self.circuit_breaker.get_stats()
+
+    def get_scheduler_stats(self) -> Dict[str, Any]:
+        """Получение метрик очереди запросов по классам приоритета"""
+        return self.scheduler.get_stats()
+
+    def get_connection_pool_stats(self) -> Dict[str, Any]:
+        """Загрузка пула соединений TCPConnector"""
+        connector = self.session.connector if self.session is not None and not self.session.closed else None
+        return connector_utilisation(connector)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Все метрики клиента одним словарем
+
+        Задержки вызовов и отдельных HTTP попыток по семействам эндпоинтов,
+        исходы попыток, выполняющиеся запросы, загрузка пула соединений,
+        попадания в кэш (ответов и разбора тегов), очередь планировщика,
+        ограничитель частоты и выключатель.
+        """
+        return {
+            'requests': self.metrics.snapshot(),
+            'connection_pool': self.get_connection_pool_stats(),
+            'cache': self.cache.get_stats(),
+            'coalesced_requests': self.coalesced_requests,
+            'scheduler': self.scheduler.get_stats(),
+            'rate_limit': self.key_pool.get_stats(),
+            'circuit': self.circuit_breaker.get_stats(),
+            'errors': self.error_stats.get_summary(),
+            'tags': tag_cache_info(),
+        }
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Получение статистики кэша ответов"""
+        return self.cache.get_stats()
+
+    def invalidate_cache(self, endpoint: Optional[str] = None):
+        """Сброс кэша ответов (целиком или для одного эндпоинта)"""
+        self.cache.invalidate(endpoint)
+
+    def _player_endpoint(self, player_tag: str) -> Optional[str]:
+        """Путь запроса игрока или None для невалидного тега"""
+        # Валидация тега игрока (разбор кэшируется вместе с URL-формой)
+        parsed_tag = parse_tag(player_tag, PLAYER)
+        if not parsed_tag.is_valid:
+            logger.error(f"Невалидный тег игрока '{player_tag}': {parsed_tag.message}")
             return None
         
         # Предупреждение, если тег похож на клановый
-        if validation_message:
-            logger.warning(f"Тег игрока '{player_tag}': {validation_message}")
-        
-        formatted_tag = quote(player_tag, safe='')
-        endpoint = f"/players/{formatted_tag}"
+        if parsed_tag.message:
+            logger.warning(f"Тег игрока '{player_tag}': {parsed_tag.message}")
         
-        player_data = await self._make_request(endpoint)
+        return f"/players/{parsed_tag.quoted}"
+
+    def _clan_endpoint(self, clan_tag: str, suffix: str = '') -> Optional[str]:
+        """Путь запроса клана (с необязательным суффиксом) или None для невалидного тега"""
+        # Валидация тега клана (разбор кэшируется вместе с URL-формой)
+        parsed_tag = parse_tag(clan_tag, CLAN)
+        if not parsed_tag.is_valid:
+            logger.error(f"Невалидный тег клана '{clan_tag}': {parsed_tag.message}")
+            return None
+        return f"/clans/{parsed_tag.quoted}{suffix}"
+
+    async def _request_as(self, endpoint: Optional[str], model: Optional[Callable[[Any], Any]] = None,
+                          projection: Optional[Projection] = None) -> Any:
+        """Запрос ответа; с model - в виде модели, построенной один раз на закэшированный ответ"""
+        if endpoint is None:
+            return None
+        data = await self._make_request(endpoint, projection=projection)
+        if not data or model is None:
+            return data
+        return self.cache.get_model(_cache_key(endpoint, projection), data, model)
+
+    async def _fetch_player(self, player_tag: str, projection: Optional[Projection],
+                            model: Optional[Callable[[Any], Any]] = None) -> Any:
+        player_data = await self._request_as(self._player_endpoint(player_tag), model, projection)
         if player_data:
-            logger.info(f"Получена информация об игроке {player_tag}")
+            logger.debug("Получена информация об игроке %s", player_tag)
         else:
             logger.warning(f"Не удалось получить информацию об игроке {player_tag}")
-        
         return player_data
-    
-    async def get_clan_info(self, clan_tag: str) -> Optional[Dict[Any, Any]]:
-        """Получение информации о клане"""
-        # Валидация тега клана
-        is_valid, validation_message = validate_clan_tag(clan_tag)
-        if not is_valid:
-            logger.error(f"Невалидный тег клана '{clan_tag}': {validation_message}")
-            return None
-        
-        formatted_tag = quote(clan_tag, safe='')
-        endpoint = f"/clans/{formatted_tag}"
-        
-        clan_data = await self._make_request(endpoint)
+
+    async def _fetch_clan(self, clan_tag: str, model: Optional[Callable[[Any], Any]] = None) -> Any:
+        clan_data = await self._request_as(self._clan_endpoint(clan_tag), model)
         if clan_data:
-            logger.info(f"Получена информация о клане {clan_tag}")
+            logger.debug("Получена информация о клане %s", clan_tag)
         else:
             logger.warning(f"Не удалось получить информацию о клане {clan_tag}")
-        
         return clan_data
+
+    async def get_player_info(self, player_tag: str,
+                              projection: Optional[Projection] = None) -> Optional[Dict[Any, Any]]:
+        """Получение информации об игроке"""
+        return await self._fetch_player(player_tag, projection)
+
+    async def get_player(self, player_tag: str, projection: Optional[Projection] = None) -> Optional[Player]:
+        """Игрок в виде модели Player (одна модель на закэшированный ответ)"""
+        return await self._fetch_player(player_tag, projection, Player)
+    
+    async def get_clan_info(self, clan_tag: str) -> Optional[Dict[Any, Any]]:
+        """Получение информации о клане"""
+        return await self._fetch_clan(clan_tag)
+
+    async def get_clan(self, clan_tag: str) -> Optional[Clan]:
+        """Клан в виде модели Clan (одна модель на закэшированный ответ)"""
+        return await self._fetch_clan(clan_tag, Clan)
     
-    async def get_clan_members(self, clan_tag: str) -> Optional[List[Dict[Any, Any]]]:
+    async def iter_players_bulk(self, player_tags: Iterable[str], concurrency: Optional[int] = None,
+                                projection: Optional[Projection] = None,
+                                as_models: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+        """Параллельное получение игроков: выдает (тег, данные) по мере готовности
+
+        Повторяющиеся теги запрашиваются один раз. Для ненайденного игрока данные - None,
+        при недоступности API - экземпляр CocApiError. С as_models данные - модели Player.
+        """
+        fetch = functools.partial(self.get_player if as_models else self.get_player_info, projection=projection)
+        async for item in self._iter_bulk(fetch, player_tags, concurrency):
+            yield item
+
+    async def get_players_bulk(self, player_tags: Iterable[str], concurrency: Optional[int] = None,
+                               projection: Optional[Projection] = None,
+                               as_models: bool = False) -> Dict[str, Any]:
+        """Параллельное получение игроков в виде словаря {тег: данные}"""
+        return {
+            tag: data
+            async for tag, data in self.iter_players_bulk(player_tags, concurrency, projection, as_models)
+        }
+
+    async def iter_clans_bulk(self, clan_tags: Iterable[str],
+                              concurrency: Optional[int] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Параллельное получение кланов: выдает (тег, данные) по мере готовности"""
+        async for item in self._iter_bulk(self.get_clan_info, clan_tags, concurrency):
+            yield item
+
+    async def get_clans_bulk(self, clan_tags: Iterable[str],
+                             concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """Параллельное получение кланов в виде словаря {тег: данные}"""
+        return {tag: data async for tag, data in self.iter_clans_bulk(clan_tags, concurrency)}
+
+    async def _iter_bulk(self, fetch: Callable[[str], Awaitable[Any]], tags: Iterable[str],
+                         concurrency: Optional[int]) -> AsyncIterator[Tuple[str, Any]]:
+        """Запуск запросов по тегам с ограничением параллельности"""
+        unique_tags = list(dict.fromkeys(tag for tag in tags if tag))
+        if not unique_tags:
+            return
+        semaphore = asyncio.Semaphore(concurrency or self.bulk_concurrency)
+
+        async def fetch_one(tag: str) -> Tuple[str, Any]:
+            async with semaphore:
+                try:
+                    return tag, await fetch(tag)
+                except CocApiError as error:
+                    return tag, error
+
+        tasks = [asyncio.ensure_future(fetch_one(tag)) for tag in unique_tags]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Если потребитель прекратил обход раньше, отменяем оставшиеся запросы
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def get_clan_members(self, clan_tag: str,
+                               projection: Optional[Projection] = None) -> Optional[List[Dict[Any, Any]]]:
         """Получение списка участников клана"""
-        # Валидация тега клана
-        is_valid, validation_message = validate_clan_tag(clan_tag)
-        if not is_valid:
-            logger.error(f"Невалидный тег клана '{clan_tag}': {validation_message}")
-            return None
-        
-        formatted_tag = quote(clan_tag, safe='')
-        endpoint = f"/clans/{formatted_tag}/members"
-        
-        members_data = await self._make_request(endpoint)
+        members_data = await self._request_as(self._clan_endpoint(clan_tag, '/members'), projection=projection)
         if members_data and 'items' in members_data:
-            logger.info(f"Получен список участников клана {clan_tag}")
+            logger.debug("Получен список участников клана %s", clan_tag)
             return members_data['items']
         else:
             logger.warning(f"Не удалось получить список участников клана {clan_tag}")
             return None
+
+    async def get_clan_member_list(self, clan_tag: str,
+                                   projection: Optional[Projection] = None) -> Optional[List[ClanMember]]:
+        """Участники клана в виде моделей ClanMember (один список на закэшированный ответ)"""
+        members = await self._request_as(self._clan_endpoint(clan_tag, '/members'), _members_model, projection)
+        if members is None:
+            logger.warning(f"Не удалось получить список участников клана {clan_tag}")
+        return members
     
     async def get_clan_current_war(self, clan_tag: str) -> Optional[Dict[Any, Any]]:
         """Получение информации о текущей войне клана"""
-        # Валидация тега клана
-        is_valid, validation_message = validate_clan_tag(clan_tag)
-        if not is_valid:
-            logger.error(f"Невалидный тег клана '{clan_tag}': {validation_message}")
-            return None
-        
-        formatted_tag = quote(clan_tag, safe='')
-        endpoint = f"/clans/{formatted_tag}/currentwar"
-        
-        war_data = await self._make_request(endpoint)
+        return await self._fetch_current_war(clan_tag)
+
+    async def get_current_war(self, clan_tag: str) -> Optional[War]:
+        """Текущая война клана в виде модели War (одна модель на закэшированный ответ)"""
+        return await self._fetch_current_war(clan_tag, War)
+
+    async def _fetch_current_war(self, clan_tag: str, model: Optional[Callable[[Any], Any]] = None) -> Any:
+        war_data = await self._request_as(self._clan_endpoint(clan_tag, '/currentwar'), model)
         if war_data:
-            logger.info(f"Получена информация о текущей войне клана {clan_tag}")
+            logger.debug("Получена информация о текущей войне клана %s", clan_tag)
         else:
             logger.warning(f"Не удалось получить информацию о текущей войне клана {clan_tag}")
-        
         return war_data
     
     async def get_clan_war_log(self, clan_tag: str) -> Optional[Dict[Any, Any]]:
         """Получение журнала войн клана"""
-        # Валидация тега клана
-        is_valid, validation_message = validate_clan_tag(clan_tag)
-        if not is_valid:
-            logger.error(f"Невалидный тег клана '{clan_tag}': {validation_message}")
-            return None
+        return await self._fetch_war_log(clan_tag)
 
-        formatted_tag = quote(clan_tag, safe='')
-        endpoint = f"/clans/{formatted_tag}/warlog"
+    async def get_war_log(self, clan_tag: str) -> Optional[List[War]]:
+        """Журнал войн клана в виде моделей War (один список на закэшированный ответ)"""
+        return await self._fetch_war_log(clan_tag, _war_log_model)
 
-        war_log = await self._make_request(endpoint)
-        if war_log:
-            logger.info(f"Получен журнал войн клана {clan_tag}")
+    async def _fetch_war_log(self, clan_tag: str, model: Optional[Callable[[Any], Any]] = None) -> Any:
+        war_log = await self._request_as(self._clan_endpoint(clan_tag, '/warlog'), model)
+        if war_log is not None:
+            logger.debug("Получен журнал войн клана %s", clan_tag)
         else:
             logger.warning(f"Не удалось получить журнал войн клана {clan_tag}")
-
         return war_log
 
     async def get_trophy_leagues(self, limit: int = 50) -> Optional[List[Dict[Any, Any]]]:
@@ -243,7 +948,7 @@ class CocApiClient:
         endpoint = f"/leagues?limit={limit}"
         leagues = await self._make_request(endpoint)
         if leagues and 'items' in leagues:
-            logger.info("Получен список лиг основной деревни")
+            logger.debug("Получен список лиг основной деревни")
             return leagues['items']
         logger.warning("Не удалось получить список лиг основной деревни")
         return None
@@ -253,7 +958,7 @@ class CocApiClient:
         endpoint = f"/builderbaseleagues?limit={limit}"
         leagues = await self._make_request(endpoint)
         if leagues and 'items' in leagues:
-            logger.info("Получен список лиг деревни строителя")
+            logger.debug("Получен список лиг деревни строителя")
             return leagues['items']
         logger.warning("Не удалось получить список лиг деревни строителя")
         return None
@@ -263,7 +968,7 @@ class CocApiClient:
         endpoint = f"/capitalleagues?limit={limit}"
         leagues = await self._make_request(endpoint)
         if leagues and 'items' in leagues:
-            logger.info("Получен список лиг столицы клана")
+            logger.debug("Получен список лиг столицы клана")
             return leagues['items']
         logger.warning("Не удалось получить список лиг столицы клана")
         return None
@@ -273,25 +978,16 @@ class CocApiClient:
         endpoint = f"/warleagues?limit={limit}"
         leagues = await self._make_request(endpoint)
         if leagues and 'items' in leagues:
-            logger.info("Получен список лиг войн кланов")
+            logger.debug("Получен список лиг войн кланов")
             return leagues['items']
         logger.warning("Не удалось получить список лиг войн кланов")
         return None
     
     async def get_clan_war_league_group(self, clan_tag: str) -> Optional[Dict[Any, Any]]:
         """Получение информации о группе Лиги войн кланов"""
-        # Валидация тега клана
-        is_valid, validation_message = validate_clan_tag(clan_tag)
-        if not is_valid:
-            logger.error(f"Невалидный тег клана '{clan_tag}': {validation_message}")
-            return None
-        
-        formatted_tag = quote(clan_tag, safe='')
-        endpoint = f"/clans/{formatted_tag}/currentwar/leaguegroup"
-        
-        league_group = await self._make_request(endpoint)
+        league_group = await self._request_as(self._clan_endpoint(clan_tag, '/currentwar/leaguegroup'))
         if league_group:
-            logger.info(f"Получена информация о группе ЛВК клана {clan_tag}")
+            logger.debug("Получена информация о группе ЛВК клана %s", clan_tag)
         else:
             logger.debug(f"Группа ЛВК для клана {clan_tag} не найдена или сезон не активен")
         
@@ -299,39 +995,84 @@ class CocApiClient:
     
     async def get_cwl_war_info(self, war_tag: str) -> Optional[Dict[Any, Any]]:
         """Получение информации о конкретной войне ЛВК"""
-        formatted_tag = quote(war_tag, safe='')
+        # Теги войн берутся из ответа leaguegroup: только нормализуем, не отклоняем
+        formatted_tag = quote_tag(war_tag)
         endpoint = f"/clanwarleagues/wars/{formatted_tag}"
         
         war_data = await self._make_request(endpoint)
         if war_data:
-            logger.info(f"Получена информация о войне ЛВК {war_tag}")
+            logger.debug("Получена информация о войне ЛВК %s", war_tag)
         else:
             logger.warning(f"Не удалось получить информацию о войне ЛВК {war_tag}")
         
         return war_data
     
     async def close(self):
-        """Закрытие сессии"""
+        """Закрытие сессии и постоянного кэша"""
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+            await asyncio.gather(self._prewarm_task, return_exceptions=True)
+            self._prewarm_task = None
         if self.session:
             await self.session.close()
             self.session = None
+        if self.persistent_store:
+            await self.persistent_store.close()
+            self._persistent_store_ready = False
 
 
 # Вспомогательные функции для работы с данными API
+def _parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Разбор заголовка Retry-After (в секундах)"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_cache_headers(headers) -> Tuple[Optional[float], Optional[str]]:
+    """Срок свежести и ETag ответа по заголовкам Cache-Control, Age и ETag
+
+    Срок равен None, если сервер не указал max-age. no-cache дает нулевой срок:
+    ответ сразу устаревает, но перепроверяется условным запросом по ETag.
+    no-store запрещает хранить ответ, поэтому ETag в этом случае отбрасывается.
+    """
+    etag = headers.get('ETag')
+    value = headers.get('Cache-Control')
+    if not value:
+        return None, etag
+    max_age = None
+    for directive in value.split(','):
+        name, _, argument = directive.strip().partition('=')
+        name = name.lower()
+        if name == 'no-store':
+            return 0.0, None
+        if name == 'no-cache':
+            return 0.0, etag
+        if name == 'max-age':
+            try:
+                max_age = float(argument.strip().strip('"'))
+            except ValueError:
+                continue
+    if max_age is None:
+        return None, etag
+    try:
+        age = float(headers.get('Age') or 0)
+    except ValueError:
+        age = 0.0
+    return max(0.0, max_age - age), etag
+
+
 def format_clan_tag(tag: str) -> str:
     """Форматирование тега клана"""
-    tag = tag.replace(' ', '').upper().replace('O', '0')
-    if not tag.startswith('#'):
-        tag = '#' + tag
-    return tag
+    return format_tag(tag)
 
 
 def format_player_tag(tag: str) -> str:
     """Форматирование тега игрока"""
-    tag = tag.replace(' ', '').upper().replace('O', '0')
-    if not tag.startswith('#'):
-        tag = '#' + tag
-    return tag
+    return format_tag(tag)
 
 
 def is_clan_tag(tag: str) -> bool:
@@ -359,28 +1100,9 @@ def validate_player_tag(tag: str) -> tuple[bool, str]:
     """
     Проверка валидности тега игрока
     Возвращает: (валидность, сообщение об ошибке)
+    Для тега из 9 символов возвращается предупреждение о возможном теге клана.
     """
-    if not tag:
-        return False, "Тег не может быть пустым"
-    
-    clean_tag = tag.replace('#', '').replace(' ', '').upper()
-    
-    # Проверяем длину
-    if len(clean_tag) < 8:
-        return False, "Тег слишком короткий (должен быть минимум 8 символов)"
-    elif len(clean_tag) > 10:
-        return False, "Тег слишком длинный (должен быть максимум 10 символов)"
-    
-    # Проверяем на недопустимые символы
-    valid_chars = set('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')
-    if not all(c in valid_chars for c in clean_tag):
-        return False, "Тег содержит недопустимые символы"
-    
-    # Предупреждение, если похоже на тег клана
-    if len(clean_tag) == 9:
-        return True, "Внимание: тег из 9 символов может быть тегом клана. Если поиск не дает результатов, попробуйте поиск по клану."
-    
-    return True, ""
+    return validate_tag(tag, PLAYER)
 
 
 def validate_clan_tag(tag: str) -> tuple[bool, str]:
@@ -388,23 +1110,7 @@ def validate_clan_tag(tag: str) -> tuple[bool, str]:
     Проверка валидности тега клана
     Возвращает: (валидность, сообщение об ошибке)
     """
-    if not tag:
-        return False, "Тег не может быть пустым"
-    
-    clean_tag = tag.replace('#', '').replace(' ', '').upper()
-    
-    # Проверяем длину
-    if len(clean_tag) < 8:
-        return False, "Тег слишком короткий (должен быть минимум 8 символов)"
-    elif len(clean_tag) > 10:
-        return False, "Тег слишком длинный (должен быть максимум 10 символов)"
-    
-    # Проверяем на недопустимые символы
-    valid_chars = set('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')
-    if not all(c in valid_chars for c in clean_tag):
-        return False, "Тег содержит недопустимые символы"
-    
-    return True, ""
+    return validate_tag(tag, CLAN)
 
 
 def determine_war_result(clan_stars: int, opponent_stars: int) -> str:
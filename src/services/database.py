@@ -7,7 +7,7 @@ import logging
 import os
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 try:
     import aiosqlite
@@ -23,9 +23,52 @@ from src.models.subscription import Subscription
 from src.models.user import User
 from src.models.user_profile import UserProfile
 from src.models.war import WarToSave
+from src.services.migrations import Migration, migrate, rebuild_table, sql_step
 
 logger = logging.getLogger(__name__)
 
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+# Одна инструкция записи: (SQL, параметры, executemany)
+WriteStatement = Tuple[str, Any, bool]
+
+
+def _season_key(timestamp: Optional[str]) -> Optional[str]:
+    """Сезон ('YYYY-MM') по времени в формате ISO или API ('20240131T120000.000Z')"""
+    if not timestamp or len(timestamp) < 7:
+        return None
+    if timestamp[4] == "-":
+        return timestamp[:7]
+    return f"{timestamp[:4]}-{timestamp[4:6]}"
+
+
+# То же вычисление сезона в SQL (для пересборки агрегатов из исходных таблиц)
+_SQL_SEASON_KEY = (
+    "CASE WHEN substr({column}, 5, 1) = '-' THEN substr({column}, 1, 7) "
+    "ELSE substr({column}, 1, 4) || '-' || substr({column}, 5, 2) END"
+)
+
+
+# Прирост донатов между соседними снимками игрока. Счетчик донатов в игре
+# обнуляется в начале сезона, поэтому уменьшение значения означает сброс,
+# и приростом считается само новое значение.
+_SQL_DONATION_INCREMENT = (
+    "CASE WHEN prev_donations IS NULL THEN 0 "
+    "WHEN donations >= prev_donations THEN donations - prev_donations "
+    "ELSE donations END"
+)
+
+
+class _PendingWrite:
+    """Операция записи, ожидающая групповой фиксации (одна или несколько инструкций)"""
+
+    __slots__ = ("statements", "future")
+
+    def __init__(self, statements: Sequence[WriteStatement], future: asyncio.Future):
+        self.statements = statements
+        self.future = future
+
 
 # ---------------------------------------------------------------------------
 # Вспомогательные функции преобразования дат
@@ -50,18 +93,397 @@ def _parse_iso(value: Optional[Any]) -> Optional[datetime]:
         return None
 
 
+# Агрегат донатов сезона из снимков: первый и последний снимок и прирост по
+# соседним снимкам. {source} - источник снимков (вся таблица при пересборке),
+# {upsert} - ON CONFLICT для пересчета строк отдельных игроков
+_SQL_SEASON_DONATIONS = (
+    """
+    INSERT INTO cwl_season_player_donations (
+        season, player_tag, first_snapshot_time, first_donations,
+        last_snapshot_time, last_donations, donated
+    )
+    SELECT season, player_tag,
+           MIN(snapshot_time), MAX(first_donations),
+           MAX(snapshot_time), MAX(last_donations),
+           SUM(""" + _SQL_DONATION_INCREMENT + """)
+    FROM (
+        SELECT season, player_tag, snapshot_time, donations,
+               LAG(donations) OVER (
+                   PARTITION BY season, player_tag ORDER BY snapshot_time
+               ) AS prev_donations,
+               FIRST_VALUE(donations) OVER (
+                   PARTITION BY season, player_tag ORDER BY snapshot_time
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+               ) AS first_donations,
+               LAST_VALUE(donations) OVER (
+                   PARTITION BY season, player_tag ORDER BY snapshot_time
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+               ) AS last_donations
+        FROM (
+            SELECT """ + _SQL_SEASON_KEY.format(column="s.snapshot_time") + """ AS season,
+                   s.player_tag, s.snapshot_time, COALESCE(s.donations, 0) AS donations
+            FROM {source} s
+        )
+    )
+    WHERE true
+    GROUP BY season, player_tag
+    {upsert}
+    """
+)
+
+# Пересчет строки агрегата одного игрока за сезон: снимки сезона читаются по
+# ключу (player_tag, snapshot_time) - диапазоны ISO ('YYYY-MM...') и
+# компактного ('YYYYMM...') формата времени
+_SQL_SEASON_DONATIONS_FOR_PLAYER = _SQL_SEASON_DONATIONS.format(
+    source="""(
+                SELECT player_tag, snapshot_time, donations FROM player_stats_snapshots
+                WHERE player_tag = ? AND snapshot_time >= ? AND snapshot_time < ?
+                UNION ALL
+                SELECT player_tag, snapshot_time, donations FROM player_stats_snapshots
+                WHERE player_tag = ? AND snapshot_time >= ? AND snapshot_time < ?
+            )""",
+    upsert="""
+    ON CONFLICT(season, player_tag) DO UPDATE SET
+        first_snapshot_time = excluded.first_snapshot_time,
+        first_donations = excluded.first_donations,
+        last_snapshot_time = excluded.last_snapshot_time,
+        last_donations = excluded.last_donations,
+        donated = excluded.donated
+    """,
+)
+
+
+def _season_snapshot_params(player_tag: str, season: str) -> Tuple[str, ...]:
+    """Параметры _SQL_SEASON_DONATIONS_FOR_PLAYER: игрок и границы сезона 'YYYY-MM' в обоих форматах"""
+    compact = season.replace("-", "")
+    return player_tag, season, f"{season}~", player_tag, compact, f"{compact}~"
+
+
+async def _rebuild_cwl_aggregates(conn: aiosqlite.Connection) -> None:
+    """Пересборка агрегатов ЛВК в текущей транзакции соединения-писателя"""
+    war_season = _SQL_SEASON_KEY.format(column="w.end_time")
+    await conn.execute("DELETE FROM cwl_season_player_attacks")
+    await conn.execute(
+        f"""
+        INSERT INTO cwl_season_player_attacks (
+            season, player_tag, cwl_attacks, regular_attacks, cwl_wars, regular_wars
+        )
+        SELECT season, attacker_tag,
+               SUM(CASE WHEN is_cwl_war THEN attacks ELSE 0 END),
+               SUM(CASE WHEN is_cwl_war THEN 0 ELSE attacks END),
+               SUM(CASE WHEN is_cwl_war THEN 1 ELSE 0 END),
+               SUM(CASE WHEN is_cwl_war THEN 0 ELSE 1 END)
+        FROM (
+            SELECT {war_season} AS season, a.attacker_tag, w.is_cwl_war, COUNT(*) AS attacks
+            FROM wars w
+            JOIN war_attacks a ON a.war_end_time = w.end_time
+            WHERE a.attacker_tag IS NOT NULL AND a.attacker_tag != ''
+            GROUP BY w.end_time, a.attacker_tag
+        )
+        GROUP BY season, attacker_tag
+        """
+    )
+    await conn.execute("DELETE FROM cwl_season_player_donations")
+    await conn.execute(_SQL_SEASON_DONATIONS.format(source="player_stats_snapshots", upsert=""))
+
+
+# Ключи "любой результат"/"любой тип войны" в war_counts: счетчик хранится для
+# каждого сочетания фильтров count_wars, и подсчет читает одну строку по ключу
+_WAR_COUNT_ANY_RESULT = "*"
+_WAR_COUNT_ANY_TYPE = -1
+
+
+def _war_count_keys(result: Optional[str], is_cwl_war: int) -> List[Tuple[str, int]]:
+    """Строки war_counts, в которые входит война с данным результатом и типом"""
+    keys = [(_WAR_COUNT_ANY_RESULT, _WAR_COUNT_ANY_TYPE), (_WAR_COUNT_ANY_RESULT, is_cwl_war)]
+    if result is not None:
+        keys += [(result, _WAR_COUNT_ANY_TYPE), (result, is_cwl_war)]
+    return keys
+
+
+async def _rebuild_war_counts(conn: aiosqlite.Connection) -> None:
+    """Пересборка счетчиков войн по фильтрам в текущей транзакции соединения-писателя"""
+    await conn.execute("DELETE FROM war_counts")
+    await conn.execute(
+        """
+        INSERT INTO war_counts (result, is_cwl_war, wars)
+        SELECT ?, ?, COUNT(*) FROM wars
+        UNION ALL
+        SELECT ?, COALESCE(is_cwl_war, 0), COUNT(*) FROM wars GROUP BY COALESCE(is_cwl_war, 0)
+        UNION ALL
+        SELECT result, ?, COUNT(*) FROM wars WHERE result IS NOT NULL GROUP BY result
+        UNION ALL
+        SELECT result, COALESCE(is_cwl_war, 0), COUNT(*) FROM wars
+        WHERE result IS NOT NULL GROUP BY result, COALESCE(is_cwl_war, 0)
+        """,
+        (_WAR_COUNT_ANY_RESULT, _WAR_COUNT_ANY_TYPE, _WAR_COUNT_ANY_RESULT, _WAR_COUNT_ANY_TYPE),
+    )
+
+
+async def _migrate_war_counts(conn: aiosqlite.Connection) -> None:
+    """Счетчики войн для count_wars (поддерживаются save_war)"""
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS war_counts (
+            result TEXT NOT NULL,
+            is_cwl_war INTEGER NOT NULL,
+            wars INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (result, is_cwl_war)
+        ) WITHOUT ROWID
+        """
+    )
+    await _rebuild_war_counts(conn)
+
+
+# ----------------------------------------------------------------------
+# Миграции схемы (PRAGMA user_version)
+# ----------------------------------------------------------------------
+# Новые изменения схемы добавляются только новой миграцией в конец списка:
+# уже примененные версии не перезапускаются и не должны меняться.
+
+_SCHEMA_BASELINE = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        telegram_id INTEGER PRIMARY KEY,
+        player_tag TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_profiles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        telegram_id INTEGER NOT NULL,
+        player_tag TEXT NOT NULL,
+        profile_name TEXT,
+        is_primary INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        UNIQUE (telegram_id, player_tag)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_profiles_telegram ON user_profiles(telegram_id)",
+    """
+    CREATE TABLE IF NOT EXISTS wars (
+        end_time TEXT PRIMARY KEY,
+        opponent_name TEXT,
+        team_size INTEGER,
+        clan_stars INTEGER,
+        opponent_stars INTEGER,
+        clan_destruction REAL,
+        opponent_destruction REAL,
+        clan_attacks_used INTEGER,
+        result TEXT,
+        is_cwl_war INTEGER DEFAULT 0,
+        total_violations INTEGER,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS war_attacks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        war_end_time TEXT NOT NULL,
+        attacker_tag TEXT,
+        attacker_name TEXT,
+        defender_tag TEXT,
+        stars INTEGER,
+        destruction REAL,
+        attack_order INTEGER,
+        timestamp INTEGER,
+        is_violation INTEGER,
+        FOREIGN KEY (war_end_time) REFERENCES wars(end_time) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_war_attacks_war ON war_attacks(war_end_time)",
+    """
+    CREATE TABLE IF NOT EXISTS subscriptions (
+        telegram_id INTEGER PRIMARY KEY,
+        subscription_type TEXT,
+        start_date TEXT,
+        end_date TEXT,
+        is_active INTEGER,
+        payment_id TEXT,
+        amount REAL,
+        currency TEXT,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS notifications (
+        telegram_id INTEGER PRIMARY KEY,
+        enabled_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS building_trackers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        telegram_id INTEGER NOT NULL,
+        player_tag TEXT NOT NULL,
+        is_active INTEGER NOT NULL DEFAULT 1,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        last_check TEXT,
+        UNIQUE (telegram_id, player_tag)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_building_trackers_active ON building_trackers(is_active)",
+    """
+    CREATE TABLE IF NOT EXISTS building_snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        player_tag TEXT NOT NULL,
+        snapshot_time TEXT NOT NULL,
+        buildings_data TEXT,
+        UNIQUE (player_tag, snapshot_time)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS player_stats_snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        player_tag TEXT NOT NULL,
+        snapshot_time TEXT NOT NULL,
+        donations INTEGER,
+        UNIQUE (player_tag, snapshot_time)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS linked_clans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        telegram_id INTEGER NOT NULL,
+        clan_tag TEXT NOT NULL,
+        clan_name TEXT,
+        slot_number INTEGER NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        UNIQUE (telegram_id, slot_number),
+        UNIQUE (telegram_id, clan_tag)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cwl_seasons (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        season_date TEXT UNIQUE,
+        bonus_results_json TEXT
+    )
+    """,
+)
+
+
+async def _migrate_cwl_aggregates(conn: aiosqlite.Connection) -> None:
+    """Агрегаты для бонусов ЛВК по сезонам (поддерживаются save_war и save_donation_snapshot)"""
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cwl_season_player_attacks (
+            season TEXT NOT NULL,
+            player_tag TEXT NOT NULL,
+            cwl_attacks INTEGER NOT NULL DEFAULT 0,
+            regular_attacks INTEGER NOT NULL DEFAULT 0,
+            cwl_wars INTEGER NOT NULL DEFAULT 0,
+            regular_wars INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (season, player_tag)
+        ) WITHOUT ROWID
+        """
+    )
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cwl_season_player_donations (
+            season TEXT NOT NULL,
+            player_tag TEXT NOT NULL,
+            first_snapshot_time TEXT NOT NULL,
+            first_donations INTEGER NOT NULL DEFAULT 0,
+            last_snapshot_time TEXT NOT NULL,
+            last_donations INTEGER NOT NULL DEFAULT 0,
+            donated INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (season, player_tag)
+        ) WITHOUT ROWID
+        """
+    )
+    await _rebuild_cwl_aggregates(conn)
+
+
+async def _migrate_player_stats_without_rowid(conn: aiosqlite.Connection) -> None:
+    """Снимки донатов с ключом (player_tag, snapshot_time) вместо rowid и UNIQUE-индекса
+
+    Суррогатный id нигде не читается, а таблица растет с каждым обходом клана:
+    без rowid строки хранятся прямо в B-дереве ключа, и вставка обновляет
+    одно дерево и один индекс вместо трех.
+    """
+    await rebuild_table(
+        conn,
+        "player_stats_snapshots",
+        """
+        CREATE TABLE {table} (
+            player_tag TEXT NOT NULL,
+            snapshot_time TEXT NOT NULL,
+            donations INTEGER,
+            PRIMARY KEY (player_tag, snapshot_time)
+        ) WITHOUT ROWID
+        """,
+        ("player_tag", "snapshot_time", "donations"),
+    )
+
+
+SCHEMA_MIGRATIONS: Tuple[Migration, ...] = (
+    Migration(1, "базовая схема", sql_step(*_SCHEMA_BASELINE)),
+    Migration(
+        2,
+        "индексы списка войн по результату и типу войны",
+        sql_step(
+            "CREATE INDEX IF NOT EXISTS idx_wars_result_end ON wars(result, end_time)",
+            "CREATE INDEX IF NOT EXISTS idx_wars_cwl_end ON wars(is_cwl_war, end_time)",
+        ),
+    ),
+    Migration(3, "сезонные агрегаты бонусов ЛВК", _migrate_cwl_aggregates),
+    Migration(
+        4,
+        "покрывающие индексы атак и подписок",
+        sql_step(
+            # Атаки войны читаются по war_end_time в порядке attack_order
+            "CREATE INDEX IF NOT EXISTS idx_war_attacks_war_order ON war_attacks(war_end_time, attack_order)",
+            "DROP INDEX IF EXISTS idx_war_attacks_war",
+            "CREATE INDEX IF NOT EXISTS idx_subscriptions_active_end ON subscriptions(is_active, end_date)",
+        ),
+    ),
+    Migration(5, "снимки донатов без rowid", _migrate_player_stats_without_rowid),
+    Migration(6, "счетчики войн для списка войн", _migrate_war_counts),
+)
+
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1].version
+
 class DatabaseService:
-    """Асинхронный слой работы с базой данных на основе SQLite."""
+    """Асинхронный слой работы с базой данных на основе SQLite.
+
+    База работает в режиме WAL: все изменения выполняются через одно
+    соединение-писатель под блокировкой, а чтения распределяются по пулу
+    соединений только для чтения и не ждут писателя и друг друга.
 
-    def __init__(self, database_path: Optional[str] = None):
+    Одиночные записи (_execute с commit=True) не фиксируются по одной: они
+    попадают в очередь и объединяются в одну транзакцию (до write_batch_size
+    операций или за write_batch_window секунд). Вызывающий код получает
+    результат только после COMMIT, поэтому гарантии сохранности не меняются.
+    """
+
+    def __init__(self, database_path: Optional[str] = None, read_pool_size: Optional[int] = None):
         db_path = database_path or getattr(config, "DATABASE_PATH", "")
         if not db_path:
             raise RuntimeError("DATABASE_PATH не настроен в конфигурации")
         self.database_path = self._normalise_path(db_path)
         self._conn: Optional[aiosqlite.Connection] = None
+        self._connect_lock = asyncio.Lock()
         self._lock = asyncio.Lock()
         self._lock_owner: Optional[asyncio.Task] = None
         self._lock_depth = 0
+        # Пул читателей: соединения открываются по мере необходимости до read_pool_size
+        self.read_pool_size = max(1, read_pool_size or getattr(config, "DATABASE_READ_POOL_SIZE", 4))
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: asyncio.Queue = asyncio.Queue()
+        self._readers_opening = 0
+        self._reader_waits = 0
+        self.journal_mode: Optional[str] = None
+        # Очередь групповой фиксации записей
+        self.write_batch_size = max(1, int(getattr(config, "DATABASE_WRITE_BATCH_SIZE", 200)))
+        self.write_batch_window = max(0.0, float(getattr(config, "DATABASE_WRITE_BATCH_WINDOW_MS", 2))) / 1000
+        self._pending_writes: List[_PendingWrite] = []
+        self._write_wakeup = asyncio.Event()
+        self._write_batch_full = asyncio.Event()
+        self._write_flusher: Optional[asyncio.Task] = None
+        self._write_stats = {"batches": 0, "writes": 0, "failed_writes": 0, "largest_batch": 0}
 
     @staticmethod
     def _normalise_path(raw_path: str) -> str:
@@ -72,141 +494,123 @@ class DatabaseService:
         path.parent.mkdir(parents=True, exist_ok=True)
         return str(path)
 
+    @staticmethod
+    def _tuning_pragmas() -> List[str]:
+        """Общие PRAGMA для писателя и читателей"""
+        return [
+            f"PRAGMA busy_timeout={int(getattr(config, 'DATABASE_BUSY_TIMEOUT_MS', 5000))}",
+            # Отрицательное значение cache_size задает размер в КиБ, а не в страницах
+            f"PRAGMA cache_size=-{int(getattr(config, 'DATABASE_CACHE_SIZE_KB', 16384))}",
+            f"PRAGMA mmap_size={int(getattr(config, 'DATABASE_MMAP_SIZE', 0))}",
+            "PRAGMA temp_store=MEMORY",
+        ]
+
     async def _ensure_connection(self) -> aiosqlite.Connection:
-        if self._conn is None:
-            self._conn = await aiosqlite.connect(self.database_path)
-            self._conn.row_factory = aiosqlite.Row
-            await self._conn.execute("PRAGMA foreign_keys=ON")
+        """Соединение-писатель (создается один раз)"""
+        if self._conn is not None:
+            return self._conn
+        async with self._connect_lock:
+            if self._conn is None:
+                conn = await aiosqlite.connect(self.database_path)
+                conn.row_factory = aiosqlite.Row
+                cursor = await conn.execute("PRAGMA journal_mode=WAL")
+                row = await cursor.fetchone()
+                await cursor.close()
+                self.journal_mode = str(row[0]).lower() if row else None
+                if self.journal_mode != "wal":
+                    logger.warning("SQLite не перешла в режим WAL (journal_mode=%s)", self.journal_mode)
+                synchronous = getattr(config, "DATABASE_SYNCHRONOUS", "NORMAL")
+                if synchronous not in _SYNCHRONOUS_MODES:
+                    synchronous = "NORMAL"
+                await conn.execute(f"PRAGMA synchronous={synchronous}")
+                await conn.execute("PRAGMA foreign_keys=ON")
+                for pragma in self._tuning_pragmas():
+                    await conn.execute(pragma)
+                self._conn = conn
         return self._conn
 
+    async def _open_reader(self) -> aiosqlite.Connection:
+        # Писатель создает файл базы и включает WAL до открытия читателей
+        await self._ensure_connection()
+        conn = await aiosqlite.connect(f"{Path(self.database_path).as_uri()}?mode=ro", uri=True)
+        conn.row_factory = aiosqlite.Row
+        await conn.execute("PRAGMA query_only=ON")
+        for pragma in self._tuning_pragmas():
+            await conn.execute(pragma)
+        return conn
+
+    async def _acquire_reader(self) -> aiosqlite.Connection:
+        try:
+            return self._idle_readers.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        if len(self._readers) + self._readers_opening < self.read_pool_size:
+            self._readers_opening += 1
+            try:
+                conn = await self._open_reader()
+            finally:
+                self._readers_opening -= 1
+            self._readers.append(conn)
+            return conn
+        self._reader_waits += 1
+        return await self._idle_readers.get()
+
+    def _release_reader(self, conn: aiosqlite.Connection):
+        if conn in self._readers:
+            self._idle_readers.put_nowait(conn)
+
     async def close(self):
+        await self.flush_writes()
+        if self._write_flusher is not None:
+            self._write_flusher.cancel()
+            try:
+                await self._write_flusher
+            except asyncio.CancelledError:
+                pass
+            self._write_flusher = None
+        readers, self._readers = self._readers, []
+        self._idle_readers = asyncio.Queue()
+        for reader in readers:
+            await reader.close()
         if self._conn is not None:
             await self._conn.close()
             self._conn = None
 
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Состояние пула соединений"""
+        return {
+            "journal_mode": self.journal_mode,
+            "writer_open": self._conn is not None,
+            "writer_locked": self._lock.locked(),
+            "readers_open": len(self._readers),
+            "readers_idle": self._idle_readers.qsize(),
+            "readers_max": self.read_pool_size,
+            "reader_waits": self._reader_waits,
+            "pending_writes": len(self._pending_writes),
+            "write_batches": dict(self._write_stats),
+        }
+
     async def ping(self) -> bool:
         row = await self._fetchone("SELECT 1")
         return row is not None
 
     async def init_db(self):
+        """Создание или обновление схемы до SCHEMA_VERSION"""
         conn = await self._ensure_connection()
-        async with self._lock:
-            await conn.executescript(
-                """
-                CREATE TABLE IF NOT EXISTS users (
-                    telegram_id INTEGER PRIMARY KEY,
-                    player_tag TEXT
-                );
-
-                CREATE TABLE IF NOT EXISTS user_profiles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_id INTEGER NOT NULL,
-                    player_tag TEXT NOT NULL,
-                    profile_name TEXT,
-                    is_primary INTEGER NOT NULL DEFAULT 0,
-                    created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                    UNIQUE (telegram_id, player_tag)
-                );
-                CREATE INDEX IF NOT EXISTS idx_user_profiles_telegram ON user_profiles(telegram_id);
-
-                CREATE TABLE IF NOT EXISTS wars (
-                    end_time TEXT PRIMARY KEY,
-                    opponent_name TEXT,
-                    team_size INTEGER,
-                    clan_stars INTEGER,
-                    opponent_stars INTEGER,
-                    clan_destruction REAL,
-                    opponent_destruction REAL,
-                    clan_attacks_used INTEGER,
-                    result TEXT,
-                    is_cwl_war INTEGER DEFAULT 0,
-                    total_violations INTEGER,
-                    created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                    updated_at TEXT NOT NULL DEFAULT (datetime('now'))
-                );
-
-                CREATE TABLE IF NOT EXISTS war_attacks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    war_end_time TEXT NOT NULL,
-                    attacker_tag TEXT,
-                    attacker_name TEXT,
-                    defender_tag TEXT,
-                    stars INTEGER,
-                    destruction REAL,
-                    attack_order INTEGER,
-                    timestamp INTEGER,
-                    is_violation INTEGER,
-                    FOREIGN KEY (war_end_time) REFERENCES wars(end_time) ON DELETE CASCADE
-                );
-                CREATE INDEX IF NOT EXISTS idx_war_attacks_war ON war_attacks(war_end_time);
-
-                CREATE TABLE IF NOT EXISTS subscriptions (
-                    telegram_id INTEGER PRIMARY KEY,
-                    subscription_type TEXT,
-                    start_date TEXT,
-                    end_date TEXT,
-                    is_active INTEGER,
-                    payment_id TEXT,
-                    amount REAL,
-                    currency TEXT,
-                    created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                    updated_at TEXT NOT NULL DEFAULT (datetime('now'))
-                );
-
-                CREATE TABLE IF NOT EXISTS notifications (
-                    telegram_id INTEGER PRIMARY KEY,
-                    enabled_at TEXT NOT NULL
-                );
-
-                CREATE TABLE IF NOT EXISTS building_trackers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_id INTEGER NOT NULL,
-                    player_tag TEXT NOT NULL,
-                    is_active INTEGER NOT NULL DEFAULT 1,
-                    created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                    last_check TEXT,
-                    UNIQUE (telegram_id, player_tag)
-                );
-                CREATE INDEX IF NOT EXISTS idx_building_trackers_active ON building_trackers(is_active);
-
-                CREATE TABLE IF NOT EXISTS building_snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    player_tag TEXT NOT NULL,
-                    snapshot_time TEXT NOT NULL,
-                    buildings_data TEXT,
-                    UNIQUE (player_tag, snapshot_time)
-                );
-
-                CREATE TABLE IF NOT EXISTS player_stats_snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    player_tag TEXT NOT NULL,
-                    snapshot_time TEXT NOT NULL,
-                    donations INTEGER,
-                    UNIQUE (player_tag, snapshot_time)
-                );
-
-                CREATE TABLE IF NOT EXISTS linked_clans (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_id INTEGER NOT NULL,
-                    clan_tag TEXT NOT NULL,
-                    clan_name TEXT,
-                    slot_number INTEGER NOT NULL,
-                    created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                    UNIQUE (telegram_id, slot_number),
-                    UNIQUE (telegram_id, clan_tag)
-                );
-
-                CREATE TABLE IF NOT EXISTS cwl_seasons (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    season_date TEXT UNIQUE,
-                    bonus_results_json TEXT
-                );
-                """
-            )
-            await conn.commit()
-        logger.info("✅ SQLite схема инициализирована")
+        await self._acquire_lock()
+        try:
+            await self.flush_writes()
+            version = await migrate(conn, SCHEMA_MIGRATIONS)
+        finally:
+            await self._release_lock()
+        logger.info("✅ SQLite схема инициализирована (версия %s)", version)
         await self._grant_permanent_proplus_subscription(5545099444)
 
+    async def get_schema_version(self) -> int:
+        """Версия схемы базы (PRAGMA user_version)"""
+        row = await self._fetchone("PRAGMA user_version")
+        return int(row[0]) if row else 0
+
     async def _grant_permanent_proplus_subscription(self, telegram_id: int):
         try:
             start_date = datetime.now()
@@ -253,6 +657,9 @@ class DatabaseService:
         *,
         commit: bool = False,
     ) -> None:
+        if commit and self._lock_owner is not asyncio.current_task():
+            await self._enqueue_write(query, tuple(params))
+            return
         conn = await self._ensure_connection()
         await self._acquire_lock()
         try:
@@ -262,27 +669,131 @@ class DatabaseService:
         finally:
             await self._release_lock()
 
-    async def _fetchone(self, query: str, params: Sequence[Any] = ()):
+    # ------------------------------------------------------------------
+    # Групповая фиксация записей
+    # ------------------------------------------------------------------
+    async def _enqueue_write(self, query: str, params: Any, *, many: bool = False) -> None:
+        """Постановка записи в очередь; завершается после COMMIT пакета с этой записью
+
+        Если вызывающий код отменен после постановки в очередь, запись все равно будет выполнена.
+        """
+        await self._enqueue_writes([(query, params, many)])
+
+    async def _enqueue_writes(self, statements: Sequence[WriteStatement]) -> None:
+        """Постановка в очередь нескольких инструкций, которые применяются атомарно"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending_writes.append(_PendingWrite(statements, future))
+        if len(self._pending_writes) >= self.write_batch_size:
+            self._write_batch_full.set()
+        if self._write_flusher is None or self._write_flusher.done():
+            self._write_flusher = asyncio.create_task(self._write_flush_loop())
+        self._write_wakeup.set()
+        await future
+
+    async def _write_flush_loop(self):
+        while True:
+            await self._write_wakeup.wait()
+            self._write_wakeup.clear()
+            if not self._pending_writes:
+                continue
+            if len(self._pending_writes) < self.write_batch_size and self.write_batch_window > 0:
+                # Ждем, пока накопится пакет, но не дольше окна
+                try:
+                    await asyncio.wait_for(self._write_batch_full.wait(), self.write_batch_window)
+                except asyncio.TimeoutError:
+                    pass
+            await self._commit_pending_batch()
+            if self._pending_writes:
+                self._write_wakeup.set()
+
+    async def _commit_pending_batch(self):
+        errors: List[Optional[BaseException]] = []
         conn = await self._ensure_connection()
         await self._acquire_lock()
+        # Пакет берется уже под блокировкой, чтобы пакеты фиксировались в порядке очереди
+        batch = self._pending_writes[:self.write_batch_size]
+        del self._pending_writes[:len(batch)]
+        if len(self._pending_writes) < self.write_batch_size:
+            self._write_batch_full.clear()
+        if not batch:
+            await self._release_lock()
+            return
+        try:
+            await conn.execute("BEGIN")
+            for item in batch:
+                # Точка сохранения на каждую операцию: ошибка одной записи не откатывает весь пакет
+                await conn.execute("SAVEPOINT batch_write")
+                try:
+                    for query, params, many in item.statements:
+                        if many:
+                            await conn.executemany(query, params)
+                        else:
+                            await conn.execute(query, params)
+                except Exception as exc:
+                    await conn.execute("ROLLBACK TO batch_write")
+                    errors.append(exc)
+                else:
+                    errors.append(None)
+                await conn.execute("RELEASE batch_write")
+            await conn.commit()
+        except Exception as exc:
+            logger.error("Ошибка фиксации пакета из %s записей: %s", len(batch), exc)
+            try:
+                await conn.rollback()
+            except Exception:  # pragma: no cover - соединение уже в ошибочном состоянии
+                pass
+            errors = [exc] * len(batch)
+        finally:
+            await self._release_lock()
+
+        failed = sum(1 for error in errors if error is not None)
+        self._write_stats["batches"] += 1
+        self._write_stats["writes"] += len(batch) - failed
+        self._write_stats["failed_writes"] += failed
+        self._write_stats["largest_batch"] = max(self._write_stats["largest_batch"], len(batch))
+        for item, error in zip(batch, errors):
+            if item.future.done():
+                continue
+            if error is None:
+                item.future.set_result(None)
+            else:
+                item.future.set_exception(error)
+
+    async def flush_writes(self):
+        """Немедленная фиксация всех записей в очереди"""
+        while self._pending_writes:
+            await self._commit_pending_batch()
+
+    async def _fetchone(self, query: str, params: Sequence[Any] = ()):
+        if self._lock_owner is asyncio.current_task():
+            # Внутри операции записи читаем через писателя, чтобы видеть свои изменения
+            cursor = await self._conn.execute(query, tuple(params))
+            row = await cursor.fetchone()
+            await cursor.close()
+            return row
+        conn = await self._acquire_reader()
         try:
             cursor = await conn.execute(query, tuple(params))
             row = await cursor.fetchone()
             await cursor.close()
             return row
         finally:
-            await self._release_lock()
+            self._release_reader(conn)
 
     async def _fetchall(self, query: str, params: Sequence[Any] = ()):
-        conn = await self._ensure_connection()
-        await self._acquire_lock()
+        if self._lock_owner is asyncio.current_task():
+            cursor = await self._conn.execute(query, tuple(params))
+            rows = await cursor.fetchall()
+            await cursor.close()
+            return rows
+        conn = await self._acquire_reader()
         try:
             cursor = await conn.execute(query, tuple(params))
             rows = await cursor.fetchall()
             await cursor.close()
             return rows
         finally:
-            await self._release_lock()
+            self._release_reader(conn)
 
     # ------------------------------------------------------------------
     # Пользователи
@@ -449,6 +960,33 @@ class DatabaseService:
         await self._acquire_lock()
         try:
             await conn.execute("BEGIN")
+            # Повторное сохранение войны: сначала вычитаем из агрегатов ее прежний вклад
+            cursor = await conn.execute(
+                """
+                SELECT a.attacker_tag, COUNT(*) AS attacks, MAX(w.is_cwl_war) AS is_cwl_war
+                FROM war_attacks a
+                JOIN wars w ON w.end_time = a.war_end_time
+                WHERE a.war_end_time = ? AND a.attacker_tag IS NOT NULL AND a.attacker_tag != ''
+                GROUP BY a.attacker_tag
+                """,
+                (war.end_time,),
+            )
+            previous_rows = await cursor.fetchall()
+            await cursor.close()
+            cursor = await conn.execute(
+                "SELECT result, COALESCE(is_cwl_war, 0) AS is_cwl_war FROM wars WHERE end_time = ?",
+                (war.end_time,),
+            )
+            previous_war = await cursor.fetchone()
+            await cursor.close()
+            season = _season_key(war.end_time)
+            await self._apply_attack_aggregates(
+                conn,
+                season,
+                {row["attacker_tag"]: row["attacks"] for row in previous_rows},
+                bool(previous_rows and previous_rows[0]["is_cwl_war"]),
+                sign=-1,
+            )
             await conn.execute(
                 """
                 INSERT INTO wars (
@@ -515,6 +1053,16 @@ class DatabaseService:
                     """,
                     attacks,
                 )
+            attack_counts: Dict[str, int] = {}
+            for attack in attacks:
+                if attack[1]:
+                    attack_counts[attack[1]] = attack_counts.get(attack[1], 0) + 1
+            await self._apply_attack_aggregates(conn, season, attack_counts, bool(war.is_cwl_war), sign=1)
+            await self._apply_war_counts(
+                conn,
+                (previous_war["result"], previous_war["is_cwl_war"]) if previous_war else None,
+                (war.result, 1 if war.is_cwl_war else 0),
+            )
             await conn.commit()
         except Exception:
             await conn.rollback()
@@ -523,6 +1071,78 @@ class DatabaseService:
             await self._release_lock()
         return True
 
+    @staticmethod
+    async def _apply_war_counts(
+        conn: aiosqlite.Connection,
+        previous: Optional[Tuple[Optional[str], int]],
+        current: Tuple[Optional[str], int],
+    ) -> None:
+        """Перенос войны в war_counts: из строк прежнего результата и типа в строки нового"""
+        deltas: Dict[Tuple[str, int], int] = {}
+        if previous is not None:
+            for key in _war_count_keys(*previous):
+                deltas[key] = deltas.get(key, 0) - 1
+        for key in _war_count_keys(*current):
+            deltas[key] = deltas.get(key, 0) + 1
+        rows = [(result, is_cwl_war, delta) for (result, is_cwl_war), delta in deltas.items() if delta]
+        if not rows:
+            return
+        await conn.executemany(
+            """
+            INSERT INTO war_counts (result, is_cwl_war, wars) VALUES (?, ?, ?)
+            ON CONFLICT(result, is_cwl_war) DO UPDATE SET wars = wars + excluded.wars
+            """,
+            rows,
+        )
+        emptied = [(result, is_cwl_war) for result, is_cwl_war, delta in rows if delta < 0]
+        if emptied:
+            await conn.executemany(
+                "DELETE FROM war_counts WHERE result = ? AND is_cwl_war = ? AND wars <= 0",
+                emptied,
+            )
+
+    @staticmethod
+    async def _apply_attack_aggregates(
+        conn: aiosqlite.Connection,
+        season: Optional[str],
+        attack_counts: Dict[str, int],
+        is_cwl: bool,
+        *,
+        sign: int,
+    ) -> None:
+        """Добавление (sign=1) или вычитание (sign=-1) вклада одной войны в cwl_season_player_attacks"""
+        if not season or not attack_counts:
+            return
+        rows = [
+            (
+                season,
+                player_tag,
+                sign * count if is_cwl else 0,
+                0 if is_cwl else sign * count,
+                sign if is_cwl else 0,
+                0 if is_cwl else sign,
+            )
+            for player_tag, count in attack_counts.items()
+        ]
+        await conn.executemany(
+            """
+            INSERT INTO cwl_season_player_attacks (
+                season, player_tag, cwl_attacks, regular_attacks, cwl_wars, regular_wars
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(season, player_tag) DO UPDATE SET
+                cwl_attacks = cwl_attacks + excluded.cwl_attacks,
+                regular_attacks = regular_attacks + excluded.regular_attacks,
+                cwl_wars = cwl_wars + excluded.cwl_wars,
+                regular_wars = regular_wars + excluded.regular_wars
+            """,
+            rows,
+        )
+        if sign < 0:
+            await conn.execute(
+                "DELETE FROM cwl_season_player_attacks WHERE season = ? AND cwl_wars <= 0 AND regular_wars <= 0",
+                (season,),
+            )
+
     async def war_exists(self, end_time: str) -> bool:
         row = await self._fetchone("SELECT 1 FROM wars WHERE end_time = ?", (end_time,))
         return row is not None
@@ -550,48 +1170,125 @@ class DatabaseService:
             entries.append((player_tag, snapshot_time, member.get("donations", 0)))
         if not entries:
             return
-        conn = await self._ensure_connection()
-        await self._acquire_lock()
-        try:
-            await conn.executemany(
+        season = _season_key(snapshot_time)
+        statements: List[WriteStatement] = [
+            (
                 """
                 INSERT INTO player_stats_snapshots (player_tag, snapshot_time, donations)
                 VALUES (?, ?, ?)
                 ON CONFLICT(player_tag, snapshot_time) DO UPDATE SET donations=excluded.donations
                 """,
                 entries,
+                True,
             )
-            await conn.commit()
-        finally:
-            await self._release_lock()
+        ]
+        if season:
+            # Строки агрегата сезона пересчитываются из снимков игрока в той же записи:
+            # повторный снимок с тем же временем и снимок между уже сохраненными
+            # учитываются так же, как при полной пересборке
+            statements.append(
+                (
+                    _SQL_SEASON_DONATIONS_FOR_PLAYER,
+                    [
+                        _season_snapshot_params(player_tag, season)
+                        for player_tag in dict.fromkeys(entry[0] for entry in entries)
+                    ],
+                    True,
+                )
+            )
+        await self._enqueue_writes(statements)
+
+    @staticmethod
+    def _war_summary(row: Any) -> Dict[str, Any]:
+        return {
+            "end_time": row["end_time"],
+            "opponent_name": row["opponent_name"],
+            "team_size": row["team_size"],
+            "clan_stars": row["clan_stars"],
+            "opponent_stars": row["opponent_stars"],
+            "result": row["result"],
+            "is_cwl_war": bool(row["is_cwl_war"]),
+        }
 
-    async def get_war_list(self, limit: int = 10, offset: int = 0) -> List[Dict]:
+    @staticmethod
+    def _war_filter(result: Optional[str], cwl_only: Optional[bool]) -> tuple[str, List[Any]]:
+        """Условие WHERE для get_war_page (использует индексы по result и is_cwl_war)"""
+        conditions: List[str] = []
+        params: List[Any] = []
+        if result is not None:
+            conditions.append("result = ?")
+            params.append(result)
+        if cwl_only is not None:
+            conditions.append("is_cwl_war = ?")
+            params.append(1 if cwl_only else 0)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+
+    async def get_war_page(
+        self,
+        limit: int = 10,
+        *,
+        older_than: Optional[str] = None,
+        newer_than: Optional[str] = None,
+        result: Optional[str] = None,
+        cwl_only: Optional[bool] = None,
+    ) -> List[Dict]:
+        """Страница войн по курсору end_time (keyset-пагинация, новые первыми)
+
+        older_than - следующая страница: войны, закончившиеся раньше курсора;
+        newer_than - предыдущая страница: войны, закончившиеся позже курсора.
+        Стоимость запроса не зависит от глубины страницы, в отличие от OFFSET.
+        """
+        where, params = self._war_filter(result, cwl_only)
+        conditions = [where[len("WHERE "):]] if where else []
+        order = "DESC"
+        if older_than is not None:
+            conditions.append("end_time < ?")
+            params.append(older_than)
+        elif newer_than is not None:
+            conditions.append("end_time > ?")
+            params.append(newer_than)
+            order = "ASC"
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         rows = await self._fetchall(
-            """
+            f"""
             SELECT end_time, opponent_name, team_size, clan_stars, opponent_stars, result, is_cwl_war
             FROM wars
-            ORDER BY end_time DESC
-            LIMIT ? OFFSET ?
+            {where}
+            ORDER BY end_time {order}
+            LIMIT ?
             """,
-            (limit, offset),
+            (*params, limit),
         )
-        return [
-            {
-                "end_time": row["end_time"],
-                "opponent_name": row["opponent_name"],
-                "team_size": row["team_size"],
-                "clan_stars": row["clan_stars"],
-                "opponent_stars": row["opponent_stars"],
-                "result": row["result"],
-                "is_cwl_war": bool(row["is_cwl_war"]),
-            }
-            for row in rows
-        ]
+        if order == "ASC":
+            rows = list(reversed(rows))
+        return [self._war_summary(row) for row in rows]
+
+    async def count_wars(self, *, result: Optional[str] = None, cwl_only: Optional[bool] = None) -> int:
+        """Точное число войн, подходящих под фильтр get_war_page
+
+        Читается одна строка счетчиков war_counts, которые ведет save_war:
+        подсчет не зависит от числа войн в архиве.
+        """
+        row = await self._fetchone(
+            "SELECT wars FROM war_counts WHERE result = ? AND is_cwl_war = ?",
+            (
+                result if result is not None else _WAR_COUNT_ANY_RESULT,
+                _WAR_COUNT_ANY_TYPE if cwl_only is None else (1 if cwl_only else 0),
+            ),
+        )
+        return int(row["wars"]) if row else 0
 
     async def get_cwl_bonus_data(self, year_month: str) -> List[Dict]:
         row = await self._fetchone(
-            "SELECT bonus_results_json FROM cwl_seasons WHERE season_date LIKE ? || '%' LIMIT 1",
-            (year_month,),
+            # Диапазон вместо LIKE 'YYYY-MM%', чтобы использовать уникальный индекс season_date
+            """
+            SELECT bonus_results_json FROM cwl_seasons
+            WHERE season_date >= ? AND season_date < ? || '~'
+            ORDER BY season_date
+            LIMIT 1
+            """,
+            (year_month, year_month),
         )
         if not row:
             return []
@@ -608,69 +1305,59 @@ class DatabaseService:
                 logger.error("Ошибка декодирования бонусов CWL за %s", year_month)
         return []
 
-    async def get_cwl_season_donation_stats(self, season_start: str, season_end: str) -> Dict[str, int]:
-        rows = await self._fetchall(
-            """
-            SELECT player_tag, snapshot_time, donations
-            FROM player_stats_snapshots
-            WHERE snapshot_time BETWEEN ? AND ?
-            ORDER BY player_tag ASC, snapshot_time ASC
-            """,
-            (season_start, season_end),
-        )
-        stats: Dict[str, int] = {}
-        snapshots: Dict[str, List[Dict[str, Any]]] = {}
-        for row in rows:
-            snapshots.setdefault(row["player_tag"], []).append(
-                {
-                    "snapshot_time": row["snapshot_time"],
-                    "donations": row["donations"],
-                }
-            )
-        for player_tag, entries in snapshots.items():
-            if len(entries) >= 2:
-                stats[player_tag] = max(0, entries[-1]["donations"] - entries[0]["donations"])
-            elif entries:
-                stats[player_tag] = entries[0]["donations"]
-        return stats
-
-    async def get_cwl_season_attack_stats(self, season_start: str, season_end: str) -> Dict[str, Dict]:
+    async def get_cwl_season_bonus_stats(self, season: str) -> Tuple[Dict[str, int], Dict[str, Dict]]:
+        """Донаты и атаки игроков за сезон ('YYYY-MM') из агрегатов
+
+        Одно чтение по первичным ключам агрегатов: донаты игроков (прирост за
+        сезон) и счетчики атак и войн ЛВК/обычных войн.
+        """
         rows = await self._fetchall(
             """
-            SELECT w.end_time, w.is_cwl_war, a.attacker_tag
-            FROM wars w
-            LEFT JOIN war_attacks a ON a.war_end_time = w.end_time
-            WHERE w.end_time BETWEEN ? AND ?
-            ORDER BY w.end_time ASC, a.attack_order ASC
+            SELECT t.player_tag,
+                   a.cwl_attacks, a.regular_attacks, a.cwl_wars, a.regular_wars,
+                   d.first_snapshot_time, d.first_donations, d.last_snapshot_time, d.donated
+            FROM (
+                SELECT player_tag FROM cwl_season_player_attacks WHERE season = ?
+                UNION
+                SELECT player_tag FROM cwl_season_player_donations WHERE season = ?
+            ) t
+            LEFT JOIN cwl_season_player_attacks a ON a.season = ? AND a.player_tag = t.player_tag
+            LEFT JOIN cwl_season_player_donations d ON d.season = ? AND d.player_tag = t.player_tag
             """,
-            (season_start, season_end),
+            (season, season, season, season),
         )
-        war_attack_counts: Dict[str, Dict[str, int]] = {}
-        war_types: Dict[str, bool] = {}
+        donation_stats: Dict[str, int] = {}
+        attack_stats: Dict[str, Dict] = {}
         for row in rows:
-            end_time = row["end_time"]
-            war_types[end_time] = bool(row["is_cwl_war"])
-            attacker_tag = row["attacker_tag"]
-            if not attacker_tag:
-                continue
-            counter = war_attack_counts.setdefault(end_time, {})
-            counter[attacker_tag] = counter.get(attacker_tag, 0) + 1
-
-        player_stats: Dict[str, Dict[str, int]] = {}
-        for end_time, counter in war_attack_counts.items():
-            is_cwl = war_types.get(end_time, False)
-            for tag, count in counter.items():
-                stats_entry = player_stats.setdefault(
-                    tag,
-                    {"cwl_attacks": 0, "regular_attacks": 0, "cwl_wars": 0, "regular_wars": 0},
-                )
-                if is_cwl:
-                    stats_entry["cwl_attacks"] += count
-                    stats_entry["cwl_wars"] += 1
+            player_tag = row["player_tag"]
+            if row["first_snapshot_time"] is not None:
+                if row["first_snapshot_time"] == row["last_snapshot_time"]:
+                    donation_stats[player_tag] = row["first_donations"]
                 else:
-                    stats_entry["regular_attacks"] += count
-                    stats_entry["regular_wars"] += 1
-        return player_stats
+                    donation_stats[player_tag] = row["donated"]
+            if row["cwl_wars"] is not None:
+                attack_stats[player_tag] = {
+                    "cwl_attacks": row["cwl_attacks"],
+                    "regular_attacks": row["regular_attacks"],
+                    "cwl_wars": row["cwl_wars"],
+                    "regular_wars": row["regular_wars"],
+                }
+        return donation_stats, attack_stats
+
+    async def rebuild_cwl_aggregates(self) -> None:
+        """Полная пересборка агрегатов ЛВК из war_attacks и player_stats_snapshots"""
+        conn = await self._ensure_connection()
+        await self._acquire_lock()
+        try:
+            await conn.execute("BEGIN")
+            await _rebuild_cwl_aggregates(conn)
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            await self._release_lock()
+        logger.info("Агрегаты ЛВК пересобраны")
 
     async def get_war_details(self, end_time: str) -> Optional[Dict]:
         war_row = await self._fetchone("SELECT * FROM wars WHERE end_time = ?", (end_time,))
@@ -791,8 +1478,11 @@ class DatabaseService:
         return True
 
     async def get_expired_subscriptions(self) -> List[Subscription]:
-        rows = await self._fetchall("SELECT * FROM subscriptions WHERE is_active = 1")
         now = datetime.now()
+        rows = await self._fetchall(
+            "SELECT * FROM subscriptions WHERE is_active = 1 AND end_date < ?",
+            (now.isoformat(),),
+        )
         results: List[Subscription] = []
         for row in rows:
             end_date = _parse_iso(row["end_date"]) or now
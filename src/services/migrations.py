@@ -0,0 +1,180 @@
+"""Versioned SQLite schema migrations for DatabaseService.
+
+Версия схемы хранится в PRAGMA user_version. Каждая миграция выполняется в
+отдельной транзакции (BEGIN IMMEDIATE) вместе с записью новой версии, поэтому
+прерванный запуск не оставляет базу в промежуточном состоянии: при следующем
+старте миграция просто повторяется.
+
+Миграции должны быть идемпотентными (IF NOT EXISTS, проверка столбцов): базы,
+созданные до появления версий, уже содержат часть схемы при user_version = 0.
+
+Таблица перестраивается копированием (rebuild_table): новая таблица создается
+рядом, данные копируются, старая удаляется, новая переименовывается - все в
+транзакции миграции. В режиме WAL читатели до COMMIT видят прежнюю таблицу,
+поэтому остановка бота для такой миграции не нужна.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Sequence
+
+try:
+    import aiosqlite
+except ImportError as exc:  # pragma: no cover - environment specific
+    raise RuntimeError(
+        "Пакет 'aiosqlite' обязателен для работы с локальной базой данных. Установите его командой 'pip install aiosqlite'."
+    ) from exc
+
+logger = logging.getLogger(__name__)
+
+# Шаг миграции: получает соединение-писатель внутри открытой транзакции
+MigrationStep = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Одна версия схемы"""
+    version: int
+    description: str
+    apply: MigrationStep
+
+
+def sql_step(*statements: str) -> MigrationStep:
+    """Шаг миграции из последовательности SQL-инструкций"""
+
+    async def apply(conn: aiosqlite.Connection) -> None:
+        for statement in statements:
+            await conn.execute(statement)
+
+    return apply
+
+
+async def _fetchall(conn: aiosqlite.Connection, query: str):
+    cursor = await conn.execute(query)
+    try:
+        return await cursor.fetchall()
+    finally:
+        await cursor.close()
+
+
+async def get_schema_version(conn: aiosqlite.Connection) -> int:
+    """Текущая версия схемы (PRAGMA user_version)"""
+    rows = await _fetchall(conn, "PRAGMA user_version")
+    return int(rows[0][0]) if rows else 0
+
+
+async def column_exists(conn: aiosqlite.Connection, table: str, column: str) -> bool:
+    rows = await _fetchall(conn, f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in rows)
+
+
+async def add_column(conn: aiosqlite.Connection, table: str, column: str, definition: str) -> bool:
+    """Добавление столбца, если его еще нет; True - столбец добавлен"""
+    if await column_exists(conn, table, column):
+        return False
+    await conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+async def rebuild_table(
+    conn: aiosqlite.Connection,
+    table: str,
+    create_sql: str,
+    columns: Sequence[str],
+    *,
+    source_columns: Optional[Sequence[str]] = None,
+    indexes: Sequence[str] = (),
+) -> None:
+    """Перестройка таблицы копированием и заменой
+
+    create_sql - определение новой таблицы с подстановкой {table} вместо имени;
+    columns - столбцы новой таблицы, заполняемые из старой; source_columns -
+    выражения над старой таблицей в том же порядке (по умолчанию те же столбцы).
+    Индексы старой таблицы удаляются вместе с ней, нужные передаются в indexes.
+    Внешние ключи на время миграции выключает migrate().
+    """
+    new_table = f"{table}__rebuild"
+    target = ", ".join(columns)
+    source = ", ".join(source_columns or columns)
+    await conn.execute(f"DROP TABLE IF EXISTS {new_table}")
+    await conn.execute(create_sql.format(table=new_table))
+    await conn.execute(f"INSERT INTO {new_table} ({target}) SELECT {source} FROM {table}")
+    await conn.execute(f"DROP TABLE {table}")
+    await conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    for index_sql in indexes:
+        await conn.execute(index_sql)
+
+
+def _check_order(migrations: Sequence[Migration]) -> None:
+    previous = 0
+    for migration in migrations:
+        if migration.version <= previous:
+            raise ValueError(
+                f"Версии миграций должны строго возрастать: {migration.version} после {previous}"
+            )
+        previous = migration.version
+
+
+async def migrate(conn: aiosqlite.Connection, migrations: Sequence[Migration]) -> int:
+    """Применение недостающих миграций; возвращает итоговую версию схемы
+
+    Вызывающий код должен владеть соединением-писателем (другие записи в это
+    время не выполняются). Внешние ключи выключаются на время миграций, как
+    требует перестройка таблиц в SQLite, а перед каждым COMMIT проверяются
+    PRAGMA foreign_key_check.
+    """
+    _check_order(migrations)
+    latest = migrations[-1].version if migrations else 0
+    current = await get_schema_version(conn)
+    if current > latest:
+        raise RuntimeError(
+            f"Схема базы (версия {current}) новее, чем известно этой версии бота ({latest})"
+        )
+    pending = [migration for migration in migrations if migration.version > current]
+    if not pending:
+        return current
+
+    rows = await _fetchall(conn, "PRAGMA foreign_keys")
+    foreign_keys = bool(rows and rows[0][0])
+    if conn.in_transaction:
+        await conn.commit()
+    await conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        for migration in pending:
+            started = time.perf_counter()
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Другой процесс мог применить миграцию, пока мы ждали блокировку
+                if await get_schema_version(conn) >= migration.version:
+                    await conn.rollback()
+                    continue
+                await migration.apply(conn)
+                violations = await _fetchall(conn, "PRAGMA foreign_key_check")
+                if violations:
+                    raise RuntimeError(
+                        f"Миграция {migration.version} нарушает внешние ключи: {len(violations)} строк"
+                    )
+                await conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                logger.error("Миграция схемы %s (%s) не применена", migration.version, migration.description)
+                raise
+            logger.info(
+                "Миграция схемы %s применена: %s (%.0f мс)",
+                migration.version,
+                migration.description,
+                (time.perf_counter() - started) * 1000,
+            )
+    finally:
+        if foreign_keys:
+            await conn.execute("PRAGMA foreign_keys=ON")
+    return await get_schema_version(conn)
+
+
+__all__ = [
+    "Migration", "MigrationStep", "sql_step", "migrate", "get_schema_version",
+    "column_exists", "add_column", "rebuild_table",
+]
@@ -4,12 +4,15 @@
 import asyncio
 import logging
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Optional
 import json
 
 from src.services.database import DatabaseService
-from src.services.coc_api import CocApiClient, is_war_ended, is_war_in_preparation, is_cwl_active
+from src.services.coc_api import CocApiClient, CocApiError, is_war_ended, is_war_in_preparation, is_cwl_active
+from src.utils.request_scheduler import RequestPriority, set_request_priority
 from src.models.war import WarToSave
+from src.models.coc import War, WarClan
+from src.utils.war_processing import analyze_attacks
 from config.config import config
 
 logger = logging.getLogger(__name__)
@@ -58,6 +61,9 @@ class WarArchiver:
     
     async def _archive_loop(self):
         """Основной цикл архивации"""
+        # Запросы архиватора уступают очередь интерактивным запросам пользователей
+        set_request_priority(RequestPriority.BACKGROUND)
+
         # При первом запуске проверяем журнал войн на наличие непроцессированных войн
         try:
             await self._check_war_log_for_past_wars()
@@ -66,6 +72,13 @@ class WarArchiver:
         
         while self.is_running:
             try:
+                # Пока API недоступен, не опрашиваем его впустую
+                if not self.coc_client.is_api_available():
+                    delay = max(self.coc_client.get_api_retry_delay(), 5)
+                    logger.warning(f"[Архиватор] API недоступен, пауза {delay:.0f} сек")
+                    await asyncio.sleep(delay)
+                    continue
+
                 await self._check_current_war()
                 await self._check_donation_snapshots()
                 
@@ -84,23 +97,22 @@ class WarArchiver:
         
         try:
             async with self.coc_client as client:
-                war_log = await client.get_clan_war_log(self.clan_tag)
+                wars = await client.get_war_log(self.clan_tag)
                 
-                if not war_log or 'items' not in war_log:
+                if wars is None:
                     logger.warning(f"[Архиватор] Журнал войн недоступен для клана {self.clan_tag}")
                     return
                 
-                wars = war_log.get('items', [])
                 logger.info(f"[Архиватор] Найдено {len(wars)} войн в журнале")
                 
                 # Обрабатываем войны из журнала (от новых к старым)
                 processed_count = 0
-                for war_entry in wars:
+                for war in wars:
                     # Проверяем, что война завершена
-                    if war_entry.get('result') not in ['win', 'lose', 'tie']:
+                    if war.result not in ['win', 'lose', 'tie']:
                         continue
                     
-                    end_time = war_entry.get('endTime')
+                    end_time = war.end_time
                     if not end_time:
                         continue
                     
@@ -109,25 +121,25 @@ class WarArchiver:
                         continue
                     
                     # Получаем информацию о войне из журнала
-                    clan_data = war_entry.get('clan', {})
-                    opponent_data = war_entry.get('opponent', {})
+                    clan = war.clan
+                    opponent = war.opponent
                     
-                    if not clan_data or not opponent_data:
+                    if not clan or not opponent:
                         continue
                     
                     # Собираем информацию о войне
-                    opponent_name = opponent_data.get('name', 'Неизвестный противник')
-                    team_size = war_entry.get('teamSize', len(clan_data.get('members', [])))
-                    clan_stars = clan_data.get('stars', 0)
-                    opponent_stars = opponent_data.get('stars', 0)
-                    clan_destruction = clan_data.get('destructionPercentage', 0.0)
-                    opponent_destruction = opponent_data.get('destructionPercentage', 0.0)
+                    opponent_name = opponent.name or 'Неизвестный противник'
+                    team_size = war.team_size if war.team_size is not None else clan.member_count
+                    clan_stars = clan.stars
+                    opponent_stars = opponent.stars
+                    clan_destruction = clan.destruction
+                    opponent_destruction = opponent.destruction
                     
                     # Подсчет использованных атак и анализ атак
-                    clan_attacks_used, total_violations, attacks_by_member = self._analyze_attacks(clan_data)
+                    clan_attacks_used, total_violations, attacks_by_member = self._analyze_attacks(clan)
                     
                     # Определение результата
-                    result = war_entry.get('result', self._determine_result(clan_stars, opponent_stars))
+                    result = war.result
                     
                     # Проверяем, является ли война ЛВК (упрощенная проверка по журналу)
                     # В журнале войн нет прямой информации о ЛВК, используем эвристику
@@ -153,7 +165,7 @@ class WarArchiver:
                     success = await self.db_service.save_war(war_to_save)
                     if success:
                         processed_count += 1
-                        logger.info(f"[Архиватор] Война против {opponent_name} (завершена {end_time}) добавлена из журнала")
+                        logger.debug("[Архиватор] Война против %s (завершена %s) добавлена из журнала", opponent_name, end_time)
                 
                 if processed_count > 0:
                     logger.info(f"[Архиватор] Обработано {processed_count} войн из журнала")
@@ -168,13 +180,13 @@ class WarArchiver:
         logger.info(f"[Архиватор] Проверка текущей войны для клана {self.clan_tag}")
         
         async with self.coc_client as client:
-            current_war = await client.get_clan_current_war(self.clan_tag)
+            current_war = await client.get_current_war(self.clan_tag)
             
             if not current_war:
                 logger.warning(f"[Архиватор] Не удалось получить информацию о текущей войне для {self.clan_tag}")
                 return
             
-            war_state = current_war.get('state', '')
+            war_state = current_war.state
             
             # Проверяем на уведомления о начале войны
             if war_state == 'preparation':
@@ -184,9 +196,9 @@ class WarArchiver:
             elif war_state == 'warEnded':
                 await self._check_completed_war(current_war)
     
-    async def _check_war_start_notification(self, war_data: Dict[Any, Any]):
+    async def _check_war_start_notification(self, war: War):
         """Проверка и отправка уведомлений о начале войны"""
-        start_time_str = war_data.get('startTime')
+        start_time_str = war.start_time
         if not start_time_str:
             return
         
@@ -202,21 +214,21 @@ class WarArchiver:
             # Проверяем, что война начнется менее чем через час
             time_until_start = start_time - now
             if time_until_start <= timedelta(hours=1) and time_until_start > timedelta(0):
-                await self._send_war_start_notification(war_data)
+                await self._send_war_start_notification(war)
                 self.notified_war_start_time = start_time_str
                 
         except Exception as e:
             logger.error(f"[Архиватор] Ошибка при проверке уведомления о начале войны: {e}")
     
-    async def _send_war_start_notification(self, war_data: Dict[Any, Any]):
+    async def _send_war_start_notification(self, war: War):
         """Отправка уведомления о начале войны"""
         if not self.bot:
             return
         
         try:
-            opponent_name = war_data.get('opponent', {}).get('name', 'Неизвестный противник')
-            clan_size = len(war_data.get('clan', {}).get('members', []))
-            opponent_size = len(war_data.get('opponent', {}).get('members', []))
+            opponent_name = war.opponent.name or 'Неизвестный противник'
+            clan_size = war.clan.member_count
+            opponent_size = war.opponent.member_count
             
             message_text = (
                 "⚔️ *Внимание!* Скоро начнется клановая война!\n\n"
@@ -244,9 +256,9 @@ class WarArchiver:
         except Exception as e:
             logger.error(f"[Архиватор] Ошибка при отправке уведомлений о начале войны: {e}")
     
-    async def _check_completed_war(self, war_data: Dict[Any, Any]):
+    async def _check_completed_war(self, war: War):
         """Проверка и сохранение завершенной войны"""
-        end_time = war_data.get('endTime')
+        end_time = war.end_time
         if not end_time:
             return
         
@@ -265,7 +277,7 @@ class WarArchiver:
             is_cwl_war = await self._is_cwl_war()
             
             # Анализируем и сохраняем войну
-            await self._analyze_and_save_war(war_data, is_cwl_war)
+            await self._analyze_and_save_war(war, is_cwl_war)
             self.last_known_war_end_time = end_time
             
         except Exception as e:
@@ -277,27 +289,29 @@ class WarArchiver:
             async with self.coc_client as client:
                 league_group = await client.get_clan_war_league_group(self.clan_tag)
                 return is_cwl_active(league_group)
+        except CocApiError:
+            # Недоступность API не означает "не ЛВК" - война будет обработана при следующей проверке
+            raise
         except Exception as e:
             logger.error(f"[Архиватор] Ошибка при проверке ЛВК: {e}")
             return False
     
-    async def _analyze_and_save_war(self, war_data: Dict[Any, Any], is_cwl_war: bool):
+    async def _analyze_and_save_war(self, war: War, is_cwl_war: bool):
         """Анализ и сохранение войны"""
         try:
-            clan_data = war_data.get('clan', {})
-            opponent_data = war_data.get('opponent', {})
+            clan = war.clan
             
             # Основная информация о войне
-            end_time = war_data.get('endTime', '')
-            opponent_name = opponent_data.get('name', 'Неизвестный противник')
-            team_size = len(clan_data.get('members', []))
-            clan_stars = clan_data.get('stars', 0)
-            opponent_stars = opponent_data.get('stars', 0)
-            clan_destruction = clan_data.get('destructionPercentage', 0.0)
-            opponent_destruction = opponent_data.get('destructionPercentage', 0.0)
+            end_time = war.end_time or ''
+            opponent_name = war.opponent.name or 'Неизвестный противник'
+            team_size = clan.member_count
+            clan_stars = clan.stars
+            opponent_stars = war.opponent.stars
+            clan_destruction = clan.destruction
+            opponent_destruction = war.opponent.destruction
             
             # Подсчет использованных атак и нарушений
-            clan_attacks_used, total_violations, attacks_by_member = self._analyze_attacks(clan_data)
+            clan_attacks_used, total_violations, attacks_by_member = self._analyze_attacks(clan)
             
             # Определение результата
             result = self._determine_result(clan_stars, opponent_stars)
@@ -330,52 +344,9 @@ class WarArchiver:
         except Exception as e:
             logger.error(f"[Архиватор] Ошибка при анализе и сохранении войны: {e}")
     
-    def _analyze_attacks(self, clan_data: Dict[Any, Any]) -> tuple:
-        """Анализ атак клана"""
-        members = clan_data.get('members', [])
-        total_attacks_used = 0
-        total_violations = 0
-        attacks_by_member = {}
-        
-        for member in members:
-            member_tag = member.get('tag', '')
-            member_attacks = member.get('attacks', [])
-            total_attacks_used += len(member_attacks)
-            
-            # Анализ нарушений (упрощенный алгоритм)
-            member_violations = self._analyze_member_violations(member, member_attacks)
-            total_violations += member_violations
-            
-            # Сохранение атак участника
-            if member_attacks:
-                attacks_by_member[member_tag] = [
-                    {
-                        'attacker_name': member.get('name', ''),
-                        'defender_tag': attack.get('defenderTag', ''),
-                        'stars': attack.get('stars', 0),
-                        'destruction': attack.get('destructionPercentage', 0.0),
-                        'order': attack.get('order', 0),
-                        'timestamp': 0,  # API не предоставляет timestamp
-                        'is_violation': 0  # Требует дополнительного анализа
-                    }
-                    for attack in member_attacks
-                ]
-        
-        return total_attacks_used, total_violations, attacks_by_member
-    
-    def _analyze_member_violations(self, member: Dict[Any, Any], attacks: List[Dict[Any, Any]]) -> int:
-        """Анализ нарушений участника (упрощенный)"""
-        # Здесь можно реализовать более сложную логику анализа нарушений
-        # Например, проверка атак не по порядку, пропущенные атаки и т.д.
-        
-        violations = 0
-        
-        # Простая проверка: если участник не использовал все атаки
-        expected_attacks = 2  # Обычно в КВ каждый участник может атаковать 2 раза
-        if len(attacks) < expected_attacks:
-            violations += expected_attacks - len(attacks)
-        
-        return violations
+    def _analyze_attacks(self, clan: WarClan) -> tuple:
+        """Анализ атак клана: (использовано атак, нарушений, атаки по участникам)"""
+        return analyze_attacks(clan)
     
     def _determine_result(self, clan_stars: int, opponent_stars: int) -> str:
         """Определение результата войны"""
@@ -396,11 +367,11 @@ class WarArchiver:
             
             try:
                 async with self.coc_client as client:
-                    clan_data = await client.get_clan_info(self.clan_tag)
+                    clan = await client.get_clan(self.clan_tag)
                     
-                    if clan_data and 'memberList' in clan_data:
+                    if clan and clan.members:
                         await self.db_service.save_donation_snapshot(
-                            clan_data['memberList'], 
+                            [{'tag': member.tag, 'donations': member.donations} for member in clan.members],
                             now.isoformat()
                         )
                         self.last_donation_snapshot = now
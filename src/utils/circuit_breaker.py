@@ -0,0 +1,107 @@
+"""
+Автоматический выключатель (circuit breaker) для API Clash of Clans
+
+После серии подряд идущих сбоев выключатель размыкается, и запросы сразу
+отклоняются без обращения к сети. По истечении периода охлаждения
+пропускается один пробный запрос (полуоткрытое состояние): успех замыкает
+выключатель, сбой снова размыкает его.
+"""
+import logging
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Выключатель с быстрым отказом и пробными запросами"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 60.0, name: str = 'api'):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.name = name
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.times_opened = 0
+        self.rejected_requests = 0
+
+    @property
+    def state(self) -> str:
+        """Текущее состояние (открытый выключатель после охлаждения считается полуоткрытым)"""
+        if self._state == self.OPEN and self.retry_in() == 0:
+            return self.HALF_OPEN
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Запросы сейчас отклоняются без обращения к API"""
+        state = self.state
+        return state == self.OPEN or (state == self.HALF_OPEN and self._probe_in_flight)
+
+    def retry_in(self) -> float:
+        """Через сколько секунд будет разрешен пробный запрос"""
+        if self._state != self.OPEN or self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+    def allow_request(self) -> bool:
+        """Проверка, можно ли выполнить запрос (в полуоткрытом состоянии - только один пробный)"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            logger.info(f"[{self.name}] Выключатель полуоткрыт, пробный запрос")
+            return True
+        self.rejected_requests += 1
+        return False
+
+    def record_success(self):
+        """Учет успешного запроса"""
+        if self._state != self.CLOSED:
+            logger.info(f"[{self.name}] Выключатель замкнут, API снова доступен")
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        """Учет неудачного запроса"""
+        self._consecutive_failures += 1
+        if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def release_probe(self):
+        """Снятие отметки пробного запроса, если он был прерван без результата"""
+        self._probe_in_flight = False
+
+    def _open(self):
+        if self._state != self.OPEN:
+            self.times_opened += 1
+            logger.warning(
+                f"[{self.name}] Выключатель разомкнут после {self._consecutive_failures} сбоев, "
+                f"запросы отклоняются на {self.cooldown:.0f} сек"
+            )
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Состояние и счетчики выключателя"""
+        return {
+            'state': self.state,
+            'consecutive_failures': self._consecutive_failures,
+            'retry_in': round(self.retry_in(), 1),
+            'times_opened': self.times_opened,
+            'rejected_requests': self.rejected_requests,
+        }
+
+
+__all__ = ["CircuitBreaker"]
@@ -0,0 +1,75 @@
+"""
+Учет ошибок API с постоянным объемом памяти
+
+- последние ошибки хранятся в кольцевом буфере фиксированного размера;
+- счетчики агрегируются по семейству эндпоинтов и коду статуса;
+- частота ошибок считается по скользящим окнам из поминутных корзин.
+"""
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Tuple
+
+
+class ErrorStats:
+    """Кольцевой буфер последних ошибок и агрегированные счетчики"""
+
+    # Окна для расчета частоты ошибок, в минутах
+    WINDOWS_MINUTES = (1, 5, 15, 60)
+
+    def __init__(self, capacity: int = 500):
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self.totals: Dict[Tuple[str, int], int] = {}
+        # Поминутные корзины: [номер минуты, количество ошибок]
+        self._buckets: Deque[List[int]] = deque(maxlen=max(self.WINDOWS_MINUTES))
+
+    def record(self, endpoint: str, family: str, status_code: int, error_message: str):
+        """Регистрация ошибки"""
+        self.recent.append({
+            'timestamp': datetime.now().isoformat(),
+            'endpoint': endpoint,
+            'status_code': status_code,
+            'error_message': error_message
+        })
+        key = (family, status_code)
+        self.totals[key] = self.totals.get(key, 0) + 1
+
+        minute = int(time.time() // 60)
+        if self._buckets and self._buckets[-1][0] == minute:
+            self._buckets[-1][1] += 1
+        else:
+            self._buckets.append([minute, 1])
+
+    def get_recent(self) -> List[Dict[str, Any]]:
+        """Последние ошибки (не больше емкости буфера)"""
+        return list(self.recent)
+
+    def get_rates(self) -> Dict[str, float]:
+        """Частота ошибок в минуту по скользящим окнам"""
+        current_minute = int(time.time() // 60)
+        rates = {}
+        for window in self.WINDOWS_MINUTES:
+            count = sum(bucket[1] for bucket in self._buckets if current_minute - bucket[0] < window)
+            rates[f'{window}m'] = count / window
+        return rates
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Сводка: счетчики по семействам и кодам статуса, частоты по окнам"""
+        by_family: Dict[str, Dict[int, int]] = {}
+        for (family, status_code), count in self.totals.items():
+            by_family.setdefault(family, {})[status_code] = count
+        return {
+            'total': sum(self.totals.values()),
+            'by_family': by_family,
+            'rates_per_minute': self.get_rates(),
+            'buffered': len(self.recent),
+        }
+
+    def clear(self):
+        """Сброс буфера и счетчиков"""
+        self.recent.clear()
+        self.totals.clear()
+        self._buckets.clear()
+
+
+__all__ = ["ErrorStats"]
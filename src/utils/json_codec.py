@@ -0,0 +1,80 @@
+"""
+Декодирование JSON ответов API и проекции полей
+
+- json_loads/json_dumps используют orjson, если он установлен, иначе стандартный json;
+- Projection оставляет в ответе только объявленные вызывающим кодом поля,
+  чтобы не хранить в памяти сотни ненужных записей (достижения, войска и т.д.).
+"""
+import json
+from typing import Any, Dict, Iterable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - необязательная зависимость
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson else 'json'
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """Разбор JSON (orjson при наличии)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj: Any) -> str:
+    """Сериализация в JSON-строку (orjson при наличии)"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False)
+
+
+ProjectionSpec = Union[Dict[str, Any], Iterable[str]]
+
+
+class Projection:
+    """Набор полей, которые нужно оставить в ответе API
+
+    Спецификация - словарь {поле: вложенная спецификация или None}; None означает
+    "оставить значение целиком". Вместо словаря можно передать список имен полей.
+    Вложенная спецификация применяется к объекту или к каждому элементу списка.
+    """
+
+    __slots__ = ('name', 'spec')
+
+    def __init__(self, name: str, spec: ProjectionSpec):
+        self.name = name
+        self.spec = self._normalise(spec)
+
+    @classmethod
+    def _normalise(cls, spec: Optional[ProjectionSpec]) -> Optional[Dict[str, Any]]:
+        if spec is None:
+            return None
+        if isinstance(spec, dict):
+            return {field: cls._normalise(sub_spec) for field, sub_spec in spec.items()}
+        return {field: None for field in spec}
+
+    def apply(self, data: Any) -> Any:
+        """Применение проекции к разобранному ответу"""
+        return self._apply(self.spec, data)
+
+    @classmethod
+    def _apply(cls, spec: Optional[Dict[str, Any]], data: Any) -> Any:
+        if spec is None:
+            return data
+        if isinstance(data, list):
+            return [cls._apply(spec, item) for item in data]
+        if not isinstance(data, dict):
+            return data
+        return {
+            field: cls._apply(sub_spec, data[field])
+            for field, sub_spec in spec.items()
+            if field in data
+        }
+
+    def __repr__(self) -> str:
+        return f"Projection({self.name!r})"
+
+
+__all__ = ["JSON_BACKEND", "json_loads", "json_dumps", "Projection"]
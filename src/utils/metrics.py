@@ -0,0 +1,179 @@
+"""
+Встроенные метрики клиента COC API
+
+- гистограммы задержек с фиксированными корзинами (память не растет с числом запросов);
+- датчики выполняющихся запросов по семействам эндпоинтов;
+- трассировка aiohttp: ожидание свободного соединения в пуле и установка новых соединений.
+
+Метрики читаются в процессе через CocApiClient.get_metrics(), без разбора логов.
+"""
+import bisect
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Sequence
+
+import aiohttp
+
+# Верхние границы корзин гистограммы, в миллисекундах (последняя корзина - все, что больше)
+DEFAULT_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, bounds_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.bounds = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        """Учет одного измерения (в секундах)"""
+        value_ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, fraction: float) -> float:
+        """Оценка перцентиля по верхней границе корзины (мс)"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target and bucket_count:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        buckets = {f"le_{bound:g}ms": count for bound, count in zip(self.bounds, self.counts)}
+        buckets['inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'avg_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p90_ms': self.percentile(0.90),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max,
+            'buckets': buckets,
+        }
+
+
+class RequestMetrics:
+    """Задержки, исходы и выполняющиеся запросы по семействам эндпоинтов"""
+
+    def __init__(self):
+        # Полное время вызова (с повторами и ожиданием ключа), по семействам
+        self.request_latency: Dict[str, LatencyHistogram] = {}
+        # Время одной HTTP попытки, по семействам
+        self.attempt_latency: Dict[str, LatencyHistogram] = {}
+        # Исходы попыток: семейство -> {код статуса или причина: количество}
+        self.outcomes: Dict[str, Dict[str, int]] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.in_flight_peak = 0
+        # Трассировка соединений aiohttp
+        self.connection_queue = LatencyHistogram()
+        self.connection_create = LatencyHistogram()
+        self.connections_reused = 0
+        self.started_at = time.time()
+
+    @staticmethod
+    def _histogram(store: Dict[str, LatencyHistogram], family: str) -> LatencyHistogram:
+        histogram = store.get(family)
+        if histogram is None:
+            histogram = store[family] = LatencyHistogram()
+        return histogram
+
+    def observe_request(self, family: str, seconds: float):
+        self._histogram(self.request_latency, family).observe(seconds)
+
+    def attempt_started(self, family: str):
+        self.in_flight[family] = self.in_flight.get(family, 0) + 1
+        total = sum(self.in_flight.values())
+        if total > self.in_flight_peak:
+            self.in_flight_peak = total
+
+    def attempt_finished(self, family: str, seconds: float, outcome: str):
+        self.in_flight[family] -= 1
+        self._histogram(self.attempt_latency, family).observe(seconds)
+        family_outcomes = self.outcomes.setdefault(family, {})
+        family_outcomes[outcome] = family_outcomes.get(outcome, 0) + 1
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """TraceConfig для сессии: ожидание слота в пуле и создание соединений"""
+        trace_config = aiohttp.TraceConfig(trace_config_ctx_factory=SimpleNamespace)
+
+        async def on_queued_start(session, ctx, params):
+            ctx.queued_at = time.perf_counter()
+
+        async def on_queued_end(session, ctx, params):
+            self.connection_queue.observe(time.perf_counter() - ctx.queued_at)
+
+        async def on_create_start(session, ctx, params):
+            ctx.create_started_at = time.perf_counter()
+
+        async def on_create_end(session, ctx, params):
+            self.connection_create.observe(time.perf_counter() - ctx.create_started_at)
+
+        async def on_reuseconn(session, ctx, params):
+            self.connections_reused += 1
+
+        trace_config.on_connection_queued_start.append(on_queued_start)
+        trace_config.on_connection_queued_end.append(on_queued_end)
+        trace_config.on_connection_create_start.append(on_create_start)
+        trace_config.on_connection_create_end.append(on_create_end)
+        trace_config.on_connection_reuseconn.append(on_reuseconn)
+        return trace_config
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'uptime_s': time.time() - self.started_at,
+            'request_latency': {family: h.snapshot() for family, h in sorted(self.request_latency.items())},
+            'attempt_latency': {family: h.snapshot() for family, h in sorted(self.attempt_latency.items())},
+            'outcomes': {family: dict(counts) for family, counts in sorted(self.outcomes.items())},
+            'in_flight': {
+                'total': sum(self.in_flight.values()),
+                'peak': self.in_flight_peak,
+                'by_family': {family: count for family, count in sorted(self.in_flight.items()) if count},
+            },
+            'connections': {
+                'queue_wait': self.connection_queue.snapshot(),
+                'create': self.connection_create.snapshot(),
+                'reused': self.connections_reused,
+            },
+        }
+
+
+def connector_utilisation(connector: Optional[aiohttp.TCPConnector]) -> Dict[str, Any]:
+    """Загрузка пула соединений TCPConnector
+
+    aiohttp не публикует число занятых соединений, поэтому оно берется из
+    внутренних полей коннектора; если их нет, возвращаются только лимиты.
+    """
+    if connector is None:
+        return {'open': False}
+    stats: Dict[str, Any] = {
+        'open': not connector.closed,
+        'limit': connector.limit,
+        'limit_per_host': connector.limit_per_host,
+    }
+    acquired = getattr(connector, '_acquired', None)
+    if acquired is not None:
+        stats['acquired'] = len(acquired)
+        stats['utilisation'] = len(acquired) / connector.limit if connector.limit else 0.0
+    idle = getattr(connector, '_conns', None)
+    if idle is not None:
+        stats['idle'] = sum(len(connections) for connections in idle.values())
+    waiters = getattr(connector, '_waiters', None)
+    if waiters is not None:
+        stats['waiting'] = sum(len(queue) for queue in waiters.values())
+    return stats
+
+
+__all__ = ["LatencyHistogram", "RequestMetrics", "connector_utilisation", "DEFAULT_BUCKETS_MS"]
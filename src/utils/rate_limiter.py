@@ -0,0 +1,101 @@
+"""
+Ограничение частоты запросов к API Clash of Clans
+
+- TokenBucket: классический token bucket с пополнением по времени
+- ApiKeyPool: пул API ключей, у каждого из которых свой бюджет запросов.
+  Ключи выдаются по кругу, поэтому пропускная способность растет
+  линейно с количеством ключей.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не более capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        # До этого момента ключ заблокирован (например, после ответа 429)
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self) -> float:
+        """Попытка взять токен. Возвращает 0, если токен получен, иначе время ожидания в секундах"""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def block_for(self, seconds: float):
+        """Блокировка выдачи токенов на указанное время и обнуление запаса"""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = 0
+        self._updated = now
+
+    @property
+    def available(self) -> float:
+        """Текущее количество доступных токенов"""
+        self._refill(time.monotonic())
+        return self._tokens
+
+
+class ApiKeyPool:
+    """Пул API ключей с отдельным token bucket для каждого ключа"""
+
+    def __init__(self, tokens: List[str], rate_per_key: float, burst_per_key: float):
+        if not tokens:
+            raise ValueError("Пул API ключей не может быть пустым")
+        self.tokens = list(dict.fromkeys(tokens))
+        self._buckets: Dict[str, TokenBucket] = {
+            token: TokenBucket(rate_per_key, burst_per_key) for token in self.tokens
+        }
+        self._next_index = 0
+        self.throttled_waits = 0
+
+    async def acquire(self) -> str:
+        """Получение ключа, у которого есть свободный бюджет (ожидает при необходимости)"""
+        while True:
+            min_wait: Optional[float] = None
+            count = len(self.tokens)
+            for offset in range(count):
+                index = (self._next_index + offset) % count
+                token = self.tokens[index]
+                wait = self._buckets[token].try_acquire()
+                if wait == 0:
+                    self._next_index = (index + 1) % count
+                    return token
+                if min_wait is None or wait < min_wait:
+                    min_wait = wait
+            self.throttled_waits += 1
+            await asyncio.sleep(min_wait or 0)
+
+    def penalize(self, token: str, retry_after: float):
+        """Приостановка ключа после ответа 429"""
+        bucket = self._buckets.get(token)
+        if bucket:
+            bucket.block_for(retry_after)
+
+    def get_stats(self) -> Dict[str, object]:
+        """Статистика пула ключей (ключи не раскрываются)"""
+        return {
+            'keys': len(self.tokens),
+            'throttled_waits': self.throttled_waits,
+            'available_tokens': [round(self._buckets[token].available, 2) for token in self.tokens],
+        }
+
+
+__all__ = ["TokenBucket", "ApiKeyPool"]
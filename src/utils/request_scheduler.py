@@ -0,0 +1,134 @@
+"""
+Приоритетный планировщик запросов к API Clash of Clans
+
+Интерактивные запросы (обработчики Telegram) обслуживаются раньше фоновых
+(монитор зданий, архиватор войн). Для каждого класса задается свой лимит
+одновременных запросов, а общий лимит соответствует размеру пула соединений.
+Класс запроса берется из контекстной переменной, поэтому фоновым сервисам
+достаточно один раз вызвать set_request_priority() в своей задаче.
+"""
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Tuple
+
+
+class RequestPriority:
+    """Классы приоритета запросов (меньше значение - выше приоритет)"""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+    NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+
+_current_priority: ContextVar[int] = ContextVar('coc_request_priority', default=RequestPriority.INTERACTIVE)
+
+
+def set_request_priority(priority: int):
+    """Установка класса приоритета для запросов текущей задачи"""
+    _current_priority.set(priority)
+
+
+def get_request_priority() -> int:
+    """Класс приоритета запросов текущей задачи"""
+    return _current_priority.get()
+
+
+class PriorityScheduler:
+    """Ограничение одновременных запросов с приоритетом интерактивного трафика"""
+
+    def __init__(self, total_limit: int, class_limits: Dict[int, int]):
+        self.total_limit = total_limit
+        self.class_limits = dict(class_limits)
+        self._active: Dict[int, int] = {priority: 0 for priority in RequestPriority.NAMES}
+        # (приоритет, порядковый номер, future) - ожидающие слота
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._stats: Dict[int, Dict[str, float]] = {
+            priority: {'requests': 0, 'queued': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+            for priority in RequestPriority.NAMES
+        }
+
+    def _can_run(self, priority: int) -> bool:
+        if sum(self._active.values()) >= self.total_limit:
+            return False
+        return self._active[priority] < self.class_limits.get(priority, self.total_limit)
+
+    def _wake_waiters(self):
+        """Выдача освободившихся слотов ожидающим в порядке приоритета"""
+        self._waiters.sort(key=lambda entry: entry[:2])
+        remaining = []
+        for entry in self._waiters:
+            priority, _, future = entry
+            if future.done():
+                continue
+            if self._can_run(priority):
+                self._active[priority] += 1
+                future.set_result(None)
+            else:
+                remaining.append(entry)
+        self._waiters = remaining
+
+    async def acquire(self, priority: int):
+        """Ожидание слота для запроса указанного класса"""
+        started = time.monotonic()
+        stats = self._stats[priority]
+        stats['requests'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((priority, next(self._sequence), future))
+        self._wake_waiters()
+        if not future.done():
+            stats['queued'] += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Слот уже выдан, но ожидающий отменен - возвращаем слот
+                    self.release(priority)
+                else:
+                    self._waiters = [entry for entry in self._waiters if entry[2] is not future]
+                raise
+        waited = time.monotonic() - started
+        stats['wait_total'] += waited
+        stats['wait_max'] = max(stats['wait_max'], waited)
+
+    def release(self, priority: int):
+        """Освобождение слота"""
+        self._active[priority] -= 1
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        """Контекстный менеджер слота для одного запроса"""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Метрики ожидания в очереди по классам запросов"""
+        result = {}
+        for priority, name in RequestPriority.NAMES.items():
+            stats = self._stats[priority]
+            requests = stats['requests']
+            result[name] = {
+                'active': self._active[priority],
+                'waiting': sum(1 for entry in self._waiters if entry[0] == priority),
+                'limit': self.class_limits.get(priority, self.total_limit),
+                'requests': requests,
+                'queued': stats['queued'],
+                'wait_avg': stats['wait_total'] / requests if requests else 0.0,
+                'wait_max': stats['wait_max'],
+            }
+        return result
+
+
+__all__ = [
+    "RequestPriority",
+    "PriorityScheduler",
+    "set_request_priority",
+    "get_request_priority",
+]
@@ -0,0 +1,128 @@
+"""
+Нормализация и валидация тегов Clash of Clans
+
+Разбор тега выполняется один раз: результат (CocTag) кэшируется в ограниченном
+LRU-кэше и сразу содержит URL-кодированную форму для пути запроса, поэтому
+повторные запросы по тому же тегу не проверяют и не кодируют его заново.
+"""
+import functools
+import re
+from typing import Tuple
+from urllib.parse import quote
+
+# Размер кэша разобранных тегов (на каждую разновидность тега)
+TAG_CACHE_SIZE = 4096
+
+TAG_MIN_LENGTH = 8
+TAG_MAX_LENGTH = 10
+
+PLAYER = 'player'
+CLAN = 'clan'
+WAR = 'war'
+
+_TAG_BODY_RE = re.compile(r'[0-9A-Z]+')
+# Для проверки: убираем все '#' и пробелы
+_STRIP_TABLE = str.maketrans('', '', '# ')
+# Для форматирования пользовательского ввода: убираем пробелы, буква O -> цифра 0
+_FORMAT_TABLE = str.maketrans({' ': None, 'O': '0'})
+
+_MESSAGE_EMPTY = "Тег не может быть пустым"
+_MESSAGE_TOO_SHORT = f"Тег слишком короткий (должен быть минимум {TAG_MIN_LENGTH} символов)"
+_MESSAGE_TOO_LONG = f"Тег слишком длинный (должен быть максимум {TAG_MAX_LENGTH} символов)"
+_MESSAGE_BAD_CHARS = "Тег содержит недопустимые символы"
+_MESSAGE_PLAYER_LOOKS_LIKE_CLAN = (
+    "Внимание: тег из 9 символов может быть тегом клана. "
+    "Если поиск не дает результатов, попробуйте поиск по клану."
+)
+
+
+class CocTag:
+    """Разобранный тег: каноническая форма, форма для URL и результат проверки"""
+
+    __slots__ = ('raw', 'tag', 'quoted', 'is_valid', 'message')
+
+    def __init__(self, raw: str, tag: str, is_valid: bool, message: str):
+        self.raw = raw
+        self.tag = tag  # '#' + символы тега в верхнем регистре
+        self.quoted = quote(tag, safe='') if is_valid else ''
+        self.is_valid = is_valid
+        self.message = message
+
+    def __bool__(self) -> bool:
+        return self.is_valid
+
+    def __str__(self) -> str:
+        return self.tag
+
+    def __repr__(self) -> str:
+        return f"CocTag({self.tag!r}, valid={self.is_valid})"
+
+
+@functools.lru_cache(maxsize=TAG_CACHE_SIZE)
+def parse_tag(raw: str, kind: str = PLAYER) -> CocTag:
+    """Разбор и проверка тега (результат кэшируется)
+
+    kind - PLAYER, CLAN или WAR; для тегов игроков из 9 символов в message
+    возвращается предупреждение о возможном теге клана.
+    """
+    if not raw:
+        return CocTag(raw, '', False, _MESSAGE_EMPTY)
+
+    clean_tag = raw.translate(_STRIP_TABLE).upper()
+    length = len(clean_tag)
+    if length < TAG_MIN_LENGTH:
+        return CocTag(raw, '#' + clean_tag, False, _MESSAGE_TOO_SHORT)
+    if length > TAG_MAX_LENGTH:
+        return CocTag(raw, '#' + clean_tag, False, _MESSAGE_TOO_LONG)
+    if not _TAG_BODY_RE.fullmatch(clean_tag):
+        return CocTag(raw, '#' + clean_tag, False, _MESSAGE_BAD_CHARS)
+
+    message = _MESSAGE_PLAYER_LOOKS_LIKE_CLAN if kind == PLAYER and length == 9 else ""
+    return CocTag(raw, '#' + clean_tag, True, message)
+
+
+@functools.lru_cache(maxsize=TAG_CACHE_SIZE)
+def format_tag(tag: str) -> str:
+    """Форматирование введенного пользователем тега: без пробелов, O -> 0, с '#'"""
+    tag = tag.upper().translate(_FORMAT_TABLE)
+    if not tag.startswith('#'):
+        tag = '#' + tag
+    return tag
+
+
+@functools.lru_cache(maxsize=TAG_CACHE_SIZE)
+def quote_tag(tag: str) -> str:
+    """URL-кодированный тег без проверки: пробелы убираются, верхний регистр, с '#'
+
+    Для тегов, которые приходят из ответов API (например, теги войн ЛВК),
+    отклонять их по правилам пользовательского ввода нельзя.
+    """
+    tag = tag.strip().upper()
+    if not tag.startswith('#'):
+        tag = '#' + tag
+    return quote(tag, safe='')
+
+
+def validate_tag(tag: str, kind: str = PLAYER) -> Tuple[bool, str]:
+    """Проверка тега: (валидность, сообщение)"""
+    parsed = parse_tag(tag, kind)
+    return parsed.is_valid, parsed.message
+
+
+def tag_cache_info() -> dict:
+    """Статистика кэшей разбора тегов"""
+    parse_info = parse_tag.cache_info()
+    format_info = format_tag.cache_info()
+    quote_info = quote_tag.cache_info()
+    return {
+        'parse': {'hits': parse_info.hits, 'misses': parse_info.misses, 'size': parse_info.currsize},
+        'format': {'hits': format_info.hits, 'misses': format_info.misses, 'size': format_info.currsize},
+        'quote': {'hits': quote_info.hits, 'misses': quote_info.misses, 'size': quote_info.currsize},
+        'max_size': TAG_CACHE_SIZE,
+    }
+
+
+__all__ = [
+    "CocTag", "parse_tag", "format_tag", "quote_tag", "validate_tag", "tag_cache_info",
+    "PLAYER", "CLAN", "WAR", "TAG_CACHE_SIZE",
+]